@@ -117,7 +117,7 @@ class API {
         }
 
         // Mock treatments data
-        if (endpoint.includes('/programs/treatments')) {
+        if (endpoint.includes('/catalog/treatments')) {
             return {
                 success: true,
                 data: {
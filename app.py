@@ -1,124 +1,322 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import request, jsonify, send_from_directory
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
-from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from datetime import timedelta
 import os
+import sys
+import time
 from dotenv import load_dotenv
+import password_hashing
+import identity
+import jobs
+from instrumentation import instrumentation
+from metrics import metrics
+from ratelimit import RateLimitPolicy, rate_limiter
+from query_cache import query_cache
+from password_hashing import HashingBusy
+from lazy_blueprints import LazyBlueprints, LazyFlask
+from database import db, engine_options, find_duplicate_handles
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Flask app
-app = Flask(__name__)
+# Blueprints by URL prefix: (module, blueprint attribute, url prefix).
+# Route modules are only imported when a request first hits their prefix,
+# unless they are preloaded by the app profile or PRELOAD_BLUEPRINTS.
+BLUEPRINTS = [
+    ('routes.auth', 'auth_bp', '/api/auth'),
+    ('routes.users', 'users_bp', '/api/users'),
+    ('routes.patients', 'patients_bp', '/api/patients'),
+    ('routes.practitioners', 'practitioners_bp', '/api/practitioners'),
+    ('routes.sessions', 'sessions_bp', '/api/sessions'),
+    ('routes.programs', 'programs_bp', '/api/programs'),
+    ('routes.wellness', 'wellness_bp', '/api/wellness'),
+    ('routes.notifications', 'notifications_bp', '/api/notifications'),
+    ('routes.feedback', 'feedback_bp', '/api/feedback'),
+    ('routes.dashboard', 'dashboard_bp', '/api/dashboard'),
+    ('routes.reviews', 'reviews_bp', '/api/reviews'),
+    ('routes.articles', 'articles_bp', '/api/articles'),
+    ('routes.contact', 'contact_bp', '/api/contact'),
+    ('routes.newsletter', 'newsletter_bp', '/api/newsletter'),
+    ('routes.faq', 'faq_bp', '/api/faq'),
+    ('routes.schedule_reviews', 'schedule_reviews_bp', '/api/schedule'),
+    ('routes.session_management', 'session_management_bp', '/api/session-management'),
+    ('routes.exports', 'exports_bp', '/api/exports'),
+    ('routes.jobs', 'jobs_bp', '/api/jobs'),
+    ('routes.practitioner_search', 'practitioner_search_bp', '/api/practitioners/search'),
+    ('routes.calendars', 'calendars_bp', '/api/calendars'),
+    ('routes.reschedules', 'reschedules_bp', '/api/reschedules'),
+    ('routes.waitlist', 'waitlist_bp', '/api/waitlist'),
+    ('routes.session_events', 'session_events_bp', '/api/session-events'),
+    ('routes.revenue', 'revenue_bp', '/api/revenue'),
+    ('routes.payments', 'payments_bp', '/api/payments'),
+    ('routes.contact_triage', 'contact_triage_bp', '/api/contact/triage'),
+    ('routes.newsletter_bulk', 'newsletter_bulk_bp', '/api/newsletter/bulk'),
+    ('routes.site_settings', 'site_settings_bp', '/api/settings'),
+    ('routes.symptoms', 'symptoms_bp', '/api/symptoms'),
+    ('routes.catalog', 'catalog_bp', '/api/catalog'),
+]
 
-# Configuration
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
+# Rate limits: (methods, URL prefix, policy); the longest matching prefix wins and None exempts.
+# Anonymous endpoints are limited per IP; the API-wide default per user, falling back to IP.
+RATE_LIMITS = [
+    ('POST', '/api/auth/login', RateLimitPolicy('login', 10, 60)),
+    ('POST', '/api/auth/register', RateLimitPolicy('register', 5, 3600)),
+    ('POST', '/api/contact/submit', RateLimitPolicy('contact', 5, 600)),
+    ('POST', '/api/contact/triage/submissions', RateLimitPolicy('contact', 5, 600)),
+    ('POST', '/api/newsletter/subscribe', RateLimitPolicy('newsletter', 5, 600)),
+    ('GET', '/api/newsletter/bulk/unsubscribe', RateLimitPolicy('unsubscribe', 20, 600)),
+    ('POST', '/api/newsletter/bulk/unsubscribe/one-click', RateLimitPolicy('unsubscribe', 20, 600)),
+    # Gateways send (and retry) from a few IPs, so the per-IP allowance is generous
+    ('*', '/api/payments/webhooks', RateLimitPolicy('webhooks', 3000, 60, burst=600)),
+    ('*', '/api', RateLimitPolicy('api', 600, 60, burst=120, key='user')),
+]
 
-# Try MySQL first, fallback to SQLite
-try:
-    if os.getenv('DB_PASSWORD'):
-        app.config['SQLALCHEMY_DATABASE_URI'] = f"mysql+pymysql://{os.getenv('DB_USER', 'root')}:{os.getenv('DB_PASSWORD', '')}@{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '3306')}/{os.getenv('DB_NAME', 'ayursutra_db')}"
-    else:
+# App profiles:
+#   web   - full API, blueprints imported lazily on first hit (default)
+#   eager - full API, every blueprint imported at startup (e.g. gunicorn --preload)
+#   cli   - config, database and migrations only; no routes (migrations, cron jobs, scripts)
+APP_PROFILES = ('web', 'eager', 'cli')
+
+# Initialize extensions (db is the shared handle from database.py)
+migrate = Migrate()
+jwt = JWTManager()
+
+def configure_app(app):
+    """Load configuration from the environment"""
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
+
+    # Try MySQL first, fallback to SQLite
+    try:
+        if os.getenv('DB_PASSWORD'):
+            app.config['SQLALCHEMY_DATABASE_URI'] = f"mysql+pymysql://{os.getenv('DB_USER', 'root')}:{os.getenv('DB_PASSWORD', '')}@{os.getenv('DB_HOST', 'localhost')}:{os.getenv('DB_PORT', '3306')}/{os.getenv('DB_NAME', 'ayursutra_db')}"
+        else:
+            app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///ayursutra.db'
+    except:
         app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///ayursutra.db'
-except:
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///ayursutra.db'
-
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'jwt-secret-string')
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=int(os.getenv('JWT_ACCESS_TOKEN_EXPIRES', 7)))
-app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', 'uploads')
-app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', 5242880))
-
-# Initialize extensions
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-jwt = JWTManager(app)
-
-# Configure migration directory
-migrate.init_app(app, db, directory='migrations')
-
-# Configure CORS
-CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(',')
-CORS(app, origins=CORS_ORIGINS, supports_credentials=True)
-
-# Import routes
-from routes.auth import auth_bp
-from routes.users import users_bp
-from routes.patients import patients_bp
-from routes.practitioners import practitioners_bp
-from routes.sessions import sessions_bp
-from routes.programs import programs_bp
-from routes.wellness import wellness_bp
-from routes.notifications import notifications_bp
-from routes.feedback import feedback_bp
-from routes.dashboard import dashboard_bp
-from routes.reviews import reviews_bp
-from routes.articles import articles_bp
-from routes.contact import contact_bp
-from routes.newsletter import newsletter_bp
-from routes.faq import faq_bp
-from routes.schedule_reviews import schedule_reviews_bp
-from routes.session_management import session_management_bp
-
-# Register blueprints
-app.register_blueprint(auth_bp, url_prefix='/api/auth')
-app.register_blueprint(users_bp, url_prefix='/api/users')
-app.register_blueprint(patients_bp, url_prefix='/api/patients')
-app.register_blueprint(practitioners_bp, url_prefix='/api/practitioners')
-app.register_blueprint(sessions_bp, url_prefix='/api/sessions')
-app.register_blueprint(programs_bp, url_prefix='/api/programs')
-app.register_blueprint(wellness_bp, url_prefix='/api/wellness')
-app.register_blueprint(notifications_bp, url_prefix='/api/notifications')
-app.register_blueprint(feedback_bp, url_prefix='/api/feedback')
-app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
-app.register_blueprint(reviews_bp, url_prefix='/api/reviews')
-app.register_blueprint(articles_bp, url_prefix='/api/articles')
-app.register_blueprint(contact_bp, url_prefix='/api/contact')
-app.register_blueprint(newsletter_bp, url_prefix='/api/newsletter')
-app.register_blueprint(faq_bp, url_prefix='/api/faq')
-app.register_blueprint(schedule_reviews_bp, url_prefix='/api/schedule')
-app.register_blueprint(session_management_bp, url_prefix='/api/session-management')
-
-# Health check endpoint
-@app.route('/health')
-def health_check():
-    return jsonify({
-        'status': 'OK',
-        'message': 'AyurSutra API is running',
-        'version': '1.0.0'
-    })
-
-# Serve frontend files
-@app.route('/')
-def serve_frontend():
-    return send_from_directory('../frontend', 'index.html')
-
-@app.route('/<path:path>')
-def serve_static(path):
-    return send_from_directory('../frontend', path)
-
-# Error handlers
-@app.errorhandler(404)
-def not_found(error):
-    return jsonify({'success': False, 'message': 'Resource not found'}), 404
-
-@app.errorhandler(500)
-def internal_error(error):
-    return jsonify({'success': False, 'message': 'Internal server error'}), 500
-
-@app.errorhandler(400)
-def bad_request(error):
-    return jsonify({'success': False, 'message': 'Bad request'}), 400
-
-@app.errorhandler(401)
-def unauthorized(error):
-    return jsonify({'success': False, 'message': 'Unauthorized'}), 401
-
-@app.errorhandler(403)
-def forbidden(error):
-    return jsonify({'success': False, 'message': 'Forbidden'}), 403
+
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Pool sizing per process: workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) must fit MySQL max_connections
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'], os.environ)
+    app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'jwt-secret-string')
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=int(os.getenv('JWT_ACCESS_TOKEN_EXPIRES', 7)))
+    app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', 'uploads')
+    app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_CONTENT_LENGTH', 5242880))
+
+    # Password hashing: scheme, cost (bcrypt rounds / pbkdf2 iterations) and worker pool bounds
+    app.config['PASSWORD_HASHER'] = os.getenv('PASSWORD_HASHER', 'bcrypt')
+    app.config['PASSWORD_HASH_COST'] = int(os.getenv('PASSWORD_HASH_COST', 0)) or None
+    app.config['HASHING_POOL_SIZE'] = int(os.getenv('HASHING_POOL_SIZE', os.cpu_count() or 1))
+    app.config['HASHING_MAX_PENDING'] = int(os.getenv('HASHING_MAX_PENDING', 0)) or None
+    app.config['HASHING_TIMEOUT'] = float(os.getenv('HASHING_TIMEOUT', 10))
+
+    # Seconds a user's token version / active flag is cached before re-checking the database
+    app.config['TOKEN_STATE_CACHE_TTL'] = int(os.getenv('TOKEN_STATE_CACHE_TTL', 30))
+
+    # Request instrumentation: timing headers in development, aggregated histograms on /internal/metrics
+    app.config['INSTRUMENTATION_HEADERS'] = os.getenv('FLASK_ENV', 'production') == 'development'
+    app.config['SLOW_QUERY_MS'] = int(os.getenv('SLOW_QUERY_MS', 200))
+    app.config['N_PLUS_ONE_THRESHOLD'] = int(os.getenv('N_PLUS_ONE_THRESHOLD', 10))
+    app.config['PROFILE_SAMPLE_RATE'] = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+    app.config['PROFILE_DIR'] = os.getenv('PROFILE_DIR', 'profiles')
+    app.config['INTERNAL_METRICS_TOKEN'] = os.getenv('INTERNAL_METRICS_TOKEN')
+
+    # Prometheus metrics; set a shared directory when running several gunicorn workers
+    app.config['METRICS_MULTIPROC_DIR'] = os.getenv('METRICS_MULTIPROC_DIR')
+    app.config['METRICS_FLUSH_INTERVAL'] = int(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+    app.config['METRICS_DUMP_MAX_AGE'] = int(os.getenv('METRICS_DUMP_MAX_AGE', 300))
+
+    # Time zone for practitioners without their own (session dates/times are stored in local time)
+    app.config['CLINIC_TIMEZONE'] = os.getenv('CLINIC_TIMEZONE', 'UTC')
+
+    # Minutes a freed slot is held for a waitlisted patient before it moves to the next one
+    app.config['WAITLIST_HOLD_MINUTES'] = int(os.getenv('WAITLIST_HOLD_MINUTES', 15))
+
+    # Shared secret for HMAC-SHA256 signatures on payment gateway webhooks (webhooks are refused if empty)
+    app.config['PAYMENT_WEBHOOK_SECRET'] = os.getenv('PAYMENT_WEBHOOK_SECRET', '')
+
+    # Outgoing mail: 'smtp', or 'outbox' (development) to write .eml files to MAIL_OUTBOX_DIR instead of sending
+    app.config['MAIL_BACKEND'] = os.getenv('MAIL_BACKEND', 'smtp')
+    app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'localhost')
+    app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
+    app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
+    app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
+    app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', 'true').lower() == 'true'
+    app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER', 'AyurSutra <noreply@ayursutra.local>')
+    app.config['MAIL_OUTBOX_DIR'] = os.getenv('MAIL_OUTBOX_DIR', 'outbox')
+    # Parallel SMTP connections per newsletter send job; links in emails point at PUBLIC_BASE_URL
+    app.config['NEWSLETTER_SEND_CONCURRENCY'] = int(os.getenv('NEWSLETTER_SEND_CONCURRENCY', 8))
+    app.config['PUBLIC_BASE_URL'] = os.getenv('PUBLIC_BASE_URL', 'http://localhost:5000')
+
+    # Seconds between checks of the site settings version stamp made by other processes
+    app.config['SETTINGS_CHECK_INTERVAL'] = int(os.getenv('SETTINGS_CHECK_INTERVAL', 5))
+
+    # Sessions, wellness logs, session activities and notifications older than this move to archive tables
+    app.config['ARCHIVE_AFTER_DAYS'] = int(os.getenv('ARCHIVE_AFTER_DAYS', 365))
+
+    # Seconds between checks of the practitioner calendar version stamp (working hours, holidays, time zones)
+    app.config['CALENDAR_CHECK_INTERVAL'] = int(os.getenv('CALENDAR_CHECK_INTERVAL', 5))
+
+    # Seconds between checks of the treatment catalog version stamp made by other processes
+    app.config['CATALOG_CHECK_INTERVAL'] = int(os.getenv('CATALOG_CHECK_INTERVAL', 5))
+
+    # Seconds the in-memory practitioner search index is reused before a rebuild
+    app.config['PRACTITIONER_INDEX_TTL'] = int(os.getenv('PRACTITIONER_INDEX_TTL', 300))
+
+    # Token-bucket rate limiting: 'memory' (per process) or a redis:// URL shared by all workers
+    app.config['RATE_LIMIT_ENABLED'] = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    app.config['RATE_LIMIT_STORAGE'] = os.getenv('RATE_LIMIT_STORAGE', 'memory')
+    # Take the client IP from the last X-Forwarded-For entry (only behind exactly one proxy that appends it)
+    app.config['RATE_LIMIT_TRUST_PROXY'] = os.getenv('RATE_LIMIT_TRUST_PROXY', 'false').lower() == 'true'
+
+    # Query result cache checked against table versions: 'memory' (per process) or a redis:// URL
+    # shared by all workers. With per-process versions, QUERY_CACHE_MAX_AGE bounds how long
+    # another worker's writes can go unseen; 0 disables the age check.
+    app.config['QUERY_CACHE_ENABLED'] = os.getenv('QUERY_CACHE_ENABLED', 'true').lower() == 'true'
+    app.config['QUERY_CACHE_VERSIONS'] = os.getenv('QUERY_CACHE_VERSIONS', 'memory')
+    app.config['QUERY_CACHE_SIZE'] = int(os.getenv('QUERY_CACHE_SIZE', 2048))
+    app.config['QUERY_CACHE_MAX_AGE'] = int(os.getenv('QUERY_CACHE_MAX_AGE', 30))
+
+    # Comma-separated URL prefixes imported at startup even in the lazy web profile
+    app.config['PRELOAD_BLUEPRINTS'] = [p for p in os.getenv('PRELOAD_BLUEPRINTS', '').split(',') if p]
+
+def create_app(profile=None):
+    """Application factory; profile is one of APP_PROFILES (defaults to APP_PROFILE or 'web')"""
+    started = time.perf_counter()
+    profile = profile or os.getenv('APP_PROFILE', 'web')
+    if profile not in APP_PROFILES:
+        raise ValueError(f"Unknown app profile '{profile}'")
+
+    app = LazyFlask(__name__)
+    app.config['APP_PROFILE'] = profile
+    configure_app(app)
+
+    db.init_app(app)
+    # Configure migration directory
+    migrate.init_app(app, db, directory='migrations')
+    password_hashing.init_app(app)
+    # Session hooks that enqueue jobs (e.g. waitlist backfill) run in every process that can
+    # commit; the web profiles also import every handler so routes can enqueue any job
+    jobs.load_hooks()
+    if profile != 'cli':
+        jobs.load_handlers()
+    # Workers and scripts bump table versions too, so every profile shares the cache settings
+    query_cache.init_app(app)
+
+    if profile != 'cli':
+        jwt.init_app(app)
+        identity.init_app(app, jwt)
+        instrumentation.init_app(app)
+        metrics.init_app(app, db)
+        rate_limiter.init_app(app, RATE_LIMITS)
+
+        # Configure CORS
+        CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(',')
+        CORS(app, origins=CORS_ORIGINS, supports_credentials=True)
+
+        blueprints = LazyBlueprints(app, BLUEPRINTS)
+        if profile == 'eager':
+            blueprints.load_all()
+        else:
+            blueprints.load_prefixes(app.config['PRELOAD_BLUEPRINTS'])
+
+        register_core_routes(app)
+        register_error_handlers(app)
+
+    register_commands(app)
+    app.config['STARTUP_SECONDS'] = time.perf_counter() - started
+    return app
+
+def register_core_routes(app):
+    # Health check endpoint
+    @app.route('/health')
+    def health_check():
+        return jsonify({
+            'status': 'OK',
+            'message': 'AyurSutra API is running',
+            'version': '1.0.0'
+        })
+
+    # Serve frontend files
+    @app.route('/')
+    def serve_frontend():
+        return send_from_directory('../frontend', 'index.html')
+
+    @app.route('/<path:path>')
+    def serve_static(path):
+        return send_from_directory('../frontend', path)
+
+def register_error_handlers(app):
+    @app.errorhandler(404)
+    def not_found(error):
+        return jsonify({'success': False, 'message': 'Resource not found'}), 404
+
+    @app.errorhandler(500)
+    def internal_error(error):
+        return jsonify({'success': False, 'message': 'Internal server error'}), 500
+
+    @app.errorhandler(400)
+    def bad_request(error):
+        return jsonify({'success': False, 'message': 'Bad request'}), 400
+
+    @app.errorhandler(401)
+    def unauthorized(error):
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+
+    @app.errorhandler(403)
+    def forbidden(error):
+        return jsonify({'success': False, 'message': 'Forbidden'}), 403
+
+    @app.errorhandler(HashingBusy)
+    def hashing_busy(error):
+        # Shed login bursts quickly instead of tying up workers needed for bookings
+        response = jsonify({'success': False, 'message': 'Too many login attempts in progress, please retry shortly'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
+def register_commands(app):
+    @app.cli.command('import-report')
+    def import_report():
+        """Import every blueprint and report startup and per-module import times"""
+        print(f"⏱️  create_app('{app.config['APP_PROFILE']}'): {app.config['STARTUP_SECONDS'] * 1000:.1f} ms")
+
+        blueprints = app.extensions.get('lazy_blueprints')
+        if blueprints is None:
+            print("ℹ️  The cli profile registers no blueprints")
+            return
+
+        blueprints.load_all()
+        total = sum(blueprints.import_times.values())
+        # The first module loaded also pays for shared imports (models, extensions)
+        for module_name, seconds in sorted(blueprints.import_times.items(), key=lambda item: -item[1]):
+            print(f"   {module_name:<32} {seconds * 1000:>8.1f} ms")
+        print(f"   {'total':<32} {total * 1000:>8.1f} ms")
+
+    @app.cli.command('check-db')
+    def check_db():
+        """Verify models, routes and scripts all share database.db and a single engine"""
+        import importlib
+        import models  # register every mapper
+
+        blueprints = app.extensions.get('lazy_blueprints')
+        if blueprints is not None:
+            blueprints.load_all()
+        for module_name in ('bulk_import', 'export_data', 'synthetic_data'):
+            importlib.import_module(module_name)
+
+        problems = find_duplicate_handles()
+        engine = db.engine
+        for mapper in db.Model.registry.mappers:
+            bind = db.session.get_bind(mapper=mapper)
+            if bind is not engine:
+                problems.append(f"{mapper.class_.__name__} is bound to {bind.url!r}")
+
+        if problems:
+            for problem in problems:
+                print(f"❌ {problem}")
+            sys.exit(1)
+        print(f"✅ {len(db.Model.registry.mappers)} models share one engine ({engine.url!r}, pool {engine.pool.status()})")
 
 # JWT error handlers
 @jwt.expired_token_loader
@@ -133,7 +331,20 @@ def invalid_token_callback(error):
 def missing_token_callback(error):
     return jsonify({'success': False, 'message': 'Authorization token required'}), 401
 
+_app = None
+
+def __getattr__(name):
+    # `from app import app` (gunicorn app:app, flask run, scripts) builds the web app on
+    # first access, so importing create_app alone never pays for the full app
+    global _app
+    if name == 'app':
+        if _app is None:
+            _app = create_app()
+        return _app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
         db.create_all()
     app.run(debug=True, host='0.0.0.0', port=5000)
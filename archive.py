@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Archival of cold history for AyurSutra
+Moves sessions, wellness logs, session activities and notifications older than a horizon into
+*_archive tables in small committed batches, so the hot tables stay small, and gives history
+views an ORM entity that reads hot and archived rows together
+"""
+
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import and_, literal, or_, select, union_all
+from sqlalchemy.orm import aliased
+
+from database import db
+from jobs import job, enqueue
+from models import (
+    Session, SessionStatus, SessionSnapshot, SessionActivity, WellnessLog, Notification,
+    sessions_archive, session_snapshots_archive, session_activities_archive,
+    wellness_logs_archive, notifications_archive
+)
+
+DEFAULT_ARCHIVE_AFTER_DAYS = 365
+
+# Parent rows moved per transaction
+BATCH_SIZE = 500
+
+# A run stops after this long and queues a continuation from its cursors
+SLICE_SECONDS = 300
+
+ARCHIVE_JOB = 'archive.run'
+
+FINISHED_STATUSES = (SessionStatus.COMPLETED, SessionStatus.CANCELLED, SessionStatus.NO_SHOW)
+
+ARCHIVES = {
+    Session: sessions_archive,
+    SessionSnapshot: session_snapshots_archive,
+    SessionActivity: session_activities_archive,
+    WellnessLog: wellness_logs_archive,
+    Notification: notifications_archive,
+}
+
+class ArchivePolicy:
+    """Which rows of a table are cold, and what moves with them"""
+
+    def __init__(self, model, archive, age_column, conditions=None, children=()):
+        self.model = model
+        self.archive = archive
+        self.age_column = age_column
+        self.conditions = conditions or (lambda cutoff: [])
+        # (model, archive table, column referencing the parent id) moved in the same batch
+        self.children = children
+
+    def blockers(self):
+        """Columns in other hot tables that reference this table; referenced rows stay hot"""
+        table = self.model.__table__
+        skip = {table} | {child.__table__ for child, _, _ in self.children} | set(ARCHIVES.values())
+        return [fk.parent for other in db.metadata.sorted_tables if other not in skip
+                for fk in other.foreign_keys if fk.column.table is table]
+
+    def cold(self, cutoff):
+        if isinstance(self.age_column.type, db.DateTime):
+            filters = [self.age_column < cutoff]
+        else:
+            filters = [self.age_column < cutoff.date()]
+        filters += self.conditions(cutoff)
+        for column in self.blockers():
+            filters.append(~select(column).where(column == self.model.id).exists())
+        return filters
+
+# Archived in this order: activities and notifications first, so fewer sessions are held back
+POLICIES = {
+    'notifications': ArchivePolicy(
+        Notification, notifications_archive, Notification.created_at,
+        lambda cutoff: [or_(Notification.scheduled_for.is_(None), Notification.scheduled_for < cutoff)]
+    ),
+    'session_activities': ArchivePolicy(SessionActivity, session_activities_archive, SessionActivity.timestamp),
+    'wellness_logs': ArchivePolicy(WellnessLog, wellness_logs_archive, WellnessLog.log_date),
+    'sessions': ArchivePolicy(
+        Session, sessions_archive, Session.scheduled_date,
+        lambda cutoff: [Session.status.in_(FINISHED_STATUSES)],
+        children=[(SessionSnapshot, session_snapshots_archive, SessionSnapshot.session_id)]
+    ),
+}
+
+class ArchiveError(ValueError):
+    """Raised for unknown tables or invalid horizons"""
+
+def has_archive(model):
+    return model in ARCHIVES
+
+def history(model):
+    """Alias of model over its hot and archived rows, for read-only history views
+
+    Query it like the model: H = history(Session); db.session.query(H).filter(H.patient_id == 1).
+    Rows come back as model instances; don't modify archived ones.
+    """
+    hot = model.__table__
+    archive = ARCHIVES[model]
+    combined = union_all(
+        select(*hot.columns),
+        select(*[archive.c[column.name] for column in hot.columns])
+    ).subquery(f'{hot.name}_history')
+    return aliased(model, combined)
+
+def archive_after_days():
+    if has_app_context():
+        return current_app.config.get('ARCHIVE_AFTER_DAYS', DEFAULT_ARCHIVE_AFTER_DAYS)
+    return DEFAULT_ARCHIVE_AFTER_DAYS
+
+def _move(table, archive, condition, archived_at):
+    columns = [column.name for column in table.columns]
+    db.session.execute(archive.insert().from_select(
+        columns + ['archived_at'], select(*table.columns, literal(archived_at, db.DateTime)).where(condition)
+    ))
+    return db.session.execute(table.delete().where(condition)).rowcount
+
+def archive_batch(name, cutoff, after_id=0, batch_size=BATCH_SIZE):
+    """Move up to batch_size cold rows with id > after_id in one transaction
+
+    Returns (rows moved, last id examined or None when the table has no more cold rows).
+    """
+    policy = POLICIES[name]
+    model = policy.model
+    ids = [row[0] for row in db.session.query(model.id).filter(
+        model.id > after_id, *policy.cold(cutoff)
+    ).order_by(model.id).limit(batch_size)]
+    if not ids:
+        return 0, None
+
+    archived_at = datetime.utcnow()
+    try:
+        # Rows may have turned hot since the scan: lock the ones that are still cold and move only those,
+        # with the policy checked again in the statements that copy and delete them
+        cold = and_(model.id.in_(ids), *policy.cold(cutoff))
+        locked = [row[0] for row in db.session.query(model.id).filter(cold).with_for_update()]
+        moved = 0
+        if locked:
+            for child, child_archive, column in policy.children:
+                _move(child.__table__, child_archive, column.in_(select(model.id).where(cold)), archived_at)
+            moved = _move(model.__table__, policy.archive, cold, archived_at)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return moved, ids[-1]
+
+def run_archive(tables=None, older_than_days=None, batch_size=BATCH_SIZE, budget=None, cursors=None, now=None):
+    """Archive cold rows table by table until done or out of time
+
+    cursors maps table name -> last id examined, so a continued run skips rows already
+    found to be held back. Returns {'moved': {...}, 'cursors': {...}, 'finished': bool}.
+    """
+    tables = list(tables or POLICIES)
+    unknown = [name for name in tables if name not in POLICIES]
+    if unknown:
+        raise ArchiveError(f"Unknown tables: {', '.join(unknown)}")
+    older_than_days = older_than_days or archive_after_days()
+    if older_than_days < 30:
+        raise ArchiveError('Archive horizon must be at least 30 days')
+
+    cutoff = (now or datetime.utcnow()) - timedelta(days=older_than_days)
+    deadline = time.monotonic() + budget if budget else None
+    cursors = dict(cursors or {})
+    moved = {}
+
+    for name in (name for name in POLICIES if name in tables):
+        while True:
+            count, last_id = archive_batch(name, cutoff, cursors.get(name, 0), batch_size)
+            if last_id is None:
+                cursors.pop(name, None)
+                tables.remove(name)
+                break
+            moved[name] = moved.get(name, 0) + count
+            cursors[name] = last_id
+            if deadline and time.monotonic() > deadline:
+                return {'moved': moved, 'cursors': cursors, 'tables': tables, 'finished': False}
+
+    return {'moved': moved, 'cursors': cursors, 'tables': tables, 'finished': True}
+
+def table_sizes():
+    """Row counts of each hot table and its archive"""
+    sizes = {}
+    for name, policy in POLICIES.items():
+        sizes[name] = {
+            'hot': db.session.query(db.func.count(policy.model.id)).scalar(),
+            'archived': db.session.query(db.func.count()).select_from(policy.archive).scalar()
+        }
+    return sizes
+
+@job(ARCHIVE_JOB, max_attempts=3, priority=-10)
+def archive_job(tables=None, older_than_days=None, cursors=None):
+    result = run_archive(tables, older_than_days, budget=SLICE_SECONDS, cursors=cursors)
+    if not result['finished']:
+        position = ','.join(f'{name}:{last_id}' for name, last_id in sorted(result['cursors'].items()))
+        enqueue(ARCHIVE_JOB, {'tables': result['tables'], 'older_than_days': older_than_days,
+                              'cursors': result['cursors']}, idempotency_key=f'archive:{position}')
+    return result
+
+def main():
+    """Archive cold rows from the command line (e.g. nightly from cron)"""
+    parser = argparse.ArgumentParser(description='Move AyurSutra history older than a horizon into archive tables')
+    parser.add_argument('--tables', nargs='+', choices=list(POLICIES), help='Only these tables (default: all)')
+    parser.add_argument('--older-than-days', type=int, help='Horizon (default: ARCHIVE_AFTER_DAYS)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--sizes', action='store_true', help='Only print hot and archived row counts')
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app('cli')
+
+    try:
+        with app.app_context():
+            if not args.sizes:
+                result = run_archive(args.tables, args.older_than_days, batch_size=args.batch_size)
+                for name, count in result['moved'].items():
+                    print(f"✅ Archived {count} rows from {name}")
+                if not result['moved']:
+                    print("✅ Nothing to archive")
+            for name, size in table_sizes().items():
+                print(f"📊 {name}: {size['hot']} hot, {size['archived']} archived")
+        return True
+    except Exception as e:
+        print(f"❌ Archival failed: {e}")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
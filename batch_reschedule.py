@@ -0,0 +1,286 @@
+"""
+Batch rescheduling for AyurSutra
+Moves every session in a practitioner's blocked window to the best free slots at once,
+keeping each patient's program sessions in ProgramTreatment.session_order
+"""
+
+from datetime import datetime, time, timedelta
+
+from sqlalchemy import func
+
+from database import db
+from models import (
+    Session, SessionStatus, SessionReschedule, Practitioner, Patient, ProgramTreatment,
+    Notification, NotificationType, NotificationPriority
+)
+from jobs import job, enqueue
+from waitlist import suppress_backfill
+import calendars
+
+# Days either side of the blocked window searched for replacement slots
+DEFAULT_SEARCH_DAYS = 14
+
+class RescheduleError(ValueError):
+    """Raised when a batch reschedule request cannot be planned"""
+
+class Move:
+    def __init__(self, session, new_date, new_time):
+        self.session = session
+        self.original_date = session.scheduled_date
+        self.original_time = session.scheduled_time
+        self.new_date = new_date
+        self.new_time = new_time
+
+    def to_dict(self):
+        return {
+            'session_id': self.session.id,
+            'patient_id': self.session.patient_id,
+            'original_date': self.original_date.isoformat(),
+            'original_time': self.original_time.strftime('%H:%M'),
+            'new_date': self.new_date.isoformat(),
+            'new_time': self.new_time.strftime('%H:%M')
+        }
+
+class BatchPlan:
+    def __init__(self, practitioner_id, window_start, window_end):
+        self.practitioner_id = practitioner_id
+        self.window_start = window_start
+        self.window_end = window_end
+        self.moves = []
+        self.unplaced = []
+
+    def to_dict(self):
+        return {
+            'practitioner_id': self.practitioner_id,
+            'window_start': self.window_start.isoformat(),
+            'window_end': self.window_end.isoformat(),
+            'moves': [move.to_dict() for move in self.moves],
+            'unplaced': [{'session_id': s.id, 'patient_id': s.patient_id,
+                          'scheduled_date': s.scheduled_date.isoformat(),
+                          'scheduled_time': s.scheduled_time.strftime('%H:%M')} for s in self.unplaced]
+        }
+
+def _overlaps(start, end, intervals):
+    return any(other_start < end and start < other_end for other_start, other_end in intervals)
+
+def _program_orders(program_ids):
+    """(program_id, treatment_id) -> session_order, lowest order for repeated treatments"""
+    if not program_ids:
+        return {}
+    rows = db.session.query(
+        ProgramTreatment.program_id, ProgramTreatment.treatment_id, func.min(ProgramTreatment.session_order)
+    ).filter(ProgramTreatment.program_id.in_(program_ids)).group_by(
+        ProgramTreatment.program_id, ProgramTreatment.treatment_id
+    )
+    return {(program_id, treatment_id): order for program_id, treatment_id, order in rows}
+
+def plan_batch(practitioner_id, window_start, window_end, search_days=DEFAULT_SEARCH_DAYS,
+               step=calendars.SLOT_MINUTES, now=None):
+    """Choose new slots for every active session starting inside [window_start, window_end)
+
+    Window bounds are naive datetimes in the practitioner's local time. Sessions are placed
+    greedily in their original order; each takes the free slot nearest its original day and
+    time of day that avoids the window, the practitioner's and the patient's other bookings,
+    and keeps the patient's program sessions in order.
+    """
+    if window_end <= window_start:
+        raise RescheduleError('window_end must be after window_start')
+    if db.session.get(Practitioner, practitioner_id) is None:
+        raise RescheduleError('Practitioner not found')
+
+    now = now or datetime.utcnow()
+    first_day = min(max(window_start.date() - timedelta(days=search_days), now.date()), window_start.date())
+    last_day = window_end.date() + timedelta(days=search_days)
+    days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+    compiled = {day: calendars.get_day(practitioner_id, day) for day in days}
+
+    def utc(practitioner, day, clock):
+        compiled_day = compiled[day] if practitioner == practitioner_id and day in compiled \
+            else calendars.get_day(practitioner, day)
+        if compiled_day is None:
+            raise RescheduleError(f'Practitioner {practitioner} not found')
+        return compiled_day.local_to_utc(clock.hour * 60 + clock.minute)
+
+    block_start = utc(practitioner_id, window_start.date(), window_start.time())
+    block_end = utc(practitioner_id, window_end.date(), window_end.time())
+    now_minutes = int((now - datetime(1970, 1, 1)).total_seconds()) // 60
+
+    bookings = Session.query.filter(
+        Session.practitioner_id == practitioner_id,
+        Session.status.in_(calendars.BUSY_STATUSES),
+        Session.scheduled_date.between(first_day, last_day)
+    ).order_by(Session.scheduled_date, Session.scheduled_time).all()
+
+    affected, practitioner_busy = [], []
+    for booking in bookings:
+        start = utc(practitioner_id, booking.scheduled_date, booking.scheduled_time)
+        if block_start <= start < block_end:
+            affected.append(booking)
+        else:
+            practitioner_busy.append((start, start + booking.duration_minutes))
+
+    plan = BatchPlan(practitioner_id, window_start, window_end)
+    if not affected:
+        return plan
+
+    # Every active session of the affected patients: for patient conflicts and program order
+    affected_ids = {s.id for s in affected}
+    patient_sessions = Session.query.filter(
+        Session.patient_id.in_({s.patient_id for s in affected}),
+        Session.status.in_(calendars.BUSY_STATUSES),
+        Session.id.notin_(affected_ids)
+    ).all()
+    orders = _program_orders({s.program_id for s in affected + patient_sessions if s.program_id})
+
+    def order_of(s):
+        return orders.get((s.program_id, s.treatment_id)) if s.program_id else None
+
+    # Current (start, end) of each relevant session; moved sessions are updated as they are placed
+    position = {}
+    for other in patient_sessions:
+        start = utc(other.practitioner_id, other.scheduled_date, other.scheduled_time)
+        position[other.id] = (start, start + other.duration_minutes)
+
+    by_patient = {}
+    for other in patient_sessions:
+        by_patient.setdefault(other.patient_id, []).append(other)
+
+    for session in affected:
+        original_start = utc(practitioner_id, session.scheduled_date, session.scheduled_time)
+        original_minute = session.scheduled_time.hour * 60 + session.scheduled_time.minute
+        duration = session.duration_minutes
+
+        patient_busy = [position[o.id] for o in by_patient.get(session.patient_id, []) if o.id in position]
+        lower, upper = now_minutes, None
+        order = order_of(session)
+        if order is not None:
+            for other in by_patient.get(session.patient_id, []):
+                if other.program_id != session.program_id or order_of(other) is None or other.id not in position:
+                    continue
+                other_start, other_end = position[other.id]
+                if order_of(other) < order:
+                    lower = max(lower, other_end)
+                elif order_of(other) > order:
+                    upper = other_start if upper is None else min(upper, other_start)
+
+        best = None
+        for day in days:
+            compiled_day = compiled[day]
+            for interval_start, interval_end in compiled_day.intervals:
+                slot = interval_start
+                while slot + duration <= interval_end:
+                    slot_end = slot + duration
+                    if (slot >= lower and (upper is None or slot_end <= upper)
+                            and not (slot < block_end and block_start < slot_end)
+                            and not _overlaps(slot, slot_end, practitioner_busy)
+                            and not _overlaps(slot, slot_end, patient_busy)):
+                        local_minute = compiled_day.utc_to_local(slot)
+                        score = (abs((day - session.scheduled_date).days), abs(local_minute - original_minute))
+                        if best is None or score < best[0]:
+                            best = (score, day, local_minute, slot)
+                    slot += step
+
+        if best is None:
+            plan.unplaced.append(session)
+            position[session.id] = (original_start, original_start + duration)
+            by_patient.setdefault(session.patient_id, []).append(session)
+            continue
+
+        _, day, local_minute, slot = best
+        plan.moves.append(Move(session, day, time(local_minute // 60, local_minute % 60)))
+        practitioner_busy.append((slot, slot + duration))
+        position[session.id] = (slot, slot + duration)
+        by_patient.setdefault(session.patient_id, []).append(session)
+
+    return plan
+
+def apply_batch(plan, requested_by, reason=None, cancel_unplaced=False):
+    """Write reschedule rows and session updates into the current transaction and queue notifications
+
+    The caller commits; notifications are only sent if the whole batch commits.
+    """
+    now = datetime.utcnow()
+    reschedules = []
+    for move in plan.moves:
+        reschedule = SessionReschedule(
+            session_id=move.session.id,
+            original_date=move.original_date,
+            original_time=move.original_time,
+            new_date=move.new_date,
+            new_time=move.new_time,
+            reason=reason,
+            requested_by=requested_by,
+            status='approved',
+            approved_by=requested_by,
+            approved_at=now
+        )
+        move.session.scheduled_date = move.new_date
+        move.session.scheduled_time = move.new_time
+        reschedules.append(reschedule)
+    db.session.add_all(reschedules)
+
+    if cancel_unplaced:
+        # The practitioner is unavailable, so these slots must not go to the waitlist
+        suppress_backfill(session.id for session in plan.unplaced)
+        for session in plan.unplaced:
+            session.status = SessionStatus.CANCELLED
+    db.session.flush()
+
+    for reschedule in reschedules:
+        enqueue('notifications.session_rescheduled', {'reschedule_id': reschedule.id},
+                idempotency_key=f'session_rescheduled:{reschedule.id}')
+    if cancel_unplaced:
+        for session in plan.unplaced:
+            enqueue('notifications.session_cancelled', {'session_id': session.id, 'reason': reason},
+                    idempotency_key=f'session_cancelled:{session.id}')
+    return reschedules
+
+def reschedule_window(practitioner_id, window_start, window_end, requested_by, reason=None,
+                      cancel_unplaced=False, search_days=DEFAULT_SEARCH_DAYS):
+    """Plan and apply a batch in one transaction, serialized per practitioner"""
+    # Row lock on MySQL so two batches (or a batch and a booking flow that takes the same
+    # lock) cannot hand out the same slot; SQLite serializes writers anyway
+    db.session.query(Practitioner).filter_by(id=practitioner_id).with_for_update().first()
+    try:
+        plan = plan_batch(practitioner_id, window_start, window_end, search_days=search_days)
+        apply_batch(plan, requested_by, reason, cancel_unplaced)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return plan
+
+def _patient_user_id(patient_id):
+    return db.session.query(Patient.user_id).filter_by(id=patient_id).scalar()
+
+@job('notifications.session_rescheduled')
+def notify_session_rescheduled(reschedule_id):
+    """Tell the patient their session moved"""
+    reschedule = db.session.get(SessionReschedule, reschedule_id)
+    session = db.session.get(Session, reschedule.session_id)
+    db.session.add(Notification(
+        user_id=_patient_user_id(session.patient_id),
+        title='Your session has been rescheduled',
+        message=(f"Your session on {reschedule.original_date.strftime('%d %b %Y')} at "
+                 f"{reschedule.original_time.strftime('%H:%M')} has moved to "
+                 f"{reschedule.new_date.strftime('%d %b %Y')} at {reschedule.new_time.strftime('%H:%M')}."
+                 + (f" Reason: {reschedule.reason}" if reschedule.reason else '')),
+        type=NotificationType.ALERT,
+        priority=NotificationPriority.HIGH
+    ))
+    return {'session_id': session.id}
+
+@job('notifications.session_cancelled')
+def notify_session_cancelled(session_id, reason=None):
+    """Tell the patient their session was cancelled and could not be moved"""
+    session = db.session.get(Session, session_id)
+    db.session.add(Notification(
+        user_id=_patient_user_id(session.patient_id),
+        title='Your session has been cancelled',
+        message=(f"Your session on {session.scheduled_date.strftime('%d %b %Y')} at "
+                 f"{session.scheduled_time.strftime('%H:%M')} was cancelled and no alternative slot was "
+                 f"available. Please book a new time." + (f" Reason: {reason}" if reason else '')),
+        type=NotificationType.ALERT,
+        priority=NotificationPriority.HIGH
+    ))
+    return {'session_id': session.id}
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+API benchmark harness for AyurSutra
+Replays the frontend's request mix against a synthetic clinic and reports latency percentiles,
+throughput and regressions against a saved baseline
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import date, timedelta
+
+from synthetic_data import BASE_PATIENTS, SYNTHETIC_PASSWORD, synthetic_email
+
+# Operation name -> relative weight, modelled on script.js / schedule.js page loads
+REQUEST_MIX = [
+    ('dashboard', 25),
+    ('sessions', 20),
+    ('available_slots', 20),
+    ('practitioners', 10),
+    ('treatments', 10),
+    ('wellness_log', 8),
+    ('quick_book', 5),
+    ('login', 2),
+]
+
+DEFAULT_THRESHOLD = 0.15
+
+class HttpTransport:
+    """Sends requests to a running server"""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, method, path, body=None, token=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method)
+        req.add_header('Content-Type', 'application/json')
+        if token:
+            req.add_header('Authorization', f'Bearer {token}')
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                return response.status, json.loads(response.read() or b'null')
+        except urllib.error.HTTPError as e:
+            return e.code, None
+
+class InProcessTransport:
+    """Drives the Flask app directly through its test client"""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, token=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        response = client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.get_json(silent=True)
+
+class VirtualUser:
+    """One simulated patient working through the request mix"""
+
+    def __init__(self, transport, email, practitioner_ids, rng):
+        self.transport = transport
+        self.email = email
+        self.practitioner_ids = practitioner_ids
+        self.rng = rng
+        self.token = None
+
+    def login(self):
+        status, payload = self.transport.request(
+            'POST', '/api/auth/login', {'email': self.email, 'password': SYNTHETIC_PASSWORD})
+        if status == 200 and payload and payload.get('success'):
+            self.token = payload['data']['token']
+        return status
+
+    def _get(self, path):
+        return self.transport.request('GET', path, token=self.token)[0]
+
+    def _post(self, path, body):
+        return self.transport.request('POST', path, body, token=self.token)[0]
+
+    def _future_date(self):
+        return (date.today() + timedelta(days=self.rng.randint(1, 21))).isoformat()
+
+    def run(self, operation):
+        if operation == 'login':
+            return self.login()
+        if operation == 'dashboard':
+            return self._get('/api/dashboard/patient')
+        if operation == 'sessions':
+            return self._get('/api/sessions')
+        if operation == 'practitioners':
+            return self._get('/api/practitioners')
+        if operation == 'treatments':
+            return self._get('/api/catalog/treatments')
+        if operation == 'available_slots':
+            practitioner_id = self.rng.choice(self.practitioner_ids)
+            return self._get(f'/api/schedule/available-slots?practitionerId={practitioner_id}'
+                             f'&date={self._future_date()}&duration=60')
+        if operation == 'quick_book':
+            return self._post('/api/schedule/quick-book', {
+                'practitionerId': self.rng.choice(self.practitioner_ids),
+                'treatmentId': 1,
+                'scheduledDate': self._future_date(),
+                'scheduledTime': f'{self.rng.randint(8, 17):02d}:{self.rng.choice(["00", "30"])}',
+                'notes': 'benchmark booking'
+            })
+        if operation == 'wellness_log':
+            return self._post('/api/wellness/log', {
+                'energy_level': self.rng.choice(['low', 'moderate', 'good']),
+                'sleep_quality': self.rng.choice(['fair', 'good', 'very_good']),
+                'mood': self.rng.choice(['neutral', 'good']),
+                'stress_level': self.rng.choice(['moderate', 'low']),
+                'notes': 'benchmark'
+            })
+        raise ValueError(f"Unknown operation '{operation}'")
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+def summarize(samples, elapsed):
+    """Per-operation and overall latency percentiles (ms) and throughput"""
+    summary = {}
+    everything = []
+    for operation, entries in samples.items():
+        latencies = sorted(latency for latency, _ in entries)
+        everything.extend(latencies)
+        errors = sum(1 for _, status in entries if status >= 400)
+        summary[operation] = {
+            'requests': len(latencies),
+            'errors': errors,
+            'p50_ms': round(percentile(latencies, 0.50), 2),
+            'p95_ms': round(percentile(latencies, 0.95), 2),
+            'p99_ms': round(percentile(latencies, 0.99), 2),
+            'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        }
+
+    everything.sort()
+    summary['overall'] = {
+        'requests': len(everything),
+        'errors': sum(entry['errors'] for entry in summary.values()),
+        'p50_ms': round(percentile(everything, 0.50), 2),
+        'p95_ms': round(percentile(everything, 0.95), 2),
+        'p99_ms': round(percentile(everything, 0.99), 2),
+        'throughput_rps': round(len(everything) / elapsed, 2) if elapsed else 0.0,
+    }
+    return summary
+
+def compare_to_baseline(summary, baseline, threshold):
+    """Return a list of human-readable regressions"""
+    regressions = []
+    for operation, current in summary.items():
+        previous = baseline.get(operation)
+        if not previous:
+            continue
+        for metric in ('p95_ms', 'p99_ms'):
+            if previous[metric] and current[metric] > previous[metric] * (1 + threshold):
+                regressions.append(f"{operation} {metric}: {previous[metric]} -> {current[metric]}")
+        if previous['throughput_rps'] and current['throughput_rps'] < previous['throughput_rps'] * (1 - threshold):
+            regressions.append(f"{operation} throughput_rps: {previous['throughput_rps']} -> {current['throughput_rps']}")
+    return regressions
+
+def run_benchmark(transport, emails, practitioner_ids, concurrency, duration, seed=1):
+    """Run virtual users for `duration` seconds; return (samples, elapsed)"""
+    operations, weights = zip(*REQUEST_MIX)
+    samples = {operation: [] for operation in operations}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        user = VirtualUser(transport, emails[index % len(emails)], practitioner_ids, rng)
+        user.login()
+        local = []
+        while time.perf_counter() < deadline:
+            operation = rng.choices(operations, weights=weights)[0]
+            started = time.perf_counter()
+            try:
+                status = user.run(operation)
+            except Exception:
+                status = 599
+            local.append((operation, (time.perf_counter() - started) * 1000, status))
+        with lock:
+            for operation, latency, status in local:
+                samples[operation].append((latency, status))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+def main():
+    """Run the benchmark from the command line"""
+    parser = argparse.ArgumentParser(description='Benchmark the AyurSutra API with the frontend request mix')
+    parser.add_argument('--url', default='http://localhost:5000', help='Server to benchmark')
+    parser.add_argument('--in-process', action='store_true', help='Use the Flask test client instead of HTTP')
+    parser.add_argument('--scale', type=int, default=10, help='Scale the synthetic dataset was generated with')
+    parser.add_argument('--seed', type=int, default=42, help='Seed the synthetic dataset was generated with')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run')
+    parser.add_argument('--output', help='Write results as JSON')
+    parser.add_argument('--baseline', help='Compare against a previous --output file')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Allowed relative regression before failing (default 0.15)')
+    args = parser.parse_args()
+
+    if args.in_process:
+        # Every virtual user logs in from the same address; rate limits would skew the mix
+        os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+        from app import app
+        transport = InProcessTransport(app)
+    else:
+        transport = HttpTransport(args.url)
+
+    emails = [synthetic_email('patient', i, args.seed) for i in range(min(BASE_PATIENTS * args.scale, 1000))]
+
+    status, payload = transport.request('GET', '/api/practitioners')
+    practitioner_ids = [p['id'] for p in ((payload or {}).get('data') or {}).get('practitioners', [])] or [1]
+
+    print(f"🚀 Benchmarking {'in-process app' if args.in_process else args.url} "
+          f"with {args.concurrency} users for {args.duration:.0f}s...")
+    samples, elapsed = run_benchmark(transport, emails, practitioner_ids, args.concurrency, args.duration, args.seed)
+    summary = summarize(samples, elapsed)
+
+    print("=" * 78)
+    print(f"{'operation':<16} {'requests':>9} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>10}")
+    for operation, stats in summary.items():
+        print(f"{operation:<16} {stats['requests']:>9} {stats['errors']:>7} {stats['p50_ms']:>9} "
+              f"{stats['p95_ms']:>9} {stats['p99_ms']:>9} {stats['throughput_rps']:>10}")
+
+    if args.output:
+        with open(args.output, 'w') as handle:
+            json.dump(summary, handle, indent=2)
+        print(f"📝 Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            regressions = compare_to_baseline(summary, json.load(handle), args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for regression in regressions:
+                print(f"   {regression}")
+            return False
+        print(f"✅ No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
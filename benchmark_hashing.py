@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Password hashing benchmark for AyurSutra
+Reports login verifications per second, overall and per core, for a hashing scheme and cost
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from password_hashing import create_hasher, DEFAULT_SCHEME
+
+def measure(hasher, password_hash, password, threads, duration):
+    """Run verifications on `threads` threads for about `duration` seconds"""
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        count = 0
+        while time.perf_counter() < deadline:
+            hasher.verify(password_hash, password)
+            count += 1
+        return count
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        total = sum(future.result() for future in [executor.submit(worker) for _ in range(threads)])
+    elapsed = time.perf_counter() - start
+
+    return total, elapsed
+
+def main():
+    """Benchmark password verification throughput"""
+    parser = argparse.ArgumentParser(description='Benchmark AyurSutra password hashing throughput')
+    parser.add_argument('--scheme', default=os.getenv('PASSWORD_HASHER', DEFAULT_SCHEME))
+    parser.add_argument('--cost', type=int, help='bcrypt rounds or pbkdf2 iterations')
+    parser.add_argument('--threads', default='1,2,4', help='Comma-separated thread counts to try')
+    parser.add_argument('--duration', type=float, default=3.0, help='Seconds per measurement')
+    args = parser.parse_args()
+
+    try:
+        hasher = create_hasher(args.scheme, args.cost)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return False
+
+    cores = os.cpu_count() or 1
+    password = 'benchmark-password'
+
+    start = time.perf_counter()
+    password_hash = hasher.hash(password)
+    hash_ms = (time.perf_counter() - start) * 1000
+
+    print(f"🔐 Scheme: {args.scheme}  cost: {args.cost or 'default'}  cores: {cores}")
+    print(f"   Single hash: {hash_ms:.1f} ms")
+    print("=" * 50)
+    print(f"{'threads':>8} {'logins/sec':>12} {'per core':>10} {'ms/login':>10}")
+
+    for threads in [int(t) for t in args.threads.split(',') if t.strip()]:
+        total, elapsed = measure(hasher, password_hash, password, threads, args.duration)
+        rate = total / elapsed
+        per_core = rate / min(threads, cores)
+        print(f"{threads:>8} {rate:>12.1f} {per_core:>10.1f} {1000 / per_core:>10.1f}")
+
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+Bulk import pipeline for AyurSutra
+Streams CSV/JSON records for a new clinic and loads them with batched Core inserts
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from datetime import datetime
+
+from database import db
+from models import (
+    User, Patient, Practitioner, TreatmentType, TreatmentProgram, Session, WellnessLog,
+    UserType, Gender, DoshaType, SessionStatus, EnergyLevel, SleepQuality, Mood, StressLevel
+)
+from password_hashing import hash_passwords
+
+DEFAULT_BATCH_SIZE = 500
+
+# Import order matters: sessions and wellness logs reference patients/practitioners by email
+IMPORT_ENTITIES = ('practitioners', 'patients', 'sessions', 'wellness_logs')
+
+# Accounts imported without a password get a hash that never verifies,
+# so users must go through password reset before logging in
+UNUSABLE_PASSWORD = '!'
+
+class RowError(ValueError):
+    """Raised when a single input row fails validation"""
+
+class ImportReport:
+    """Counts and per-row errors collected during an import"""
+
+    def __init__(self, entity):
+        self.entity = entity
+        self.inserted = 0
+        self.skipped = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.errors.append((line, message))
+
+    def to_dict(self):
+        return {
+            'entity': self.entity,
+            'inserted': self.inserted,
+            'skipped': self.skipped,
+            'failed': len(self.errors),
+            'errors': [{'line': line, 'message': message} for line, message in self.errors]
+        }
+
+# ---------------------------------------------------------------------------
+# Input readers
+# ---------------------------------------------------------------------------
+
+def read_records(path, input_format=None):
+    """Yield (line_number, record) pairs from a CSV, JSON Lines or JSON file"""
+    input_format = input_format or os.path.splitext(path)[1].lstrip('.').lower()
+
+    if input_format == 'csv':
+        with open(path, newline='', encoding='utf-8') as handle:
+            reader = csv.DictReader(handle)
+            for record in reader:
+                # Header is line 1, so the first record is reported as line 2
+                yield reader.line_num, {k.strip(): (v.strip() if isinstance(v, str) else v)
+                                        for k, v in record.items() if k}
+
+    elif input_format in ('ndjson', 'jsonl'):
+        with open(path, encoding='utf-8') as handle:
+            for line_number, line in enumerate(handle, start=1):
+                if line.strip():
+                    yield line_number, json.loads(line)
+
+    elif input_format == 'json':
+        # A JSON array has to be parsed whole; prefer JSON Lines for large files
+        with open(path, encoding='utf-8') as handle:
+            for index, record in enumerate(json.load(handle), start=1):
+                yield index, record
+
+    else:
+        raise ValueError(f"Unsupported input format '{input_format}'")
+
+def iter_batches(records, batch_size):
+    """Group an iterable of records into lists of at most batch_size"""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+# ---------------------------------------------------------------------------
+# Field parsing helpers
+# ---------------------------------------------------------------------------
+
+def _required(record, field):
+    value = record.get(field)
+    if value in (None, ''):
+        raise RowError(f"Missing required field '{field}'")
+    return value
+
+def _parse_date(value, field):
+    if value in (None, ''):
+        return None
+    try:
+        return datetime.strptime(str(value), '%Y-%m-%d').date()
+    except ValueError:
+        raise RowError(f"Invalid {field} '{value}', use YYYY-MM-DD")
+
+def _parse_time(value, field):
+    for fmt in ('%H:%M', '%H:%M:%S'):
+        try:
+            return datetime.strptime(str(value), fmt).time()
+        except ValueError:
+            continue
+    raise RowError(f"Invalid {field} '{value}', use HH:MM")
+
+def _parse_int(value, field, default=None):
+    if value in (None, ''):
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RowError(f"Invalid {field} '{value}', expected a whole number")
+
+def _parse_bool(value, default=True):
+    if value in (None, ''):
+        return default
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ('1', 'true', 'yes', 'y')
+
+def _parse_enum(enum_cls, value, field, default=None):
+    if value in (None, ''):
+        return default
+    try:
+        return enum_cls(str(value).lower())
+    except ValueError:
+        allowed = ', '.join(member.value for member in enum_cls)
+        raise RowError(f"Invalid {field} '{value}', expected one of: {allowed}")
+
+def _normalize_email(value):
+    email = str(value).strip().lower()
+    if '@' not in email:
+        raise RowError(f"Invalid email '{value}'")
+    return email
+
+# ---------------------------------------------------------------------------
+# Importer
+# ---------------------------------------------------------------------------
+
+class BulkImporter:
+    """Loads clinic records in batches, resolving foreign keys through in-memory maps"""
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._user_ids = None
+        self._patient_ids = None
+        self._practitioner_ids = None
+        self._treatments = None
+        self._program_ids = None
+
+    # -- lookup maps, loaded once per importer ------------------------------
+
+    @property
+    def user_ids(self):
+        if self._user_ids is None:
+            rows = db.session.execute(db.select(User.email, User.id))
+            self._user_ids = {email.lower(): user_id for email, user_id in rows}
+        return self._user_ids
+
+    @property
+    def patient_ids(self):
+        if self._patient_ids is None:
+            rows = db.session.execute(db.select(User.email, Patient.id).join(Patient, Patient.user_id == User.id))
+            self._patient_ids = {email.lower(): patient_id for email, patient_id in rows}
+        return self._patient_ids
+
+    @property
+    def practitioner_ids(self):
+        if self._practitioner_ids is None:
+            rows = db.session.execute(
+                db.select(User.email, Practitioner.id).join(Practitioner, Practitioner.user_id == User.id)
+            )
+            self._practitioner_ids = {email.lower(): practitioner_id for email, practitioner_id in rows}
+        return self._practitioner_ids
+
+    @property
+    def treatments(self):
+        if self._treatments is None:
+            rows = db.session.execute(db.select(TreatmentType.name, TreatmentType.id, TreatmentType.duration_minutes))
+            self._treatments = {name.lower(): (treatment_id, duration) for name, treatment_id, duration in rows}
+        return self._treatments
+
+    @property
+    def program_ids(self):
+        if self._program_ids is None:
+            rows = db.session.execute(db.select(TreatmentProgram.name, TreatmentProgram.id))
+            self._program_ids = {name.lower(): program_id for name, program_id in rows}
+        return self._program_ids
+
+    # -- entry points --------------------------------------------------------
+
+    def import_file(self, entity, path, input_format=None):
+        """Import one file and return an ImportReport"""
+        return self.import_records(entity, read_records(path, input_format))
+
+    def import_records(self, entity, records):
+        """Import an iterable of (line_number, record) pairs"""
+        if entity not in IMPORT_ENTITIES:
+            raise ValueError(f"Unknown entity '{entity}'")
+
+        handler = getattr(self, f'_import_{entity}_batch')
+        report = ImportReport(entity)
+
+        for batch in iter_batches(records, self.batch_size):
+            handler(batch, report)
+            db.session.commit()
+
+        return report
+
+    # -- users with a patient/practitioner profile ---------------------------
+
+    def _prepare_user(self, record, user_type, seen):
+        email = _normalize_email(_required(record, 'email'))
+        if email in seen:
+            raise RowError(f"Duplicate email '{email}' in input")
+
+        if record.get('password_hash'):
+            password_hash = record['password_hash']
+        elif record.get('password'):
+            # Hashed per batch on the hashing pool, and only once the row is known to be new
+            password_hash = None
+        else:
+            password_hash = UNUSABLE_PASSWORD
+
+        seen.add(email)
+        return {
+            'email': email,
+            'password_hash': password_hash,
+            'first_name': _required(record, 'first_name'),
+            'last_name': _required(record, 'last_name'),
+            'phone': record.get('phone') or None,
+            'date_of_birth': _parse_date(record.get('date_of_birth'), 'date_of_birth'),
+            'gender': _parse_enum(Gender, record.get('gender'), 'gender'),
+            'user_type': user_type,
+            'is_active': _parse_bool(record.get('is_active')),
+        }
+
+    def _import_profiles(self, batch, report, user_type, profile_table, id_map, build_profile):
+        users = []
+        profiles = []
+        passwords = []
+        seen = set()
+
+        for line, record in batch:
+            try:
+                user_row = self._prepare_user(record, user_type, seen)
+                if user_row['email'] in self.user_ids:
+                    report.skipped += 1
+                    continue
+                profile_row = build_profile(record)
+            except RowError as e:
+                report.add_error(line, str(e))
+                continue
+            users.append((line, user_row))
+            profiles.append(profile_row)
+            if user_row['password_hash'] is None:
+                passwords.append((user_row, str(record['password'])))
+
+        # bcrypt at cost 12 takes ~0.25 s per password, so hash the batch in parallel
+        hashes = hash_passwords([password for _, password in passwords])
+        for (user_row, _), password_hash in zip(passwords, hashes):
+            user_row['password_hash'] = password_hash
+
+        inserted_users = self._insert_rows(User.__table__, users, report, count=False)
+        if not inserted_users:
+            return
+
+        # MySQL has no INSERT ... RETURNING, so resolve the new ids in one query
+        emails = [row['email'] for _, row in inserted_users]
+        new_ids = dict(db.session.execute(db.select(User.email, User.id).where(User.email.in_(emails))).all())
+        self.user_ids.update({email.lower(): user_id for email, user_id in new_ids.items()})
+
+        profile_by_email = {row['email']: profile for (_, row), profile in zip(users, profiles)}
+        profile_rows = []
+        for line, row in inserted_users:
+            profile = dict(profile_by_email[row['email']], user_id=new_ids[row['email']])
+            profile_rows.append((line, profile))
+
+        inserted_profiles = self._insert_rows(profile_table, profile_rows, report)
+
+        # A user left without its profile would be skipped as existing on every re-import
+        orphaned = {row['user_id'] for _, row in profile_rows} - {row['user_id'] for _, row in inserted_profiles}
+        if orphaned:
+            db.session.execute(User.__table__.delete().where(User.id.in_(orphaned)))
+            for email, user_id in new_ids.items():
+                if user_id in orphaned:
+                    self.user_ids.pop(email.lower(), None)
+
+        rows = db.session.execute(
+            db.select(User.email, profile_table.c.id)
+            .join(profile_table, profile_table.c.user_id == User.id)
+            .where(User.email.in_(emails))
+        )
+        id_map.update({email.lower(): profile_id for email, profile_id in rows})
+
+    def _import_patients_batch(self, batch, report):
+        def build_profile(record):
+            return {
+                'medical_history': record.get('medical_history') or None,
+                'allergies': record.get('allergies') or None,
+                'current_medications': record.get('current_medications') or None,
+                'emergency_contact_name': record.get('emergency_contact_name') or None,
+                'emergency_contact_phone': record.get('emergency_contact_phone') or None,
+                'dosha_type': _parse_enum(DoshaType, record.get('dosha_type'), 'dosha_type', DoshaType.MIXED),
+            }
+
+        self._import_profiles(batch, report, UserType.PATIENT, Patient.__table__, self.patient_ids, build_profile)
+
+    def _import_practitioners_batch(self, batch, report):
+        def build_profile(record):
+            return {
+                'license_number': record.get('license_number') or None,
+                'specialization': record.get('specialization') or None,
+                'experience_years': _parse_int(record.get('experience_years'), 'experience_years', 0),
+                'bio': record.get('bio') or None,
+                'consultation_fee': record.get('consultation_fee') or None,
+                'is_available': _parse_bool(record.get('is_available')),
+            }
+
+        self._import_profiles(batch, report, UserType.PRACTITIONER, Practitioner.__table__,
+                              self.practitioner_ids, build_profile)
+
+    # -- history -------------------------------------------------------------
+
+    def _resolve(self, id_map, record, field, label):
+        email = _normalize_email(_required(record, field))
+        if email not in id_map:
+            raise RowError(f"Unknown {label} '{email}'")
+        return id_map[email]
+
+    def _import_sessions_batch(self, batch, report):
+        rows = []
+        for line, record in batch:
+            try:
+                treatment_name = str(_required(record, 'treatment')).lower()
+                if treatment_name not in self.treatments:
+                    raise RowError(f"Unknown treatment '{record['treatment']}'")
+                treatment_id, treatment_duration = self.treatments[treatment_name]
+
+                program_id = None
+                if record.get('program'):
+                    program_id = self.program_ids.get(str(record['program']).lower())
+                    if program_id is None:
+                        raise RowError(f"Unknown program '{record['program']}'")
+
+                rows.append((line, {
+                    'patient_id': self._resolve(self.patient_ids, record, 'patient_email', 'patient'),
+                    'practitioner_id': self._resolve(self.practitioner_ids, record, 'practitioner_email', 'practitioner'),
+                    'treatment_id': treatment_id,
+                    'program_id': program_id,
+                    'scheduled_date': _parse_date(_required(record, 'scheduled_date'), 'scheduled_date'),
+                    'scheduled_time': _parse_time(_required(record, 'scheduled_time'), 'scheduled_time'),
+                    'duration_minutes': _parse_int(record.get('duration_minutes'), 'duration_minutes', treatment_duration),
+                    'status': _parse_enum(SessionStatus, record.get('status'), 'status', SessionStatus.COMPLETED),
+                    'notes': record.get('notes') or None,
+                    'post_session_notes': record.get('post_session_notes') or None,
+                    'rating': _parse_int(record.get('rating'), 'rating'),
+                    'feedback': record.get('feedback') or None,
+                }))
+            except RowError as e:
+                report.add_error(line, str(e))
+
+        self._insert_rows(Session.__table__, rows, report)
+
+    def _import_wellness_logs_batch(self, batch, report):
+        rows = []
+        seen = set()
+        for line, record in batch:
+            try:
+                patient_id = self._resolve(self.patient_ids, record, 'patient_email', 'patient')
+                log_date = _parse_date(_required(record, 'log_date'), 'log_date')
+                if (patient_id, log_date) in seen:
+                    raise RowError(f"Duplicate wellness log for {record['patient_email']} on {log_date}")
+                seen.add((patient_id, log_date))
+
+                rows.append((line, {
+                    'patient_id': patient_id,
+                    'log_date': log_date,
+                    'energy_level': _parse_enum(EnergyLevel, _required(record, 'energy_level'), 'energy_level'),
+                    'sleep_quality': _parse_enum(SleepQuality, _required(record, 'sleep_quality'), 'sleep_quality'),
+                    'mood': _parse_enum(Mood, _required(record, 'mood'), 'mood'),
+                    'stress_level': _parse_enum(StressLevel, _required(record, 'stress_level'), 'stress_level'),
+                    'symptoms': record.get('symptoms') or None,
+                    'notes': record.get('notes') or None,
+                }))
+            except RowError as e:
+                report.add_error(line, str(e))
+
+        self._insert_rows(WellnessLog.__table__, rows, report)
+
+    # -- inserts -------------------------------------------------------------
+
+    def _insert_rows(self, table, rows, report, count=True):
+        """Insert validated rows with one executemany; isolate failures row by row
+
+        Returns the (line, row) pairs that were inserted.
+        """
+        if not rows:
+            return []
+
+        try:
+            with db.session.begin_nested():
+                db.session.execute(table.insert(), [row for _, row in rows])
+            inserted = rows
+        except Exception:
+            # Something in the batch violated a constraint; retry individually so
+            # one bad row doesn't discard the rest of the batch
+            inserted = []
+            for line, row in rows:
+                try:
+                    with db.session.begin_nested():
+                        db.session.execute(table.insert(), row)
+                    inserted.append((line, row))
+                except Exception as e:
+                    report.add_error(line, str(getattr(e, 'orig', e)))
+
+        if count:
+            report.inserted += len(inserted)
+        return inserted
+
+def write_error_report(report, path):
+    """Write per-row errors to a CSV file"""
+    with open(path, 'w', newline='', encoding='utf-8') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(['entity', 'line', 'message'])
+        for line, message in report.errors:
+            writer.writerow([report.entity, line, message])
+
+def main():
+    """Run a bulk import from the command line"""
+    parser = argparse.ArgumentParser(description='Bulk import AyurSutra clinic data')
+    parser.add_argument('entity', choices=IMPORT_ENTITIES,
+                        help='Import practitioners and patients before sessions and wellness logs')
+    parser.add_argument('path', help='CSV, JSON Lines (.ndjson/.jsonl) or JSON file')
+    parser.add_argument('--format', dest='input_format', choices=('csv', 'ndjson', 'jsonl', 'json'))
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--errors', help='Write per-row errors to this CSV file')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        print(f"❌ File not found: {args.path}")
+        return False
+
+    from app import create_app
+    app = create_app('cli')
+
+    try:
+        with app.app_context():
+            print(f"🔄 Importing {args.entity} from {args.path}...")
+            importer = BulkImporter(batch_size=args.batch_size)
+            report = importer.import_file(args.entity, args.path, args.input_format)
+
+        print(f"✅ Inserted: {report.inserted}")
+        print(f"ℹ️  Skipped (already present): {report.skipped}")
+        if report.errors:
+            print(f"⚠️  Failed rows: {len(report.errors)}")
+            if args.errors:
+                write_error_report(report, args.errors)
+                print(f"📝 Error report written to {args.errors}")
+            else:
+                for line, message in report.errors[:20]:
+                    print(f"   line {line}: {message}")
+                if len(report.errors) > 20:
+                    print(f"   ... and {len(report.errors) - 20} more (use --errors to save them all)")
+
+        return True
+
+    except Exception as e:
+        print(f"❌ Import failed: {e}")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,264 @@
+"""
+Practitioner calendars for AyurSutra
+Compiles working hours, holidays and time zone into per-month tables of UTC minute intervals,
+so slot generation and overlap checks do integer arithmetic instead of per-slot tz conversion.
+Commits in this process drop the compiled months at once; other processes notice through a
+cheap version stamp checked at most every few seconds
+"""
+
+import calendar
+import threading
+from datetime import date, datetime, time, timedelta
+from time import monotonic
+
+import pytz
+from flask import current_app
+from sqlalchemy import event, func, inspect, or_, select
+from sqlalchemy.orm import Session as OrmSession
+
+from database import db
+from models import Practitioner, WorkingHours, Holiday, Session, SessionStatus
+from metrics import register_cache
+from ttl_cache import TTLCache
+
+# Used for practitioners without WorkingHours rows: Monday-Saturday, 09:00-18:00 local
+DEFAULT_WORKING_HOURS = {weekday: [(time(9, 0), time(18, 0))] for weekday in range(6)}
+
+SLOT_MINUTES = 30
+
+BUSY_STATUSES = (SessionStatus.SCHEDULED, SessionStatus.CONFIRMED, SessionStatus.IN_PROGRESS)
+
+_EPOCH = datetime(1970, 1, 1)
+
+DEFAULT_CHECK_INTERVAL = 5
+
+# (practitioner_id, year, month) -> CompiledMonth; cleared whenever calendar inputs change
+_compiled = TTLCache(maxsize=2048, ttl=3600)
+register_cache('calendars', _compiled)
+
+# Version stamp of the calendar inputs the compiled months were built from, and when it was last read
+_stamp = {'version': None, 'checked_at': None}
+_stamp_lock = threading.Lock()
+
+def get_timezone(name=None):
+    """pytz zone for name, falling back to CLINIC_TIMEZONE"""
+    return pytz.timezone(name or current_app.config.get('CLINIC_TIMEZONE', 'UTC'))
+
+def to_utc_minutes(tz, day, clock):
+    """Minutes since the Unix epoch (UTC) for a local wall-clock time"""
+    local = tz.localize(datetime.combine(day, clock))
+    return int((local.astimezone(pytz.utc).replace(tzinfo=None) - _EPOCH).total_seconds()) // 60
+
+def minutes_to_utc(minutes):
+    """Naive UTC datetime for minutes since the epoch"""
+    return _EPOCH + timedelta(minutes=minutes)
+
+class CompiledDay:
+    """Working intervals of one local day as UTC epoch minutes
+
+    offset is the UTC offset in minutes at local noon. On most days it converts any wall-clock
+    time with one addition; on the days a DST transition falls on, tz is kept and conversions
+    go through it, since the offset differs on either side of the change.
+    """
+
+    __slots__ = ('day', 'intervals', 'midnight', 'offset', 'tz')
+
+    def __init__(self, day, intervals, midnight, offset, tz=None):
+        self.day = day
+        self.intervals = intervals
+        self.midnight = midnight
+        self.offset = offset
+        self.tz = tz
+
+    def local_to_utc(self, minute_of_day):
+        if self.tz is not None:
+            return to_utc_minutes(self.tz, self.day, time(minute_of_day // 60, minute_of_day % 60))
+        return self.midnight + minute_of_day - self.offset
+
+    def utc_to_local(self, minutes):
+        """Wall-clock minute of the day for a UTC minute; repeated hours map to the same minutes"""
+        if self.tz is not None:
+            local = self.tz.fromutc(minutes_to_utc(minutes)).replace(tzinfo=None)
+            return int((local - datetime.combine(self.day, time(0, 0))).total_seconds()) // 60
+        return minutes - self.midnight + self.offset
+
+class CompiledMonth:
+    """One practitioner's working calendar for a month"""
+
+    def __init__(self, practitioner_id, timezone, year, month, days):
+        self.practitioner_id = practitioner_id
+        self.timezone = timezone
+        self.year = year
+        self.month = month
+        self.days = days
+
+    def to_dict(self):
+        return {
+            'practitioner_id': self.practitioner_id,
+            'timezone': self.timezone,
+            'year': self.year,
+            'month': self.month,
+            'days': {
+                day.isoformat(): {
+                    'utc_offset_minutes': compiled.offset,
+                    'intervals': [[minutes_to_utc(start).isoformat() + 'Z', minutes_to_utc(end).isoformat() + 'Z']
+                                  for start, end in compiled.intervals]
+                }
+                for day, compiled in sorted(self.days.items())
+            }
+        }
+
+def compile_month(practitioner, year, month):
+    """Build the CompiledMonth for a practitioner with two queries; tz conversions happen only here"""
+    tz = get_timezone(practitioner.timezone)
+
+    hours = {}
+    for row in WorkingHours.query.filter_by(practitioner_id=practitioner.id).order_by(WorkingHours.start_time):
+        hours.setdefault(row.weekday, []).append((row.start_time, row.end_time))
+    if not hours:
+        hours = DEFAULT_WORKING_HOURS
+
+    first = date(year, month, 1)
+    last = date(year, month, calendar.monthrange(year, month)[1])
+    holidays = {
+        row.holiday_date for row in Holiday.query.filter(
+            Holiday.holiday_date.between(first, last),
+            or_(Holiday.practitioner_id.is_(None), Holiday.practitioner_id == practitioner.id)
+        )
+    }
+
+    days = {}
+    day = first
+    while day <= last:
+        noon = tz.localize(datetime.combine(day, time(12, 0)))
+        offset = int(noon.utcoffset().total_seconds()) // 60
+        midnight = int((datetime.combine(day, time(0, 0)) - _EPOCH).total_seconds()) // 60
+        intervals = []
+        if day not in holidays:
+            for start, end in hours.get(day.weekday(), ()):
+                intervals.append((to_utc_minutes(tz, day, start), to_utc_minutes(tz, day, end)))
+        start_offset = tz.localize(datetime.combine(day, time(0, 0))).utcoffset()
+        end_offset = tz.localize(datetime.combine(day, time(23, 59))).utcoffset()
+        days[day] = CompiledDay(day, intervals, midnight, offset, tz if start_offset != end_offset else None)
+        day += timedelta(days=1)
+
+    return CompiledMonth(practitioner.id, tz.zone, year, month, days)
+
+def _version():
+    """(row count, latest updated_at) of working hours, holidays and practitioners in one query"""
+    stamps = []
+    for model in (WorkingHours, Holiday, Practitioner):
+        stamps += [select(func.count(model.id)).scalar_subquery(), select(func.max(model.updated_at)).scalar_subquery()]
+    return tuple(db.session.query(*stamps).one())
+
+def _check_version():
+    """Drop compiled months when another process changed their inputs; one query per check interval"""
+    checked_at = _stamp['checked_at']
+    interval = current_app.config.get('CALENDAR_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL)
+    if checked_at is not None and monotonic() - checked_at < interval:
+        return
+    # Another thread is already checking; keep using the current months meanwhile
+    if not _stamp_lock.acquire(blocking=checked_at is None):
+        return
+    try:
+        version = _version()
+        if version != _stamp['version']:
+            _compiled.clear()
+            _stamp['version'] = version
+        _stamp['checked_at'] = monotonic()
+    finally:
+        _stamp_lock.release()
+
+def get_month(practitioner_id, year, month):
+    """Cached CompiledMonth, or None for an unknown practitioner"""
+    _check_version()
+    key = (practitioner_id, year, month)
+    compiled = _compiled.get(key)
+    if compiled is None:
+        practitioner = db.session.get(Practitioner, practitioner_id)
+        if practitioner is None:
+            return None
+        compiled = compile_month(practitioner, year, month)
+        _compiled.set(key, compiled)
+    return compiled
+
+def get_day(practitioner_id, day):
+    month = get_month(practitioner_id, day.year, day.month)
+    return month.days[day] if month else None
+
+def booked_intervals(practitioner_id, compiled_day, exclude_session_id=None):
+    """Sorted UTC minute intervals of the practitioner's active bookings that day"""
+    query = db.session.query(Session.id, Session.scheduled_time, Session.duration_minutes).filter(
+        Session.practitioner_id == practitioner_id,
+        Session.scheduled_date == compiled_day.day,
+        Session.status.in_(BUSY_STATUSES)
+    )
+    intervals = []
+    for session_id, start_time, duration in query:
+        if session_id == exclude_session_id:
+            continue
+        start = compiled_day.local_to_utc(start_time.hour * 60 + start_time.minute)
+        intervals.append((start, start + (duration or 0)))
+    intervals.sort()
+    return intervals
+
+def available_slots(practitioner_id, day, duration, step=SLOT_MINUTES, now=None, exclude_session_id=None):
+    """Slots of `duration` minutes on a local day, in the shape schedule.js renders
+
+    Returns None for an unknown practitioner.
+    """
+    compiled_day = get_day(practitioner_id, day)
+    if compiled_day is None:
+        return None
+
+    booked = booked_intervals(practitioner_id, compiled_day, exclude_session_id)
+    now_minutes = int(((now or datetime.utcnow()) - _EPOCH).total_seconds()) // 60
+
+    slots = []
+    for start, end in compiled_day.intervals:
+        slot = start
+        while slot + duration <= end:
+            slot_end = slot + duration
+            free = slot >= now_minutes and not any(b_start < slot_end and slot < b_end for b_start, b_end in booked)
+            local = compiled_day.utc_to_local(slot)
+            clock = time(local // 60, local % 60)
+            slots.append({
+                'time': clock.strftime('%H:%M'),
+                'display_time': clock.strftime('%I:%M %p').lstrip('0'),
+                'available': free,
+                'utc': minutes_to_utc(slot).isoformat() + 'Z'
+            })
+            slot += step
+    return slots
+
+def session_start_utc(session):
+    """Naive UTC start of a session whose date/time are in its practitioner's local time"""
+    compiled_day = get_day(session.practitioner_id, session.scheduled_date)
+    if compiled_day is None:
+        return None
+    clock = session.scheduled_time
+    return minutes_to_utc(compiled_day.local_to_utc(clock.hour * 60 + clock.minute))
+
+def invalidate():
+    _compiled.clear()
+
+# Compiled months depend on working hours, holidays and practitioner time zones
+
+@event.listens_for(OrmSession, 'after_flush')
+def _mark_changes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, (WorkingHours, Holiday)) or (
+                isinstance(obj, Practitioner) and obj in session.dirty
+                and inspect(obj).attrs.timezone.history.has_changes()):
+            session.info['_calendars_dirty'] = True
+            return
+
+@event.listens_for(OrmSession, 'after_commit')
+def _invalidate_on_commit(session):
+    if session.info.pop('_calendars_dirty', False):
+        invalidate()
+
+@event.listens_for(OrmSession, 'after_soft_rollback')
+def _discard_on_rollback(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('_calendars_dirty', None)
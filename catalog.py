@@ -0,0 +1,134 @@
+"""
+Treatment catalog for AyurSutra
+Active treatments and programs, with each program's sessions resolved in order, built into one
+immutable, pre-serialized snapshot per process. Commits in this process swap in a new snapshot on
+the next read, other processes notice through a cheap version stamp checked at most every few
+seconds; responses carry an ETag so unchanged catalogs revalidate with a 304
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session as OrmSession
+
+from database import db
+from models import TreatmentType, TreatmentProgram, ProgramTreatment
+
+CATALOG_MODELS = (TreatmentType, TreatmentProgram, ProgramTreatment)
+
+DEFAULT_CHECK_INTERVAL = 5
+
+def _serialize(data):
+    payload = json.dumps({'success': True, 'data': data}, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return payload, hashlib.sha256(payload).hexdigest()[:32]
+
+class CatalogSnapshot:
+    """Treatments and programs as plain dicts plus their JSON payloads and ETags"""
+
+    def __init__(self, treatments, programs, version):
+        self.treatments = tuple(treatments)
+        self.programs = tuple(programs)
+        self.payload, self.etag = _serialize({'treatments': self.treatments, 'programs': self.programs})
+        # Just the treatment list, in the shape the schedule page already reads
+        self.treatments_payload, self.treatments_etag = _serialize({'treatments': self.treatments})
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+def _version():
+    """(row count, latest updated_at) of each catalog table in one query: changes on insert, update and delete"""
+    stamps = []
+    for model in CATALOG_MODELS:
+        stamps += [select(func.count(model.id)).scalar_subquery(), select(func.max(model.updated_at)).scalar_subquery()]
+    return tuple(db.session.query(*stamps).one())
+
+def build_snapshot(version=None):
+    """Three queries: treatments, programs and the session order of every active program"""
+    treatments = {treatment.id: treatment for treatment in TreatmentType.query.all()}
+    programs = TreatmentProgram.query.filter_by(is_active=True).order_by(TreatmentProgram.name).all()
+    steps = ProgramTreatment.query.filter(
+        ProgramTreatment.program_id.in_([program.id for program in programs])
+    ).order_by(ProgramTreatment.program_id, ProgramTreatment.session_order).all() if programs else []
+
+    sessions = {}
+    for step in steps:
+        treatment = treatments.get(step.treatment_id)
+        sessions.setdefault(step.program_id, []).append({
+            'session_order': step.session_order,
+            'treatment_id': step.treatment_id,
+            'treatment_name': treatment.name if treatment else None,
+            'duration_minutes': treatment.duration_minutes if treatment else None
+        })
+
+    active = sorted((t for t in treatments.values() if t.is_active), key=lambda t: (t.name.lower(), t.id))
+    return CatalogSnapshot(
+        [treatment.to_dict() for treatment in active],
+        [dict(program.to_dict(), sessions=sessions.get(program.id, [])) for program in programs],
+        version
+    )
+
+class Catalog:
+    """Process-wide snapshot, rebuilt lazily after local commits or when the version stamp moves"""
+
+    def __init__(self):
+        self._snapshot = None
+        self._dirty = True
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+
+    def invalidate(self):
+        self._dirty = True
+
+    def _fresh(self, snapshot, interval):
+        return not self._dirty and snapshot is not None and time.monotonic() - snapshot.loaded_at < interval
+
+    def get(self):
+        """Current snapshot; at most one version query per check interval"""
+        interval = current_app.config.get('CATALOG_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL)
+        snapshot = self._snapshot
+        if self._fresh(snapshot, interval):
+            return snapshot
+
+        # Readers keep the previous snapshot while another thread checks or builds the next one
+        if not self._lock.acquire(blocking=snapshot is None):
+            return snapshot
+        try:
+            snapshot = self._snapshot
+            if self._fresh(snapshot, interval):
+                return snapshot  # another thread refreshed it
+
+            version = _version()
+            if snapshot is not None and not self._dirty and snapshot.version == version:
+                snapshot.loaded_at = time.monotonic()
+                return snapshot
+
+            # Clear the flag first so a commit landing mid-build triggers another rebuild
+            self._dirty = False
+            self._snapshot = build_snapshot(version)
+            self.rebuilds += 1
+            return self._snapshot
+        finally:
+            self._lock.release()
+
+catalog = Catalog()
+
+# Rebuild after commits that add, change or remove treatments, programs or their ordering
+
+@event.listens_for(OrmSession, 'after_flush')
+def _mark_changes(session, flush_context):
+    if any(isinstance(obj, (TreatmentType, TreatmentProgram, ProgramTreatment))
+           for obj in (*session.new, *session.dirty, *session.deleted)):
+        session.info['_catalog_dirty'] = True
+
+@event.listens_for(OrmSession, 'after_commit')
+def _invalidate_on_commit(session):
+    if session.info.pop('_catalog_dirty', False):
+        catalog.invalidate()
+
+@event.listens_for(OrmSession, 'after_soft_rollback')
+def _discard_on_rollback(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('_catalog_dirty', None)
@@ -0,0 +1,215 @@
+"""
+Contact submission triage for AyurSutra
+Folds repeat submissions into one inbox row, caps bursts per email address, and serves the
+admin inbox with keyset pagination over the (status, is_urgent, created_at) index
+"""
+
+import base64
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, func, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from models import ContactSubmission
+from query_cache import cached_query
+
+STATUSES = ('new', 'read', 'replied', 'closed')
+
+# target status -> statuses it can be reached from
+TRANSITIONS = {
+    'read': ('new',),
+    'replied': ('new', 'read'),
+    'closed': ('new', 'read', 'replied'),
+    'new': ('read', 'closed'),  # reopen
+}
+
+# Identical email + subject within this window updates the open submission instead of adding one
+DEDUP_WINDOW = timedelta(hours=24)
+
+# Distinct submissions accepted per email address per hour
+MAX_PER_EMAIL_PER_HOUR = 5
+
+MAX_BATCH = 500
+MAX_PAGE_SIZE = 100
+
+class TriageError(ValueError):
+    """Raised for invalid submissions, transitions or cursors"""
+
+class TooManySubmissions(TriageError):
+    """Raised when an email address exceeds the hourly submission cap"""
+
+def fingerprint(email, subject):
+    normalized = f"{email.strip().lower()}\n{' '.join(subject.lower().split())}"
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+def _text(data, field):
+    value = data.get(field)
+    if value is None:
+        return ''
+    if isinstance(value, (dict, list)):
+        raise TriageError(f'{field} must be text')
+    return str(value).strip()
+
+def _fold(existing, is_urgent, now):
+    values = {'repeat_count': func.coalesce(ContactSubmission.repeat_count, 0) + 1, 'last_received_at': now}
+    if is_urgent and not existing.is_urgent:
+        values['is_urgent'] = True
+    db.session.execute(update(ContactSubmission).where(ContactSubmission.id == existing.id).values(**values))
+    db.session.commit()
+    return existing, False
+
+def accept_submission(data, now=None):
+    """Store a contact form submission, folding repeats; commits and returns (submission, created)
+
+    A repeat of an open (new/read) submission within DEDUP_WINDOW bumps its repeat_count
+    instead of inserting. Raises TriageError for missing fields and TooManySubmissions
+    when the sender is over the hourly cap.
+    """
+    now = now or datetime.utcnow()
+    if not isinstance(data, dict):
+        raise TriageError('Expected a JSON object')
+    fields = {field: _text(data, field) for field in ('name', 'email', 'subject', 'message', 'phone')}
+    missing = [field for field in ('name', 'email', 'subject', 'message') if not fields[field]]
+    if missing:
+        raise TriageError(f"Missing required fields: {', '.join(missing)}")
+
+    email = fields['email'].lower()
+    digest = fingerprint(email, fields['subject'])
+
+    existing = ContactSubmission.query.filter(
+        ContactSubmission.fingerprint == digest,
+        ContactSubmission.status.in_(('new', 'read')),
+        ContactSubmission.created_at >= now - DEDUP_WINDOW
+    ).order_by(ContactSubmission.id.desc()).first()
+    if existing:
+        return _fold(existing, data.get('is_urgent'), now)
+
+    recent = db.session.query(func.count(ContactSubmission.id)).filter(
+        ContactSubmission.email == email,
+        ContactSubmission.created_at >= now - timedelta(hours=1)
+    ).scalar()
+    if recent >= MAX_PER_EMAIL_PER_HOUR:
+        raise TooManySubmissions('Too many messages from this address, please try again later')
+
+    # An open submission that aged out of the window gives up the key to the new one
+    db.session.execute(update(ContactSubmission).where(
+        ContactSubmission.open_key == digest, ContactSubmission.created_at < now - DEDUP_WINDOW
+    ).values(open_key=None))
+    submission = ContactSubmission(
+        name=fields['name'][:100],
+        email=email[:255],
+        phone=fields['phone'][:20] or None,
+        subject=fields['subject'][:200],
+        message=fields['message'],
+        is_urgent=bool(data.get('is_urgent')),
+        status='new',
+        fingerprint=digest,
+        open_key=digest,
+        repeat_count=0,
+        last_received_at=now,
+        created_at=now
+    )
+    try:
+        with db.session.begin_nested():
+            db.session.add(submission)
+    except IntegrityError:
+        # A concurrent identical submission was inserted first; fold this one into it
+        existing = ContactSubmission.query.filter_by(open_key=digest).with_for_update().first()
+        if existing is None:
+            raise
+        return _fold(existing, data.get('is_urgent'), now)
+    db.session.commit()
+    return submission, True
+
+def encode_cursor(submission):
+    raw = json.dumps([bool(submission.is_urgent), submission.created_at.isoformat(), submission.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        is_urgent, created_at, submission_id = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return bool(is_urgent), datetime.fromisoformat(created_at), int(submission_id)
+    except (ValueError, TypeError):
+        raise TriageError('Invalid cursor')
+
+def inbox(status='new', cursor=None, limit=50, urgent_only=False):
+    """One page of a status queue, urgent first then newest; returns (submissions, next_cursor)"""
+    if status not in STATUSES:
+        raise TriageError(f"status must be one of {', '.join(STATUSES)}")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    query = ContactSubmission.query.filter(ContactSubmission.status == status)
+    if urgent_only:
+        query = query.filter(ContactSubmission.is_urgent.is_(True))
+    if cursor:
+        is_urgent, created_at, submission_id = decode_cursor(cursor)
+        # Rows after the cursor in (is_urgent DESC, created_at DESC, id DESC) order
+        after_in_group = or_(
+            ContactSubmission.created_at < created_at,
+            and_(ContactSubmission.created_at == created_at, ContactSubmission.id < submission_id)
+        )
+        if is_urgent:
+            query = query.filter(or_(
+                ContactSubmission.is_urgent.is_(False),
+                and_(ContactSubmission.is_urgent.is_(True), after_in_group)
+            ))
+        else:
+            query = query.filter(ContactSubmission.is_urgent.is_(False), after_in_group)
+
+    rows = query.order_by(
+        ContactSubmission.is_urgent.desc(), ContactSubmission.created_at.desc(), ContactSubmission.id.desc()
+    ).limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def transition(submission_ids, status, now=None):
+    """Move submissions to a status in one UPDATE; commits and returns the ids that moved
+
+    Submissions whose current status cannot reach `status` are left alone.
+    """
+    if status not in TRANSITIONS:
+        raise TriageError(f"status must be one of {', '.join(TRANSITIONS)}")
+    ids = sorted({int(submission_id) for submission_id in submission_ids})
+    if not ids:
+        return []
+    if len(ids) > MAX_BATCH:
+        raise TriageError(f'At most {MAX_BATCH} submissions per batch')
+
+    allowed = TRANSITIONS[status]
+    moved = [row.id for row in db.session.query(ContactSubmission.id).filter(
+        ContactSubmission.id.in_(ids), ContactSubmission.status.in_(allowed))]
+    if moved:
+        values = {'status': status}
+        if status == 'replied':
+            values['replied_at'] = now or datetime.utcnow()
+        if status in ('replied', 'closed'):
+            # Answered submissions stop absorbing repeats, so a new message gets its own row
+            values['open_key'] = None
+        db.session.execute(
+            update(ContactSubmission)
+            .where(ContactSubmission.id.in_(moved), ContactSubmission.status.in_(allowed))
+            .values(**values)
+        )
+    db.session.commit()
+    return moved
+
+def status_counts():
+    """Submissions per status plus open urgent ones, from the triage index; cached until submissions change"""
+    # The cached dict is shared, callers get their own copy
+    return dict(_status_counts())
+
+@cached_query('contact_submissions')
+def _status_counts():
+    counts = {status: 0 for status in STATUSES}
+    counts['urgent_open'] = 0
+    rows = db.session.query(
+        ContactSubmission.status, ContactSubmission.is_urgent, func.count(ContactSubmission.id)
+    ).group_by(ContactSubmission.status, ContactSubmission.is_urgent)
+    for status, is_urgent, count in rows:
+        counts[status] = counts.get(status, 0) + count
+        if is_urgent and status in ('new', 'read'):
+            counts['urgent_open'] += count
+    return counts
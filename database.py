@@ -1,4 +1,85 @@
+from contextlib import contextmanager
+import gc
+import sys
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.engine import Engine
 
 # Create database instance
+# This is the only SQLAlchemy() in the project: app.py, models, routes, jobs and
+# scripts all import it from here, so each process has one engine and one pool.
 db = SQLAlchemy()
+
+def engine_options(database_uri, env):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database"""
+    if database_uri.startswith('sqlite'):
+        # SQLite uses a file lock rather than a server connection pool
+        return {}
+    return {
+        'pool_size': int(env.get('DB_POOL_SIZE', 5)),
+        'max_overflow': int(env.get('DB_MAX_OVERFLOW', 10)),
+        'pool_timeout': int(env.get('DB_POOL_TIMEOUT', 30)),
+        # MySQL drops idle connections after wait_timeout (8h by default)
+        'pool_recycle': int(env.get('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': env.get('DB_POOL_PRE_PING', 'true').lower() == 'true',
+    }
+
+# Dialects with a native single-statement upsert
+_UPSERT_DIALECTS = {'mysql': mysql, 'mariadb': mysql, 'postgresql': postgresql, 'sqlite': sqlite}
+
+def upsert(model, rows, index_elements, assignments):
+    """INSERT ... ON DUPLICATE KEY UPDATE (MySQL) / ON CONFLICT DO UPDATE (SQLite, PostgreSQL)
+
+    `assignments(new)` returns the SET clause given the proposed row (`excluded` / `VALUES()`).
+    MySQL applies assignments left to right, so a column other assignments read goes last.
+    index_elements must name a unique index; MySQL uses whichever unique key conflicts.
+    """
+    dialect = _UPSERT_DIALECTS.get(db.session.get_bind().dialect.name)
+    if dialect is None:
+        raise NotImplementedError(f"No upsert for the {db.session.get_bind().dialect.name} dialect")
+
+    stmt = dialect.insert(model).values(rows)
+    if dialect is mysql:
+        # A dict would be emitted in table column order; a list of pairs keeps ours
+        return stmt.on_duplicate_key_update(list(assignments(stmt.inserted).items()))
+    return stmt.on_conflict_do_update(index_elements=index_elements, set_=assignments(stmt.excluded))
+
+@contextmanager
+def session_scope():
+    """Commit on success, roll back on error and release the connection either way
+
+    Requests get this from Flask-SQLAlchemy's app-context teardown; use it for jobs,
+    CLI commands and other work that runs outside a request.
+    """
+    try:
+        yield db.session
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.remove()
+
+def find_duplicate_handles():
+    """Return descriptions of SQLAlchemy handles other than the shared `db`
+
+    Checks every loaded project module for a stray SQLAlchemy() instance and every
+    live Engine for one that doesn't belong to `db`.
+    """
+    problems = []
+    for module_name, module in list(sys.modules.items()):
+        module_file = getattr(module, '__file__', None) or ''
+        if not module_file or 'site-packages' in module_file or 'dist-packages' in module_file:
+            continue
+        for attr, value in list(vars(module).items()):
+            if isinstance(value, SQLAlchemy) and value is not db:
+                problems.append(f"{module_name}.{attr} is a separate SQLAlchemy() instance")
+
+    known = set()
+    for engines in db._app_engines.values():
+        known.update(id(engine) for engine in engines.values())
+    for obj in gc.get_objects():
+        if isinstance(obj, Engine) and id(obj) not in known:
+            problems.append(f"Engine {obj.url!r} is not owned by database.db")
+    return problems
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Streaming data export for AyurSutra
+Exports clinic history as CSV or NDJSON without loading whole tables into memory
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import uuid
+import zlib
+from datetime import datetime, timedelta
+
+from database import db
+from models import Session, WellnessLog, Payment, Feedback, ContactSubmission
+from archive import has_archive, history
+from jobs import job, PermanentJobError
+
+# Rows fetched per round trip from the server-side cursor
+DEFAULT_BATCH_SIZE = 1000
+
+# Rows buffered before a chunk is handed to the response/file
+ROWS_PER_CHUNK = 200
+
+# dataset name -> (model, column used for date filters)
+EXPORT_DATASETS = {
+    'sessions': (Session, 'scheduled_date'),
+    'wellness_logs': (WellnessLog, 'log_date'),
+    'payments': (Payment, 'created_at'),
+    'feedback': (Feedback, 'created_at'),
+    'contact_submissions': (ContactSubmission, 'created_at'),
+}
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+# Where background export jobs write their files
+EXPORT_DIR = os.getenv('EXPORT_DIR', 'exports')
+
+class ExportError(ValueError):
+    """Raised when an export request cannot be satisfied"""
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD string, returning None for empty values"""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ExportError(f"Invalid date '{value}', use YYYY-MM-DD")
+
+def _practitioner_filter(model, entity, practitioner_id):
+    """Build the WHERE clause restricting a dataset to one practitioner"""
+    if model in (Session, Feedback):
+        return entity.practitioner_id == practitioner_id
+    if model is Payment:
+        return Payment.session_id.in_(
+            db.select(Session.id).where(Session.practitioner_id == practitioner_id)
+        )
+    if model is WellnessLog:
+        sessions = history(Session)
+        return entity.patient_id.in_(
+            db.select(sessions.patient_id).where(sessions.practitioner_id == practitioner_id)
+        )
+    raise ExportError(f"Dataset '{model.__tablename__}' cannot be filtered by practitioner")
+
+def build_export_query(dataset, start_date=None, end_date=None, practitioner_id=None):
+    """Build the SELECT statement for a dataset with optional filters"""
+    if dataset not in EXPORT_DATASETS:
+        raise ExportError(f"Unknown dataset '{dataset}'")
+
+    model, date_attr = EXPORT_DATASETS[dataset]
+    # Archived sessions and wellness logs are part of the clinic's history too
+    entity = history(model) if has_archive(model) else model
+    date_column = getattr(entity, date_attr)
+    is_datetime = isinstance(date_column.type, db.DateTime)
+
+    stmt = db.select(entity)
+    if start_date:
+        stmt = stmt.where(date_column >= start_date)
+    if end_date:
+        # Datetime columns need an exclusive upper bound to include the whole end day
+        if is_datetime:
+            stmt = stmt.where(date_column < end_date + timedelta(days=1))
+        else:
+            stmt = stmt.where(date_column <= end_date)
+    if practitioner_id:
+        stmt = stmt.where(_practitioner_filter(model, entity, practitioner_id))
+
+    return stmt.order_by(entity.id)
+
+def iter_export_rows(dataset, start_date=None, end_date=None, practitioner_id=None,
+                     batch_size=DEFAULT_BATCH_SIZE):
+    """Yield serialized rows one at a time using a server-side cursor"""
+    stmt = build_export_query(dataset, start_date, end_date, practitioner_id)
+    stmt = stmt.execution_options(yield_per=batch_size, stream_results=True)
+
+    result = db.session.execute(stmt).scalars()
+    try:
+        for record in result:
+            yield record.to_dict()
+    finally:
+        result.close()
+
+def encode_csv(rows):
+    """Encode dict rows as CSV text chunks, header first"""
+    buffer = io.StringIO()
+    writer = None
+    pending = 0
+
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(row.keys()))
+            writer.writeheader()
+        writer.writerow(row)
+        pending += 1
+        if pending >= ROWS_PER_CHUNK:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def encode_ndjson(rows):
+    """Encode dict rows as newline-delimited JSON text chunks"""
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(row, default=str))
+        if len(lines) >= ROWS_PER_CHUNK:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+def gzip_chunks(chunks):
+    """Gzip-compress a stream of text chunks incrementally"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+def stream_export(dataset, export_format='csv', start_date=None, end_date=None,
+                  practitioner_id=None, compress=False, batch_size=DEFAULT_BATCH_SIZE):
+    """Return a generator of encoded export chunks (str, or bytes when compressed)"""
+    if export_format not in EXPORT_FORMATS:
+        raise ExportError(f"Unsupported format '{export_format}', use csv or ndjson")
+
+    # Validate filters eagerly so callers can report errors before streaming starts
+    build_export_query(dataset, start_date, end_date, practitioner_id)
+
+    rows = iter_export_rows(dataset, start_date, end_date, practitioner_id, batch_size)
+    encoder = encode_csv if export_format == 'csv' else encode_ndjson
+    chunks = encoder(rows)
+
+    return gzip_chunks(chunks) if compress else chunks
+
+def export_filename(dataset, export_format, compress=False):
+    """Suggested download filename for an export"""
+    stamp = datetime.utcnow().strftime('%Y%m%d')
+    filename = f"{dataset}_{stamp}.{export_format}"
+    return filename + '.gz' if compress else filename
+
+@job('exports.generate', max_attempts=3)
+def generate_export(dataset, export_format='csv', start_date=None, end_date=None,
+                    practitioner_id=None, compress=True):
+    """Background job: write an export to EXPORT_DIR for download later"""
+    try:
+        chunks = stream_export(
+            dataset,
+            export_format=export_format,
+            start_date=parse_date(start_date),
+            end_date=parse_date(end_date),
+            practitioner_id=practitioner_id,
+            compress=compress
+        )
+    except ExportError as e:
+        raise PermanentJobError(str(e))
+
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    filename = f"{uuid.uuid4().hex[:12]}_{export_filename(dataset, export_format, compress)}"
+    path = os.path.join(EXPORT_DIR, filename)
+    partial = path + '.part'
+
+    with open(partial, 'wb' if compress else 'w', **({} if compress else {'newline': ''})) as handle:
+        for chunk in chunks:
+            handle.write(chunk)
+    os.replace(partial, path)
+
+    return {'file': filename, 'bytes': os.path.getsize(path)}
+
+def main():
+    """Export a dataset from the command line"""
+    parser = argparse.ArgumentParser(description='Stream AyurSutra clinic data to CSV or NDJSON')
+    parser.add_argument('dataset', choices=sorted(EXPORT_DATASETS))
+    parser.add_argument('--format', dest='export_format', choices=EXPORT_FORMATS, default='csv')
+    parser.add_argument('--start-date', help='Earliest date to include (YYYY-MM-DD)')
+    parser.add_argument('--end-date', help='Latest date to include (YYYY-MM-DD)')
+    parser.add_argument('--practitioner-id', type=int)
+    parser.add_argument('--gzip', action='store_true', help='Gzip-compress the output')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--output', '-o', help='Output file (defaults to stdout)')
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app('cli')
+
+    try:
+        with app.app_context():
+            chunks = stream_export(
+                args.dataset,
+                export_format=args.export_format,
+                start_date=parse_date(args.start_date),
+                end_date=parse_date(args.end_date),
+                practitioner_id=args.practitioner_id,
+                compress=args.gzip,
+                batch_size=args.batch_size
+            )
+
+            if args.output:
+                mode = 'wb' if args.gzip else 'w'
+                with open(args.output, mode, **({} if args.gzip else {'newline': ''})) as handle:
+                    for chunk in chunks:
+                        handle.write(chunk)
+                print(f"✅ Exported {args.dataset} to {os.path.abspath(args.output)}", file=sys.stderr)
+            else:
+                out = sys.stdout.buffer if args.gzip else sys.stdout
+                for chunk in chunks:
+                    out.write(chunk)
+                out.flush()
+
+        return True
+
+    except ExportError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return False
+    except Exception as e:
+        print(f"❌ Export failed: {e}", file=sys.stderr)
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
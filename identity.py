@@ -0,0 +1,140 @@
+"""
+Request identity for AyurSutra
+Authorizes requests from signed JWT claims, checking token versions through a short TTL cache
+"""
+
+from functools import wraps
+
+from flask import g, jsonify
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from sqlalchemy import event
+
+from database import db
+from metrics import register_cache
+from models import User
+from ttl_cache import TTLCache
+
+# How long a user's token version / active flag is trusted before re-checking the DB.
+# Revocations take effect on other workers within this window; locally they are immediate.
+DEFAULT_TOKEN_STATE_TTL = 30
+DEFAULT_USER_CACHE_TTL = 60
+
+_token_state_cache = TTLCache(maxsize=10000, ttl=DEFAULT_TOKEN_STATE_TTL)
+_user_cache = TTLCache(maxsize=2000, ttl=DEFAULT_USER_CACHE_TTL)
+
+register_cache('token_state', _token_state_cache)
+register_cache('user_records', _user_cache)
+
+class Identity:
+    """Authenticated caller as described by the token's signed claims"""
+
+    __slots__ = ('user_id', 'user_type', 'patient_id', 'practitioner_id', 'token_version')
+
+    def __init__(self, user_id, user_type, patient_id=None, practitioner_id=None, token_version=1):
+        self.user_id = user_id
+        self.user_type = user_type
+        self.patient_id = patient_id
+        self.practitioner_id = practitioner_id
+        self.token_version = token_version
+
+    @classmethod
+    def from_claims(cls, claims):
+        return cls(
+            user_id=int(claims['sub']),
+            user_type=claims.get('user_type'),
+            patient_id=claims.get('patient_id'),
+            practitioner_id=claims.get('practitioner_id'),
+            token_version=claims.get('token_version', 1)
+        )
+
+    @property
+    def is_admin(self):
+        return self.user_type == 'admin'
+
+    @property
+    def is_patient(self):
+        return self.user_type == 'patient'
+
+    @property
+    def is_practitioner(self):
+        return self.user_type == 'practitioner'
+
+    def to_dict(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+def current_identity():
+    """Return the Identity for the current request, built once from the JWT claims"""
+    identity = g.get('_identity')
+    if identity is None:
+        identity = Identity.from_claims(get_jwt())
+        g._identity = identity
+    return identity
+
+def _load_token_state(user_id):
+    row = db.session.execute(
+        db.select(User.token_version, User.is_active).where(User.id == user_id)
+    ).first()
+    return (row.token_version, row.is_active) if row else None
+
+def is_token_revoked(jwt_payload):
+    """True if the token's user is gone, deactivated, or has a newer token version"""
+    try:
+        user_id = int(jwt_payload['sub'])
+    except (KeyError, TypeError, ValueError):
+        return True
+
+    state = _token_state_cache.get_or_load(user_id, lambda: _load_token_state(user_id))
+    if state is None:
+        return True
+
+    token_version, is_active = state
+    return not is_active or jwt_payload.get('token_version', 1) != token_version
+
+def get_user_record(user_id=None):
+    """Return a cached User.to_dict() snapshot, defaulting to the current caller"""
+    if user_id is None:
+        user_id = current_identity().user_id
+
+    def load():
+        user = db.session.get(User, user_id)
+        return user.to_dict() if user else None
+
+    return _user_cache.get_or_load(user_id, load)
+
+def invalidate_user(user_id):
+    """Drop cached state for a user in this process"""
+    _token_state_cache.pop(user_id)
+    _user_cache.pop(user_id)
+
+@event.listens_for(User, 'after_update')
+def _evict_updated_user(mapper, connection, target):
+    invalidate_user(target.id)
+
+@event.listens_for(User, 'after_delete')
+def _evict_deleted_user(mapper, connection, target):
+    invalidate_user(target.id)
+
+def role_required(*user_types):
+    """Require a valid token whose user_type claim is one of user_types, without a DB lookup"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            verify_jwt_in_request()
+            if user_types and current_identity().user_type not in user_types:
+                return jsonify({'success': False, 'message': 'Forbidden'}), 403
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def init_app(app, jwt):
+    """Hook token-version checks into Flask-JWT-Extended"""
+    _token_state_cache.ttl = app.config.get('TOKEN_STATE_CACHE_TTL', DEFAULT_TOKEN_STATE_TTL)
+    _user_cache.ttl = app.config.get('USER_CACHE_TTL', DEFAULT_USER_CACHE_TTL)
+
+    @jwt.token_in_blocklist_loader
+    def check_token_version(jwt_header, jwt_payload):
+        return is_token_revoked(jwt_payload)
+
+    @jwt.revoked_token_loader
+    def revoked_token_callback(jwt_header, jwt_payload):
+        return jsonify({'success': False, 'message': 'Token has been revoked'}), 401
@@ -0,0 +1,188 @@
+"""
+Request instrumentation for AyurSutra
+Per-request timing, SQL counting, N+1 and slow-query detection, and sampled profiling
+"""
+
+import cProfile
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+
+from flask import g, has_request_context, jsonify, request, current_app
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from metrics import HistogramValue as Histogram, require_internal_access
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) for request latency histogram buckets
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Upper bounds for per-request query count histogram buckets
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+class RequestStats:
+    """Timing and SQL statistics collected while serving one request"""
+
+    __slots__ = ('started_at', 'query_count', 'sql_time', 'statements', 'warned', 'profiler')
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.query_count = 0
+        self.sql_time = 0.0
+        self.statements = Counter()
+        self.warned = set()
+        self.profiler = None
+
+    @property
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started_at) * 1000
+
+def redact_statement(statement):
+    """Replace inline literals so logged SQL never carries patient data"""
+    return _LITERAL_RE.sub('?', ' '.join(statement.split()))
+
+class Instrumentation:
+    """Flask extension wiring request hooks and SQLAlchemy cursor events"""
+
+    def __init__(self, app=None):
+        self.request_latency = {}
+        self.request_queries = {}
+        self.sql_time = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('INSTRUMENTATION_ENABLED', True)
+        app.config.setdefault('INSTRUMENTATION_HEADERS', app.debug)
+        app.config.setdefault('N_PLUS_ONE_THRESHOLD', 10)
+        app.config.setdefault('SLOW_QUERY_MS', 200)
+        app.config.setdefault('PROFILE_SAMPLE_RATE', 0.0)
+        app.config.setdefault('PROFILE_DIR', 'profiles')
+        app.config.setdefault('INTERNAL_METRICS_TOKEN', None)
+
+        if not app.config['INSTRUMENTATION_ENABLED']:
+            return
+
+        self.config = app.config
+        app.extensions['instrumentation'] = self
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule('/internal/metrics', 'internal_metrics', self._metrics_view)
+
+        # Listen on the Engine class so every engine in the process is covered
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    # -- request hooks -------------------------------------------------------
+
+    def _before_request(self):
+        stats = RequestStats()
+        g._request_stats = stats
+
+        rate = self.config['PROFILE_SAMPLE_RATE']
+        if rate and random.random() < rate:
+            stats.profiler = cProfile.Profile()
+            stats.profiler.enable()
+
+    def _after_request(self, response):
+        stats = g.get('_request_stats')
+        if stats is None:
+            return response
+
+        elapsed_ms = stats.elapsed_ms
+        self._record(request.endpoint or 'unmatched', elapsed_ms, stats)
+
+        if self.config['INSTRUMENTATION_HEADERS']:
+            response.headers['X-Request-Time-Ms'] = f'{elapsed_ms:.1f}'
+            response.headers['X-DB-Query-Count'] = str(stats.query_count)
+            response.headers['X-DB-Time-Ms'] = f'{stats.sql_time * 1000:.1f}'
+
+        return response
+
+    def _teardown_request(self, exc):
+        stats = g.get('_request_stats')
+        if stats is None or stats.profiler is None:
+            return
+
+        stats.profiler.disable()
+        try:
+            os.makedirs(self.config['PROFILE_DIR'], exist_ok=True)
+            endpoint = (request.endpoint or 'unmatched').replace('.', '-')
+            filename = f"{endpoint}-{int(time.time() * 1000)}.prof"
+            stats.profiler.dump_stats(os.path.join(self.config['PROFILE_DIR'], filename))
+        except OSError as e:
+            logger.warning('Could not write profile: %s', e)
+
+    def _record(self, endpoint, elapsed_ms, stats):
+        with self._lock:
+            if endpoint not in self.request_latency:
+                self.request_latency[endpoint] = Histogram(LATENCY_BUCKETS_MS)
+                self.request_queries[endpoint] = Histogram(QUERY_COUNT_BUCKETS)
+                self.sql_time[endpoint] = Histogram(LATENCY_BUCKETS_MS)
+        self.request_latency[endpoint].observe(elapsed_ms)
+        self.request_queries[endpoint].observe(stats.query_count)
+        self.sql_time[endpoint].observe(stats.sql_time * 1000)
+
+    # -- reporting -----------------------------------------------------------
+
+    def snapshot(self):
+        """Aggregated histograms per endpoint"""
+        with self._lock:
+            endpoints = list(self.request_latency)
+        return {
+            endpoint: {
+                'latency_ms': self.request_latency[endpoint].to_dict(),
+                'query_count': self.request_queries[endpoint].to_dict(),
+                'sql_time_ms': self.sql_time[endpoint].to_dict(),
+            }
+            for endpoint in endpoints
+        }
+
+    def _metrics_view(self):
+        require_internal_access()
+
+        return jsonify({'success': True, 'data': {'endpoints': self.snapshot()}})
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_query_start', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('_query_start')
+    if not started:
+        return
+    duration = time.perf_counter() - started.pop()
+
+    if not has_request_context():
+        return
+    stats = g.get('_request_stats')
+    if stats is None:
+        return
+
+    stats.query_count += 1
+    stats.sql_time += duration
+    stats.statements[statement] += 1
+
+    config = current_app.config
+    threshold = config['N_PLUS_ONE_THRESHOLD']
+    if stats.statements[statement] > threshold and statement not in stats.warned:
+        stats.warned.add(statement)
+        logger.warning('Possible N+1 on %s: statement ran more than %d times: %s',
+                       request.endpoint, threshold, redact_statement(statement))
+
+    if duration * 1000 >= config['SLOW_QUERY_MS']:
+        param_count = len(parameters) if hasattr(parameters, '__len__') else 0
+        logger.warning('Slow query (%.1f ms) on %s: %s [%d parameters redacted]',
+                       duration * 1000, request.endpoint, redact_statement(statement), param_count)
+
+instrumentation = Instrumentation()
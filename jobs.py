@@ -0,0 +1,276 @@
+"""
+Background jobs for AyurSutra
+A database-backed queue: request handlers enqueue in their own transaction and return,
+worker processes claim, run, retry and finish jobs
+"""
+
+import importlib
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, update
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from models import Job
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Modules whose @job handlers the worker imports at startup
+JOB_MODULES = [
+    'export_data',
+    'batch_reschedule',
+    'waitlist',
+    'session_events',
+    'revenue',
+    'newsletter',
+    'archive',
+]
+
+# Modules whose session hooks enqueue jobs on commit; every app profile imports them
+HOOK_MODULES = [
+    'waitlist',
+    'revenue',
+]
+
+# Retry delay is BASE * 2 ** (attempt - 1), jittered and capped
+BACKOFF_BASE_SECONDS = 10
+BACKOFF_MAX_SECONDS = 3600
+
+# A job still running this long after it was claimed is assumed orphaned (worker killed)
+# and requeued, so handlers must finish well within it
+DEFAULT_LOCK_TIMEOUT = 900
+
+class JobError(Exception):
+    """Raised for unknown job names or invalid enqueue calls"""
+
+class PermanentJobError(Exception):
+    """Raise from a handler to fail the job without further retries"""
+
+class JobSpec:
+    def __init__(self, name, func, max_attempts, priority):
+        self.name = name
+        self.func = func
+        self.max_attempts = max_attempts
+        self.priority = priority
+
+HANDLERS = {}
+
+def job(name, max_attempts=5, priority=0):
+    """Register a handler; it is called with the job payload as keyword arguments"""
+    def decorator(func):
+        HANDLERS[name] = JobSpec(name, func, max_attempts, priority)
+        return func
+    return decorator
+
+def load_handlers():
+    for module_name in JOB_MODULES:
+        importlib.import_module(module_name)
+
+def load_hooks():
+    for module_name in HOOK_MODULES:
+        importlib.import_module(module_name)
+
+def enqueue(name, payload=None, idempotency_key=None, priority=None, delay=0):
+    """Add a job to the current transaction and return it
+
+    The caller commits, so the job is only visible to workers if the work that
+    scheduled it (a booking, an import, ...) commits too. Enqueueing an
+    idempotency key that already exists returns the existing job.
+    """
+    spec = HANDLERS.get(name)
+    if spec is None:
+        raise JobError(f"Unknown job '{name}'")
+
+    if idempotency_key:
+        existing = Job.query.filter_by(idempotency_key=idempotency_key).first()
+        if existing:
+            return existing
+
+    new_job = Job(
+        name=name,
+        payload=payload or {},
+        idempotency_key=idempotency_key,
+        priority=spec.priority if priority is None else priority,
+        max_attempts=spec.max_attempts,
+        run_at=datetime.utcnow() + timedelta(seconds=delay)
+    )
+    try:
+        with db.session.begin_nested():
+            db.session.add(new_job)
+    except IntegrityError:
+        # Another request enqueued the same key between our check and insert
+        return Job.query.filter_by(idempotency_key=idempotency_key).one()
+    return new_job
+
+def backoff_seconds(attempts):
+    """Delay before retrying a job that has failed `attempts` times"""
+    delay = min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+class Worker:
+    """Claims due jobs and runs them on a thread pool inside an app context"""
+
+    def __init__(self, app, concurrency=4, poll_interval=1.0, lock_timeout=DEFAULT_LOCK_TIMEOUT, names=None):
+        self.app = app
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.lock_timeout = lock_timeout
+        self.names = names
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.stopping = threading.Event()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='job')
+        self._in_flight = set()
+        self._lock = threading.Lock()
+
+    def claim(self, limit):
+        """Mark up to `limit` due jobs as running by this worker and return their ids
+
+        Claiming is a conditional UPDATE per candidate, so concurrent workers on
+        MySQL or SQLite never run the same job twice.
+        """
+        now = datetime.utcnow()
+        query = db.session.query(Job.id).filter(Job.status == 'queued', Job.run_at <= now)
+        if self.names:
+            query = query.filter(Job.name.in_(self.names))
+        candidates = [row.id for row in query.order_by(Job.priority.desc(), Job.run_at, Job.id).limit(limit * 2)]
+
+        claimed = []
+        for job_id in candidates:
+            result = db.session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == 'queued')
+                .values(status='running', locked_by=self.worker_id, locked_at=now, attempts=Job.attempts + 1)
+            )
+            if result.rowcount == 1:
+                claimed.append(job_id)
+                if len(claimed) == limit:
+                    break
+        db.session.commit()
+        return claimed
+
+    def requeue_stale(self):
+        """Return jobs whose worker died mid-run to the queue, or mark them dead when out of attempts
+
+        A job that kills its worker (OOM, segfault) would otherwise be retried forever.
+        """
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=self.lock_timeout)
+        exhausted = Job.attempts >= Job.max_attempts
+        result = db.session.execute(
+            update(Job)
+            .where(Job.status == 'running', Job.locked_at < cutoff)
+            .values(status=case((exhausted, 'dead'), else_='queued'),
+                    finished_at=case((exhausted, now), else_=None),
+                    locked_by=None, locked_at=None, last_error='Worker lock expired')
+        )
+        db.session.commit()
+        return result.rowcount
+
+    def execute(self, job_id):
+        """Run one claimed job and record the outcome"""
+        with self.app.app_context():
+            current = db.session.get(Job, job_id)
+            spec = HANDLERS.get(current.name)
+            started = time.perf_counter()
+
+            try:
+                if spec is None:
+                    raise PermanentJobError(f"No handler registered for '{current.name}'")
+                result = spec.func(**(current.payload or {}))
+            except Exception as e:
+                # Discard whatever the handler left in the session before recording the failure
+                db.session.rollback()
+                current = db.session.get(Job, job_id)
+                current.last_error = ''.join(traceback.format_exception_only(type(e), e)).strip()[:2000]
+                current.locked_by = None
+                current.locked_at = None
+                if isinstance(e, PermanentJobError):
+                    current.status = 'failed'
+                    current.finished_at = datetime.utcnow()
+                elif current.attempts >= current.max_attempts:
+                    current.status = 'dead'
+                    current.finished_at = datetime.utcnow()
+                else:
+                    current.status = 'queued'
+                    current.run_at = datetime.utcnow() + timedelta(seconds=backoff_seconds(current.attempts))
+                logger.warning('Job %s (%s) attempt %s failed: %s', job_id, current.name, current.attempts, current.last_error)
+            else:
+                # The handler's own writes commit together with the job's completion
+                current.status = 'succeeded'
+                current.result = result
+                current.last_error = None
+                current.locked_by = None
+                current.locked_at = None
+                current.finished_at = datetime.utcnow()
+
+            name, outcome = current.name, current.status
+            db.session.commit()
+            metrics.jobs_total.inc(name=name, status='retried' if outcome == 'queued' else outcome)
+            metrics.job_duration.observe(time.perf_counter() - started, name=name)
+            return outcome
+
+    def _run_claimed(self, job_id):
+        try:
+            self.execute(job_id)
+        except Exception:
+            logger.exception('Job %s crashed the worker thread', job_id)
+        finally:
+            with self._lock:
+                self._in_flight.discard(job_id)
+
+    def run_once(self):
+        """Claim jobs for idle threads and hand them to the pool; return how many were started"""
+        with self._lock:
+            free = self.concurrency - len(self._in_flight)
+        if free <= 0:
+            return 0
+
+        with self.app.app_context():
+            claimed = self.claim(free)
+        with self._lock:
+            self._in_flight.update(claimed)
+        for job_id in claimed:
+            self._executor.submit(self._run_claimed, job_id)
+        return len(claimed)
+
+    def run(self, once=False):
+        """Poll until stop() is called; with once=True, drain due jobs and return"""
+        last_stale_check = 0.0
+        last_flush = time.monotonic()
+        directory = self.app.config.get('METRICS_MULTIPROC_DIR')
+        while not self.stopping.is_set():
+            if time.monotonic() - last_stale_check > self.lock_timeout / 4:
+                with self.app.app_context():
+                    self.requeue_stale()
+                last_stale_check = time.monotonic()
+
+            # Worker processes serve no /metrics, so they publish through the shared directory
+            if directory and time.monotonic() - last_flush >= self.app.config.get('METRICS_FLUSH_INTERVAL', 5):
+                metrics.write_process_dump(directory)
+                last_flush = time.monotonic()
+
+            started = self.run_once()
+            if once and not started:
+                with self._lock:
+                    idle = not self._in_flight
+                if idle:
+                    break
+            if not started:
+                self.stopping.wait(self.poll_interval)
+
+        self._executor.shutdown(wait=True)
+        if directory:
+            metrics.write_process_dump(directory)
+
+    def stop(self):
+        """Stop claiming new jobs; in-flight jobs finish before run() returns"""
+        self.stopping.set()
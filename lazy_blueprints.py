@@ -0,0 +1,124 @@
+"""
+Lazy blueprint loading for AyurSutra
+Route modules are imported and registered the first time a request hits their URL prefix.
+url_for() raises BuildError for endpoints of blueprints that are not loaded yet; preload
+(PRELOAD_BLUEPRINTS) any blueprint whose URLs are built from other modules
+"""
+
+import importlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import Flask
+from werkzeug.routing import Map, MapAdapter
+
+logger = logging.getLogger(__name__)
+
+class _LockedMapAdapter(MapAdapter):
+    def match(self, *args, **kwargs):
+        with self.map.lock:
+            return super().match(*args, **kwargs)
+
+    def build(self, *args, **kwargs):
+        with self.map.lock:
+            return super().build(*args, **kwargs)
+
+class LockedMap(Map):
+    """URL map that takes new rules while other threads match and build URLs"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.RLock()
+
+    def add(self, rulefactory):
+        with self.lock:
+            super().add(rulefactory)
+
+    @staticmethod
+    def _locked(adapter):
+        # The subclass only adds locking, so the adapter werkzeug built is reused as is
+        adapter.__class__ = _LockedMapAdapter
+        return adapter
+
+    def bind(self, *args, **kwargs):
+        return self._locked(super().bind(*args, **kwargs))
+
+    def bind_to_environ(self, *args, **kwargs):
+        return self._locked(super().bind_to_environ(*args, **kwargs))
+
+class LazyFlask(Flask):
+    """Flask app that LazyBlueprints can register blueprints on after it started serving"""
+
+    url_map_class = LockedMap
+
+    def __init__(self, *args, **kwargs):
+        # Set first: Flask.__init__ already goes through _check_setup_finished
+        self._late_setup = threading.local()
+        super().__init__(*args, **kwargs)
+
+    @contextmanager
+    def late_setup(self):
+        """Allow setup calls from this thread only, for the duration of the block"""
+        self._late_setup.active = True
+        try:
+            yield
+        finally:
+            self._late_setup.active = False
+
+    def _check_setup_finished(self, f_name):
+        if not getattr(self._late_setup, 'active', False):
+            super()._check_setup_finished(f_name)
+
+class LazyBlueprints:
+    """WSGI wrapper that registers blueprints on demand, keyed by URL prefix (needs a LazyFlask app)"""
+
+    def __init__(self, app, blueprints):
+        self.app = app
+        self.pending = {prefix: (module_name, attr) for module_name, attr, prefix in blueprints}
+        self.import_times = {}
+        self._lock = threading.Lock()
+        self.wsgi_app = app.wsgi_app
+        app.wsgi_app = self
+        app.extensions['lazy_blueprints'] = self
+
+    def load(self, prefix):
+        """Import and register the blueprint for prefix if it isn't loaded yet"""
+        with self._lock:
+            if prefix not in self.pending:
+                return
+            module_name, attr = self.pending[prefix]
+
+            started = time.perf_counter()
+            blueprint = getattr(importlib.import_module(module_name), attr)
+
+            # Flask refuses setup calls once it has served a request; registering here
+            # happens before this request is dispatched, so the guard is lifted for this thread
+            with self.app.late_setup():
+                self.app.register_blueprint(blueprint, url_prefix=prefix)
+
+            del self.pending[prefix]
+            self.import_times[module_name] = time.perf_counter() - started
+            logger.info('Loaded %s for %s in %.1f ms', module_name, prefix, self.import_times[module_name] * 1000)
+
+    def load_prefixes(self, prefixes):
+        for prefix in prefixes:
+            self.load(prefix)
+
+    def load_all(self):
+        self.load_prefixes(list(self.pending))
+
+    def _match(self, path):
+        # Longest prefix first so /api/practitioners/search doesn't load /api/practitioners
+        for prefix in sorted(self.pending, key=len, reverse=True):
+            if path == prefix or path.startswith(prefix + '/'):
+                return prefix
+        return None
+
+    def __call__(self, environ, start_response):
+        if self.pending:
+            prefix = self._match(environ.get('PATH_INFO', ''))
+            if prefix:
+                self.load(prefix)
+        return self.wsgi_app(environ, start_response)
@@ -0,0 +1,124 @@
+"""
+Outgoing email for AyurSutra
+SMTP by default; an outbox that writes .eml files (and keeps the latest in memory) stands in
+for a mail server in development and tests
+"""
+
+import os
+import smtplib
+import threading
+from collections import deque
+from email.message import EmailMessage
+from email.utils import make_msgid
+
+class MailError(RuntimeError):
+    """Raised when the mail server rejects a message for good (refused recipient, 5xx reply)"""
+
+class MailTransportError(MailError):
+    """Raised when the mail server can't be reached or fails for now; the message may be retried"""
+
+class SMTPTransport:
+    """One SMTP connection, reused for many messages; not thread-safe, open one per thread"""
+
+    def __init__(self, host, port=587, username=None, password=None, use_tls=True, timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self._smtp = None
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password or '')
+        return smtp
+
+    def send(self, message):
+        try:
+            if self._smtp is None:
+                self._smtp = self._connect()
+            self._smtp.send_message(message)
+        except smtplib.SMTPRecipientsRefused as e:
+            raise MailError(str(e))
+        except smtplib.SMTPSenderRefused as e:
+            # Every message from this sender would be refused the same way
+            self.close()
+            raise MailTransportError(str(e))
+        except smtplib.SMTPResponseException as e:
+            if e.smtp_code >= 500 and self._smtp is not None:
+                raise MailError(str(e))
+            self.close()
+            raise MailTransportError(str(e))
+        except (smtplib.SMTPException, OSError) as e:
+            # Drop the connection so the next message reconnects
+            self.close()
+            raise MailTransportError(str(e))
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+class OutboxTransport:
+    """Local stand-in for an SMTP server: keeps sent messages and optionally writes them to a directory"""
+
+    # Shared by every OutboxTransport in the process, so tests can inspect what was sent;
+    # only the latest messages are kept, a long-running outbox process doesn't grow
+    sent = deque(maxlen=500)
+    _lock = threading.Lock()
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def send(self, message):
+        with self._lock:
+            self.sent.append(message)
+        if self.directory:
+            name = message['Message-ID'].strip('<>').replace('/', '_') + '.eml'
+            with open(os.path.join(self.directory, name), 'wb') as f:
+                f.write(message.as_bytes())
+
+    def close(self):
+        pass
+
+    @classmethod
+    def clear(cls):
+        with cls._lock:
+            cls.sent.clear()
+
+def transport_from_config(config):
+    """A new transport for MAIL_BACKEND ('smtp' or 'outbox')"""
+    backend = config.get('MAIL_BACKEND', 'smtp')
+    if backend == 'smtp':
+        return SMTPTransport(
+            config['MAIL_SERVER'],
+            port=config.get('MAIL_PORT', 587),
+            username=config.get('MAIL_USERNAME'),
+            password=config.get('MAIL_PASSWORD'),
+            use_tls=config.get('MAIL_USE_TLS', True)
+        )
+    if backend == 'outbox':
+        return OutboxTransport(config.get('MAIL_OUTBOX_DIR'))
+    raise MailError(f"Unknown MAIL_BACKEND '{backend}'")
+
+def build_message(sender, recipient, subject, text, html=None, headers=None):
+    message = EmailMessage()
+    message['From'] = sender
+    message['To'] = recipient
+    message['Subject'] = subject
+    message['Message-ID'] = make_msgid(domain=sender.rpartition('@')[2].strip('>') or None)
+    for name, value in (headers or {}).items():
+        message[name] = value
+    message.set_content(text)
+    if html:
+        message.add_alternative(html, subtype='html')
+    return message
@@ -0,0 +1,425 @@
+"""
+Metrics for AyurSutra
+Counters, gauges and histograms exported in Prometheus text format, with an optional
+file-backed aggregation mode so every gunicorn worker is included in a scrape.
+Workers remove their dump file when they exit; for workers that are killed, call
+remove_process_dump(directory, worker.pid) from gunicorn's child_exit hook
+"""
+
+import atexit
+import bisect
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+
+from flask import Response, abort, current_app, g, request
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session as OrmSession
+
+# Upper bounds (seconds) for request latency buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class HistogramValue:
+    """Fixed-bucket histogram with running count and sum"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+
+    def to_dict(self):
+        with self._lock:
+            cumulative = 0
+            buckets = {}
+            for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            return {'count': self.count, 'sum': round(self.total, 3), 'buckets': buckets}
+
+    def dump(self):
+        with self._lock:
+            return {'counts': list(self.counts), 'sum': self.total}
+
+class _Family:
+    """A named metric with one series per combination of label values"""
+
+    kind = None
+
+    def __init__(self, name, help_text, label_names=(), buckets=None):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets) if buckets else None
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _get(self, labels, factory):
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        series = self._series.get(key)
+        if series is None:
+            with self._lock:
+                series = self._series.setdefault(key, factory())
+        return series
+
+    def dump(self):
+        with self._lock:
+            items = list(self._series.items())
+        return {
+            'type': self.kind,
+            'help': self.help,
+            'labels': list(self.label_names),
+            'buckets': list(self.buckets) if self.buckets else None,
+            'samples': [[list(key), self._dump_series(series)] for key, series in items],
+        }
+
+    def _dump_series(self, series):
+        return series[0]
+
+class Counter(_Family):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        series = self._get(labels, lambda: [0])
+        with self._lock:
+            series[0] += amount
+
+    def set_total(self, value, **labels):
+        """Mirror a monotonic total that is counted elsewhere"""
+        self._get(labels, lambda: [0])[0] = value
+
+class Gauge(_Family):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        self._get(labels, lambda: [0])[0] = value
+
+class Histogram(_Family):
+    kind = 'histogram'
+
+    def observe(self, value, **labels):
+        self._get(labels, lambda: HistogramValue(self.buckets)).observe(value)
+
+    def _dump_series(self, series):
+        return series.dump()
+
+class Registry:
+    """Holds metric families and collectors that refresh gauges at scrape time"""
+
+    def __init__(self):
+        self._families = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, help_text, label_names, buckets=None):
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = cls(name, help_text, label_names, buckets)
+            return family
+
+    def counter(self, name, help_text, label_names=()):
+        return self._register(Counter, name, help_text, label_names)
+
+    def gauge(self, name, help_text, label_names=()):
+        return self._register(Gauge, name, help_text, label_names)
+
+    def histogram(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, help_text, label_names, buckets)
+
+    def register_collector(self, collector):
+        """collector(registry) is called before each dump to update gauges"""
+        self._collectors.append(collector)
+
+    def dump(self):
+        for collector in self._collectors:
+            try:
+                collector(self)
+            except Exception:
+                # A broken collector must not take the metrics endpoint down
+                continue
+        with self._lock:
+            families = list(self._families.values())
+        return {family.name: family.dump() for family in families}
+
+registry = Registry()
+
+# ---------------------------------------------------------------------------
+# Multi-process aggregation
+# ---------------------------------------------------------------------------
+
+def merge_dumps(dumps):
+    """Merge per-process dumps: counters and histograms are summed, gauges keep a pid label"""
+    merged = {}
+    for pid, dump in dumps:
+        for name, family in dump.items():
+            target = merged.setdefault(name, dict(family, samples={}))
+            for label_values, value in family['samples']:
+                if family['type'] == 'gauge':
+                    target['labels'] = family['labels'] + ['pid']
+                    target['samples'][tuple(label_values) + (str(pid),)] = value
+                    continue
+
+                key = tuple(label_values)
+                current = target['samples'].get(key)
+                if current is None:
+                    target['samples'][key] = value
+                elif family['type'] == 'histogram':
+                    target['samples'][key] = {
+                        'counts': [a + b for a, b in zip(current['counts'], value['counts'])],
+                        'sum': current['sum'] + value['sum'],
+                    }
+                else:
+                    target['samples'][key] = current + value
+
+    for family in merged.values():
+        family['samples'] = [[list(key), value] for key, value in family['samples'].items()]
+    return merged
+
+def write_process_dump(directory):
+    """Atomically write this process's metrics to directory/metrics-<pid>.json"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f'metrics-{os.getpid()}.json')
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.metrics-')
+    with os.fdopen(fd, 'w') as handle:
+        json.dump(registry.dump(), handle)
+    os.replace(tmp_path, path)
+
+def remove_process_dump(directory, pid=None):
+    """Delete a process's dump so its gauges and totals leave the scrape"""
+    try:
+        os.remove(os.path.join(directory, f'metrics-{pid or os.getpid()}.json'))
+    except OSError:
+        pass
+
+def _pid_alive(pid):
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (OSError, ValueError):
+        return True
+    return True
+
+def read_process_dumps(directory, max_age=None):
+    """Every process's dump; ones older than max_age seconds from dead processes are deleted"""
+    dumps = []
+    now = time.time()
+    for path in glob.glob(os.path.join(directory, 'metrics-*.json')):
+        pid = os.path.basename(path)[len('metrics-'):-len('.json')]
+        try:
+            # Idle workers don't rewrite their dump, so age alone doesn't mean the worker is gone
+            if max_age is not None and now - os.path.getmtime(path) > max_age and not _pid_alive(pid):
+                os.remove(path)
+                continue
+            with open(path) as handle:
+                dumps.append((pid, json.load(handle)))
+        except (OSError, ValueError):
+            continue
+    return dumps
+
+# ---------------------------------------------------------------------------
+# Prometheus text format
+# ---------------------------------------------------------------------------
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def render_prometheus(dump):
+    lines = []
+    for name in sorted(dump):
+        family = dump[name]
+        lines.append(f"# HELP {name} {family['help']}")
+        lines.append(f"# TYPE {name} {family['type']}")
+        for label_values, value in family['samples']:
+            if family['type'] == 'histogram':
+                cumulative = 0
+                bounds = [str(b) for b in family['buckets']] + ['+Inf']
+                for bound, count in zip(bounds, value['counts']):
+                    cumulative += count
+                    labels = _format_labels(family['labels'], label_values, [('le', bound)])
+                    lines.append(f'{name}_bucket{labels} {cumulative}')
+                labels = _format_labels(family['labels'], label_values)
+                lines.append(f'{name}_sum{labels} {value["sum"]}')
+                lines.append(f'{name}_count{labels} {cumulative}')
+            else:
+                lines.append(f"{name}{_format_labels(family['labels'], label_values)} {value}")
+    return '\n'.join(lines) + '\n'
+
+# ---------------------------------------------------------------------------
+# Standard AyurSutra metrics
+# ---------------------------------------------------------------------------
+
+request_latency = registry.histogram(
+    'ayursutra_request_duration_seconds', 'Request latency by blueprint', ('blueprint', 'method', 'status'))
+requests_total = registry.counter(
+    'ayursutra_requests_total', 'Requests served by blueprint', ('blueprint', 'method', 'status'))
+bookings_total = registry.counter(
+    'ayursutra_bookings_total', 'Sessions booked')
+session_status_total = registry.counter(
+    'ayursutra_session_status_changes_total', 'Session status transitions (cancellations, no-shows, ...)', ('status',))
+notifications_total = registry.counter(
+    'ayursutra_notifications_dispatched_total', 'Notifications created', ('type',))
+jobs_total = registry.counter(
+    'ayursutra_jobs_total', 'Background job attempts by outcome', ('name', 'status'))
+job_duration = registry.histogram(
+    'ayursutra_job_duration_seconds', 'Background job run time', ('name',))
+
+_caches = {}
+
+def register_cache(name, cache):
+    """Expose hit/miss counts of a cache with `hits` and `misses` attributes"""
+    _caches[name] = cache
+
+def _collect_caches(reg):
+    hits = reg.counter('ayursutra_cache_hits_total', 'Cache hits', ('cache',))
+    misses = reg.counter('ayursutra_cache_misses_total', 'Cache misses', ('cache',))
+    for name, cache in _caches.items():
+        hits.set_total(cache.hits, cache=name)
+        misses.set_total(cache.misses, cache=name)
+
+registry.register_collector(_collect_caches)
+
+def _pool_collector(engine_getter):
+    def collect(reg):
+        pool = engine_getter().pool
+        gauge = reg.gauge('ayursutra_db_pool_connections', 'Database pool connections by state', ('state',))
+        for state, attr in (('size', 'size'), ('checked_in', 'checkedin'),
+                            ('checked_out', 'checkedout'), ('overflow', 'overflow')):
+            if hasattr(pool, attr):
+                gauge.set(getattr(pool, attr)(), state=state)
+    return collect
+
+# Domain events are counted only once their transaction commits
+
+def _pending_events(session):
+    return session.info.setdefault('_metric_events', [])
+
+def _after_flush(session, flush_context):
+    from models import Session as ClinicSession, Notification
+
+    events = _pending_events(session)
+    for obj in session.new:
+        if isinstance(obj, ClinicSession):
+            events.append((bookings_total, {}))
+        elif isinstance(obj, Notification) and obj.type is not None:
+            events.append((notifications_total, {'type': obj.type.value}))
+
+    for obj in session.dirty:
+        if isinstance(obj, ClinicSession):
+            history = inspect(obj).attrs.status.history
+            if history.has_changes() and obj.status is not None:
+                events.append((session_status_total, {'status': obj.status.value}))
+
+def _after_commit(session):
+    for counter, labels in session.info.pop('_metric_events', []):
+        counter.inc(**labels)
+
+def _after_soft_rollback(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('_metric_events', None)
+
+# ---------------------------------------------------------------------------
+# Flask integration
+# ---------------------------------------------------------------------------
+
+def require_internal_access():
+    """Abort with 403 unless the caller presents the internal token (or is local when none is set)"""
+    token = current_app.config.get('INTERNAL_METRICS_TOKEN')
+    if token:
+        if request.headers.get('X-Internal-Token') != token:
+            abort(403)
+    elif request.remote_addr not in ('127.0.0.1', '::1'):
+        abort(403)
+
+class Metrics:
+    """Flask extension recording request metrics and serving /metrics"""
+
+    def __init__(self, app=None, db=None):
+        self._last_flush = 0.0
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db=None):
+        app.config.setdefault('METRICS_MULTIPROC_DIR', None)
+        app.config.setdefault('METRICS_FLUSH_INTERVAL', 5)
+        app.config.setdefault('METRICS_DUMP_MAX_AGE', 300)
+        app.config.setdefault('INTERNAL_METRICS_TOKEN', None)
+
+        app.extensions['metrics'] = self
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', self._metrics_view)
+
+        if app.config['METRICS_MULTIPROC_DIR']:
+            # No pid argument: with --preload this runs in the master, before workers fork
+            atexit.register(remove_process_dump, app.config['METRICS_MULTIPROC_DIR'])
+
+        if db is not None:
+            def engine():
+                with app.app_context():
+                    return db.engine
+            registry.register_collector(_pool_collector(engine))
+
+        if not event.contains(OrmSession, 'after_flush', _after_flush):
+            event.listen(OrmSession, 'after_flush', _after_flush)
+            event.listen(OrmSession, 'after_commit', _after_commit)
+            event.listen(OrmSession, 'after_soft_rollback', _after_soft_rollback)
+
+    def _before_request(self):
+        g._metrics_started_at = time.perf_counter()
+
+    def _after_request(self, response):
+        started = g.get('_metrics_started_at')
+        if started is None:
+            return response
+
+        labels = {
+            'blueprint': request.blueprint or 'app',
+            'method': request.method,
+            'status': response.status_code,
+        }
+        request_latency.observe(time.perf_counter() - started, **labels)
+        requests_total.inc(**labels)
+
+        directory = current_app.config['METRICS_MULTIPROC_DIR']
+        now = time.monotonic()
+        if directory and now - self._last_flush >= current_app.config['METRICS_FLUSH_INTERVAL']:
+            self._last_flush = now
+            try:
+                write_process_dump(directory)
+            except OSError:
+                pass
+
+        return response
+
+    def _metrics_view(self):
+        require_internal_access()
+
+        directory = current_app.config['METRICS_MULTIPROC_DIR']
+        if directory:
+            write_process_dump(directory)
+            dump = merge_dumps(read_process_dumps(directory, current_app.config['METRICS_DUMP_MAX_AGE']))
+        else:
+            dump = registry.dump()
+
+        return Response(render_prometheus(dump), mimetype='text/plain; version=0.0.4')
+
+metrics = Metrics()
@@ -8,9 +8,12 @@ import os
 import sys
 from flask import Flask
 from flask_migrate import Migrate, upgrade, init, migrate, stamp
-from app import app, db
+from app import create_app, db
 from models import *
 
+# Migrations only need config and the database, not the API routes
+app = create_app('cli')
+
 def init_migration():
     """Initialize migration repository"""
     try:
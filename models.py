@@ -1,6 +1,7 @@
 from database import db
+from sqlalchemy import event, inspect
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+from password_hashing import hash_password, verify_password
 from flask_jwt_extended import create_access_token
 import enum
 
@@ -89,6 +90,7 @@ class User(db.Model):
     user_type = db.Column(db.Enum(UserType), nullable=False)
     profile_image = db.Column(db.String(500))
     is_active = db.Column(db.Boolean, default=True)
+    token_version = db.Column(db.Integer, default=1, server_default='1', nullable=False)  # bumped to revoke issued tokens
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -97,13 +99,26 @@ class User(db.Model):
     practitioner = db.relationship('Practitioner', backref='user', uselist=False, cascade='all, delete-orphan')
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        is_valid, needs_rehash = verify_password(self.password_hash, password)
+        # Upgrade hashes made with an old scheme or cost; persisted on the caller's commit
+        if needs_rehash:
+            self.set_password(password)
+        return is_valid
     
     def generate_token(self):
-        return create_access_token(identity=self.id, additional_claims={'user_type': self.user_type.value})
+        # Signed claims let protected endpoints authorize without reloading the user
+        return create_access_token(identity=self.id, additional_claims={
+            'user_type': self.user_type.value,
+            'patient_id': self.patient.id if self.patient else None,
+            'practitioner_id': self.practitioner.id if self.practitioner else None,
+            'token_version': self.token_version or 1
+        })
+    
+    def invalidate_tokens(self):
+        self.token_version = (self.token_version or 1) + 1
     
     def to_dict(self):
         return {
@@ -121,6 +136,14 @@ class User(db.Model):
             'updated_at': self.updated_at.isoformat()
         }
 
+@event.listens_for(User, 'before_update')
+def _revoke_tokens_on_access_change(mapper, connection, target):
+    # Deactivation or a role change must invalidate tokens carrying the old claims
+    state = inspect(target)
+    if state.attrs.is_active.history.has_changes() or state.attrs.user_type.history.has_changes():
+        if not state.attrs.token_version.history.has_changes():
+            target.invalidate_tokens()
+
 class Patient(db.Model):
     __tablename__ = 'patients'
     
@@ -166,6 +189,7 @@ class Practitioner(db.Model):
     bio = db.Column(db.Text)
     consultation_fee = db.Column(db.Numeric(10, 2))
     is_available = db.Column(db.Boolean, default=True)
+    timezone = db.Column(db.String(50))  # IANA name, e.g. Asia/Kolkata; CLINIC_TIMEZONE when empty
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -184,6 +208,7 @@ class Practitioner(db.Model):
             'bio': self.bio,
             'consultation_fee': float(self.consultation_fee) if self.consultation_fee else None,
             'is_available': self.is_available,
+            'timezone': self.timezone,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat()
         }
@@ -198,6 +223,7 @@ class TreatmentType(db.Model):
     price = db.Column(db.Numeric(10, 2), nullable=False)
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     program_treatments = db.relationship('ProgramTreatment', backref='treatment_type', lazy='dynamic')
@@ -225,6 +251,7 @@ class TreatmentProgram(db.Model):
     total_price = db.Column(db.Numeric(10, 2), nullable=False)
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     program_treatments = db.relationship('ProgramTreatment', backref='program', lazy='dynamic')
@@ -249,6 +276,7 @@ class ProgramTreatment(db.Model):
     program_id = db.Column(db.Integer, db.ForeignKey('treatment_programs.id'), nullable=False)
     treatment_id = db.Column(db.Integer, db.ForeignKey('treatment_types.id'), nullable=False)
     session_order = db.Column(db.Integer, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     def to_dict(self):
         return {
@@ -487,6 +515,10 @@ class Article(db.Model):
 # Contact Form Submissions
 class ContactSubmission(db.Model):
     __tablename__ = 'contact_submissions'
+    __table_args__ = (
+        db.Index('ix_contact_triage', 'status', 'is_urgent', 'created_at'),
+        db.Index('ix_contact_email_created', 'email', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -497,6 +529,10 @@ class ContactSubmission(db.Model):
     status = db.Column(db.String(20), default='new')  # new, read, replied, closed
     is_urgent = db.Column(db.Boolean, default=False)
     replied_at = db.Column(db.DateTime)
+    fingerprint = db.Column(db.String(64), index=True)  # sha256 of normalized email + subject
+    open_key = db.Column(db.String(64), unique=True)  # fingerprint while new/read inside the dedup window, else NULL
+    repeat_count = db.Column(db.Integer, default=0)  # identical submissions folded into this one
+    last_received_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def to_dict(self):
@@ -510,12 +546,17 @@ class ContactSubmission(db.Model):
             'status': self.status,
             'is_urgent': self.is_urgent,
             'replied_at': self.replied_at.isoformat() if self.replied_at else None,
+            'repeat_count': self.repeat_count or 0,
+            'last_received_at': self.last_received_at.isoformat() if self.last_received_at else None,
             'created_at': self.created_at.isoformat()
         }
 
 # Newsletter Subscriptions
 class NewsletterSubscription(db.Model):
     __tablename__ = 'newsletter_subscriptions'
+    __table_args__ = (
+        db.Index('ix_newsletter_active_id', 'is_active', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(255), unique=True, nullable=False)
@@ -534,9 +575,46 @@ class NewsletterSubscription(db.Model):
             'unsubscribed_at': self.unsubscribed_at.isoformat() if self.unsubscribed_at else None
         }
 
+class NewsletterCampaign(db.Model):
+    __tablename__ = 'newsletter_campaigns'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    subject = db.Column(db.String(200), nullable=False)
+    body_text = db.Column(db.Text, nullable=False)
+    body_html = db.Column(db.Text)
+    status = db.Column(db.String(20), default='draft')  # draft, queued, sending, sent, cancelled, failed
+    last_recipient_id = db.Column(db.Integer, default=0)  # subscription id the send has reached
+    sent_count = db.Column(db.Integer, default=0)
+    failed_count = db.Column(db.Integer, default=0)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'subject': self.subject,
+            'body_text': self.body_text,
+            'body_html': self.body_html,
+            'status': self.status,
+            'last_recipient_id': self.last_recipient_id,
+            'sent_count': self.sent_count,
+            'failed_count': self.failed_count,
+            'created_by': self.created_by,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
 # Payment and Billing System
 class Payment(db.Model):
     __tablename__ = 'payments'
+    __table_args__ = (
+        db.Index('ix_payments_paid_at', 'paid_at'),
+        db.Index('ix_payments_updated_at', 'updated_at'),
+        db.Index('ux_payments_gateway_transaction', 'payment_gateway', 'transaction_id', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -549,6 +627,8 @@ class Payment(db.Model):
     payment_gateway = db.Column(db.String(50))  # stripe, paypal, etc.
     paid_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    fact_date = db.Column(db.Date)  # day the payment was last counted in revenue_facts
     
     def to_dict(self):
         return {
@@ -565,6 +645,95 @@ class Payment(db.Model):
             'created_at': self.created_at.isoformat()
         }
 
+# Revenue Reconciliation
+class RevenueFact(db.Model):
+    __tablename__ = 'revenue_facts'
+    __table_args__ = (
+        db.Index('ix_revenue_facts_date', 'fact_date', 'practitioner_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    fact_date = db.Column(db.Date, nullable=False)  # paid_at date, created_at for unpaid payments
+    practitioner_id = db.Column(db.Integer, db.ForeignKey('practitioners.id'))
+    treatment_id = db.Column(db.Integer, db.ForeignKey('treatment_types.id'))
+    program_id = db.Column(db.Integer, db.ForeignKey('treatment_programs.id'))
+    currency = db.Column(db.String(3), nullable=False)
+    payment_status = db.Column(db.String(20), nullable=False)
+    payment_count = db.Column(db.Integer, default=0, nullable=False)
+    amount_total = db.Column(db.Numeric(12, 2), default=0, nullable=False)
+    expected_total = db.Column(db.Numeric(12, 2), default=0, nullable=False)  # list price of the paid sessions
+    discrepancy_count = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'fact_date': self.fact_date.isoformat(),
+            'practitioner_id': self.practitioner_id,
+            'treatment_id': self.treatment_id,
+            'program_id': self.program_id,
+            'currency': self.currency,
+            'payment_status': self.payment_status,
+            'payment_count': self.payment_count,
+            'amount_total': float(self.amount_total),
+            'expected_total': float(self.expected_total),
+            'discrepancy_count': self.discrepancy_count
+        }
+
+class PaymentDiscrepancy(db.Model):
+    __tablename__ = 'payment_discrepancies'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    payment_id = db.Column(db.Integer, db.ForeignKey('payments.id'), nullable=False, unique=True)
+    fact_date = db.Column(db.Date, nullable=False, index=True)
+    reason = db.Column(db.String(50), nullable=False)  # amount_mismatch, paid_for_cancelled_session
+    amount = db.Column(db.Numeric(10, 2), nullable=False)
+    expected_amount = db.Column(db.Numeric(10, 2))
+    status = db.Column(db.String(20), default='open')  # open, resolved
+    resolved_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    resolved_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'payment_id': self.payment_id,
+            'fact_date': self.fact_date.isoformat(),
+            'reason': self.reason,
+            'amount': float(self.amount),
+            'expected_amount': float(self.expected_amount) if self.expected_amount is not None else None,
+            'status': self.status,
+            'resolved_by': self.resolved_by,
+            'resolved_at': self.resolved_at.isoformat() if self.resolved_at else None,
+            'created_at': self.created_at.isoformat()
+        }
+
+class ReconciliationRun(db.Model):
+    __tablename__ = 'reconciliation_runs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), default='running')  # running, succeeded, failed
+    lock_key = db.Column(db.String(20), unique=True)  # 'running' while in progress, so only one run holds it
+    full = db.Column(db.Boolean, default=False)
+    watermark = db.Column(db.DateTime)  # payments updated after this are picked up by the next run
+    payments_changed = db.Column(db.Integer, default=0)
+    days_rebuilt = db.Column(db.Integer, default=0)
+    discrepancies = db.Column(db.Integer, default=0)
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'full': self.full,
+            'watermark': self.watermark.isoformat() if self.watermark else None,
+            'payments_changed': self.payments_changed,
+            'days_rebuilt': self.days_rebuilt,
+            'discrepancies': self.discrepancies,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
 # Appointment Booking System
 class Appointment(db.Model):
     __tablename__ = 'appointments'
@@ -765,9 +934,91 @@ class PatientSymptom(db.Model):
             'created_at': self.created_at.isoformat()
         }
 
+# Symptom History
+class SymptomObservation(db.Model):
+    __tablename__ = 'symptom_observations'
+    __table_args__ = (
+        db.Index('ix_symptom_observations_series', 'patient_id', 'symptom_name', 'observed_at'),
+        db.CheckConstraint('severity >= 1 AND severity <= 10', name='check_observation_severity_range'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), nullable=False)
+    symptom_id = db.Column(db.Integer, db.ForeignKey('patient_symptoms.id'))
+    symptom_name = db.Column(db.String(200), nullable=False)  # normalized: stripped, lower case
+    severity = db.Column(db.Integer, nullable=False)  # 1-10 scale
+    observed_at = db.Column(db.DateTime, nullable=False)
+    recorded_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    notes = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'patient_id': self.patient_id,
+            'symptom_id': self.symptom_id,
+            'symptom_name': self.symptom_name,
+            'severity': self.severity,
+            'observed_at': self.observed_at.isoformat(),
+            'recorded_by': self.recorded_by,
+            'notes': self.notes
+        }
+
+class SymptomTrend(db.Model):
+    __tablename__ = 'symptom_trends'
+    __table_args__ = (
+        db.UniqueConstraint('patient_id', 'symptom_name', name='ux_symptom_trends_series'),
+        db.Index('ix_symptom_trends_cohort', 'symptom_name', 'last_observed_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), nullable=False)
+    symptom_name = db.Column(db.String(200), nullable=False)
+    observation_count = db.Column(db.Integer, default=0, nullable=False)
+    current_severity = db.Column(db.Integer, nullable=False)  # at last_observed_at
+    first_severity = db.Column(db.Integer, nullable=False)  # at first_observed_at
+    min_severity = db.Column(db.Integer, nullable=False)
+    max_severity = db.Column(db.Integer, nullable=False)
+    # Least-squares sums over (t = days since symptoms.TREND_EPOCH, y = severity)
+    sum_t = db.Column(db.Float(53), default=0, nullable=False)
+    sum_tt = db.Column(db.Float(53), default=0, nullable=False)
+    sum_y = db.Column(db.Float(53), default=0, nullable=False)
+    sum_ty = db.Column(db.Float(53), default=0, nullable=False)
+    first_observed_at = db.Column(db.DateTime, nullable=False)
+    last_observed_at = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    @property
+    def slope(self):
+        """Severity change per day fitted over every observation; None with fewer than two days"""
+        n = self.observation_count
+        denominator = n * self.sum_tt - self.sum_t * self.sum_t
+        if n < 2 or denominator <= 1e-9:
+            return None
+        return (n * self.sum_ty - self.sum_t * self.sum_y) / denominator
+    
+    def to_dict(self):
+        slope = self.slope
+        return {
+            'patient_id': self.patient_id,
+            'symptom_name': self.symptom_name,
+            'observation_count': self.observation_count,
+            'current_severity': self.current_severity,
+            'first_severity': self.first_severity,
+            'min_severity': self.min_severity,
+            'max_severity': self.max_severity,
+            'mean_severity': round(self.sum_y / self.observation_count, 2) if self.observation_count else None,
+            'slope_per_day': round(slope, 4) if slope is not None else None,
+            'first_observed_at': self.first_observed_at.isoformat(),
+            'last_observed_at': self.last_observed_at.isoformat()
+        }
+
 # Session Activities and Notes
 class SessionActivity(db.Model):
     __tablename__ = 'session_activities'
+    __table_args__ = (
+        db.Index('ix_session_activities_session_time', 'session_id', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.Integer, db.ForeignKey('sessions.id'), nullable=False)
@@ -786,6 +1037,43 @@ class SessionActivity(db.Model):
             'created_by': self.created_by
         }
 
+# Per-session state folded from SessionActivity events
+class SessionSnapshot(db.Model):
+    __tablename__ = 'session_snapshots'
+    
+    session_id = db.Column(db.Integer, db.ForeignKey('sessions.id'), primary_key=True)
+    state = db.Column(db.String(20), default='not_started', nullable=False)  # not_started, in_progress, paused, completed
+    started_at = db.Column(db.DateTime)
+    paused_at = db.Column(db.DateTime)  # start of the current pause
+    completed_at = db.Column(db.DateTime)
+    pause_count = db.Column(db.Integer, default=0, nullable=False)
+    total_pause_seconds = db.Column(db.Integer, default=0, nullable=False)
+    actual_duration_seconds = db.Column(db.Integer)  # set on completion, pauses excluded
+    event_count = db.Column(db.Integer, default=0, nullable=False)
+    last_event_at = db.Column(db.DateTime)
+    compacted_events = db.Column(db.Integer, default=0, nullable=False)  # events folded in and deleted
+    compacted_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self, now=None):
+        elapsed = None
+        if self.started_at:
+            end = self.completed_at or self.paused_at or now or datetime.utcnow()
+            elapsed = int((end - self.started_at).total_seconds()) - self.total_pause_seconds
+        return {
+            'session_id': self.session_id,
+            'state': self.state,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'paused_at': self.paused_at.isoformat() if self.paused_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+            'pause_count': self.pause_count,
+            'total_pause_seconds': self.total_pause_seconds,
+            'actual_duration_seconds': self.actual_duration_seconds,
+            'elapsed_seconds': elapsed,
+            'event_count': self.event_count,
+            'last_event_at': self.last_event_at.isoformat() if self.last_event_at else None
+        }
+
 # Session Rescheduling
 class SessionReschedule(db.Model):
     __tablename__ = 'session_reschedules'
@@ -841,3 +1129,178 @@ class SiteSetting(db.Model):
             'is_public': self.is_public,
             'updated_at': self.updated_at.isoformat()
         }
+
+# Background Jobs
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    __table_args__ = (
+        db.Index('ix_jobs_claim', 'status', 'run_at', 'priority'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)  # registered handler, e.g. exports.generate
+    payload = db.Column(db.JSON)
+    status = db.Column(db.String(20), default='queued', nullable=False)  # queued, running, succeeded, failed, dead
+    priority = db.Column(db.Integer, default=0, nullable=False)  # higher runs first
+    idempotency_key = db.Column(db.String(200), unique=True)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=5, nullable=False)
+    run_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    locked_by = db.Column(db.String(100))
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    result = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'payload': self.payload,
+            'status': self.status,
+            'priority': self.priority,
+            'idempotency_key': self.idempotency_key,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'run_at': self.run_at.isoformat() if self.run_at else None,
+            'last_error': self.last_error,
+            'result': self.result,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+# Practitioner Calendars
+class WorkingHours(db.Model):
+    __tablename__ = 'working_hours'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    practitioner_id = db.Column(db.Integer, db.ForeignKey('practitioners.id'), nullable=False, index=True)
+    weekday = db.Column(db.Integer, nullable=False)  # 0 = Monday ... 6 = Sunday
+    start_time = db.Column(db.Time, nullable=False)  # practitioner's local wall-clock time
+    end_time = db.Column(db.Time, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (db.CheckConstraint('weekday >= 0 AND weekday <= 6', name='check_working_hours_weekday'),)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'practitioner_id': self.practitioner_id,
+            'weekday': self.weekday,
+            'start_time': self.start_time.strftime('%H:%M'),
+            'end_time': self.end_time.strftime('%H:%M')
+        }
+
+class Holiday(db.Model):
+    __tablename__ = 'holidays'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    practitioner_id = db.Column(db.Integer, db.ForeignKey('practitioners.id'), index=True)  # NULL = whole clinic
+    holiday_date = db.Column(db.Date, nullable=False, index=True)
+    description = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'practitioner_id': self.practitioner_id,
+            'holiday_date': self.holiday_date.isoformat(),
+            'description': self.description,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+# Waitlist and Cancellation Backfill
+class WaitlistEntry(db.Model):
+    __tablename__ = 'waitlist_entries'
+    __table_args__ = (
+        db.Index('ix_waitlist_match', 'status', 'treatment_id', 'practitioner_id', 'earliest_date'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), nullable=False, index=True)
+    practitioner_id = db.Column(db.Integer, db.ForeignKey('practitioners.id'))  # NULL = any practitioner
+    treatment_id = db.Column(db.Integer, db.ForeignKey('treatment_types.id'), nullable=False)
+    earliest_date = db.Column(db.Date, nullable=False)
+    latest_date = db.Column(db.Date, nullable=False)
+    preferred_start = db.Column(db.Time)  # local time window the patient can attend
+    preferred_end = db.Column(db.Time)
+    status = db.Column(db.String(20), default='waiting', nullable=False)  # waiting, offered, booked, cancelled
+    notes = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'patient_id': self.patient_id,
+            'practitioner_id': self.practitioner_id,
+            'treatment_id': self.treatment_id,
+            'earliest_date': self.earliest_date.isoformat(),
+            'latest_date': self.latest_date.isoformat(),
+            'preferred_start': self.preferred_start.strftime('%H:%M') if self.preferred_start else None,
+            'preferred_end': self.preferred_end.strftime('%H:%M') if self.preferred_end else None,
+            'status': self.status,
+            'notes': self.notes,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class SlotOffer(db.Model):
+    __tablename__ = 'slot_offers'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    waitlist_entry_id = db.Column(db.Integer, db.ForeignKey('waitlist_entries.id'), nullable=False, index=True)
+    source_session_id = db.Column(db.Integer, db.ForeignKey('sessions.id'), nullable=False)  # the freed booking
+    practitioner_id = db.Column(db.Integer, db.ForeignKey('practitioners.id'), nullable=False)
+    treatment_id = db.Column(db.Integer, db.ForeignKey('treatment_types.id'), nullable=False)
+    scheduled_date = db.Column(db.Date, nullable=False)
+    scheduled_time = db.Column(db.Time, nullable=False)
+    duration_minutes = db.Column(db.Integer, nullable=False)
+    # practitioner:date:time while the offer is pending, NULL afterwards; the unique index
+    # guarantees at most one live hold per slot
+    slot_key = db.Column(db.String(50), unique=True)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending, accepted, declined, expired
+    expires_at = db.Column(db.DateTime, nullable=False)
+    booked_session_id = db.Column(db.Integer, db.ForeignKey('sessions.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'waitlist_entry_id': self.waitlist_entry_id,
+            'practitioner_id': self.practitioner_id,
+            'treatment_id': self.treatment_id,
+            'scheduled_date': self.scheduled_date.isoformat(),
+            'scheduled_time': self.scheduled_time.strftime('%H:%M'),
+            'duration_minutes': self.duration_minutes,
+            'status': self.status,
+            'expires_at': self.expires_at.isoformat(),
+            'booked_session_id': self.booked_session_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+# Archives: cold rows moved out of the hot tables by archive.py. Same columns and ids as the
+# hot table plus archived_at; no foreign keys, since parents may be archived as well
+def _archive_table(model, *indexes):
+    columns = [db.Column(column.name, column.type, primary_key=column.primary_key, nullable=column.nullable,
+                         autoincrement=False)
+               for column in model.__table__.columns]
+    return db.Table(f'{model.__tablename__}_archive', *columns,
+                    db.Column('archived_at', db.DateTime, nullable=False), *indexes)
+
+sessions_archive = _archive_table(
+    Session,
+    db.Index('ix_sessions_archive_patient', 'patient_id', 'scheduled_date'),
+    db.Index('ix_sessions_archive_practitioner', 'practitioner_id', 'scheduled_date')
+)
+session_snapshots_archive = _archive_table(SessionSnapshot)
+session_activities_archive = _archive_table(
+    SessionActivity, db.Index('ix_session_activities_archive_session', 'session_id', 'timestamp')
+)
+wellness_logs_archive = _archive_table(
+    WellnessLog, db.Index('ix_wellness_logs_archive_patient', 'patient_id', 'log_date')
+)
+notifications_archive = _archive_table(
+    Notification, db.Index('ix_notifications_archive_user', 'user_id', 'created_at')
+)
@@ -0,0 +1,272 @@
+"""
+Newsletter subscriptions and campaigns for AyurSutra
+Bulk subscribe/unsubscribe with one statement per chunk, keyset iteration over active
+subscribers, and campaign delivery from background jobs in resumable, time-boxed slices
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from email.utils import formataddr
+
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeSerializer
+from sqlalchemy import case, func, update
+
+from database import db, upsert
+from jobs import job, enqueue
+from mailer import MailError, MailTransportError, build_message, transport_from_config
+from models import NewsletterSubscription, NewsletterCampaign
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000
+
+# Recipients per delivery batch; progress is committed after each
+SEND_CHUNK_SIZE = 200
+
+DEFAULT_SEND_CONCURRENCY = 8
+
+# A send job stops after this long and queues a continuation, staying well inside the
+# worker lock timeout; resends after a crash are limited to one chunk
+SLICE_SECONDS = 300
+
+SEND_JOB = 'newsletter.send_campaign'
+
+class NewsletterError(ValueError):
+    """Raised for invalid campaign operations or unsubscribe tokens"""
+
+def normalize_email(value):
+    email = str(value or '').strip().lower()
+    local, _, domain = email.partition('@')
+    if not local or '.' not in domain or ' ' in email or len(email) > 255:
+        return None
+    return email
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def bulk_subscribe(entries, chunk_size=CHUNK_SIZE):
+    """Subscribe or reactivate many addresses; entries are emails or {'email', 'name'} dicts
+
+    One upsert per chunk on the unique email index. Returns {'processed': n, 'invalid': [...]}.
+    """
+    now = datetime.utcnow()
+    rows, invalid = {}, []
+    for entry in entries:
+        raw = entry.get('email') if isinstance(entry, dict) else entry
+        email = normalize_email(raw)
+        if email is None:
+            invalid.append(raw)
+            continue
+        name = entry.get('name') if isinstance(entry, dict) else None
+        # One line of text, since it ends up in the To: header of campaign mail
+        name = ' '.join(name.split())[:100] if isinstance(name, str) else None
+        rows[email] = {'email': email, 'name': name or None, 'is_active': True,
+                       'subscribed_at': now, 'unsubscribed_at': None}
+
+    existing = NewsletterSubscription.__table__.c
+
+    def assignments(new):
+        # is_active is read by subscribed_at, so it is assigned last
+        return {
+            'name': func.coalesce(new.name, existing.name),
+            'subscribed_at': case((existing.is_active.is_(True), existing.subscribed_at), else_=new.subscribed_at),
+            'unsubscribed_at': None,
+            'is_active': True,
+        }
+
+    try:
+        for chunk in _chunks(list(rows.values()), chunk_size):
+            db.session.execute(upsert(NewsletterSubscription, chunk, ['email'], assignments))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return {'processed': len(rows), 'invalid': invalid}
+
+def bulk_unsubscribe(emails, chunk_size=CHUNK_SIZE):
+    """Deactivate many addresses with one UPDATE per chunk; returns how many were active"""
+    normalized = sorted({email for email in map(normalize_email, emails) if email})
+    now = datetime.utcnow()
+    changed = 0
+    try:
+        for chunk in _chunks(normalized, chunk_size):
+            result = db.session.execute(
+                update(NewsletterSubscription)
+                .where(NewsletterSubscription.email.in_(chunk), NewsletterSubscription.is_active.is_(True))
+                .values(is_active=False, unsubscribed_at=now)
+            )
+            changed += result.rowcount
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return changed
+
+def iter_recipients(after_id=0, chunk_size=CHUNK_SIZE):
+    """Yield lists of (id, email, name) for active subscribers in id order
+
+    Each chunk is a separate keyset query on (is_active, id), so memory stays at one chunk
+    and the caller may commit between chunks.
+    """
+    while True:
+        chunk = db.session.query(
+            NewsletterSubscription.id, NewsletterSubscription.email, NewsletterSubscription.name
+        ).filter(
+            NewsletterSubscription.is_active.is_(True), NewsletterSubscription.id > after_id
+        ).order_by(NewsletterSubscription.id).limit(chunk_size).all()
+        if not chunk:
+            return
+        yield chunk
+        after_id = chunk[-1][0]
+
+def _serializer():
+    return URLSafeSerializer(current_app.config['SECRET_KEY'], salt='newsletter-unsubscribe')
+
+def unsubscribe_token(email):
+    return _serializer().dumps(email)
+
+def token_email(token):
+    """The address an unsubscribe token was issued for; raises NewsletterError if it is not ours"""
+    try:
+        return _serializer().loads(token)
+    except BadSignature:
+        raise NewsletterError('Invalid unsubscribe link')
+
+def unsubscribe_with_token(token):
+    """One-click unsubscribe from a campaign link; returns the email"""
+    email = token_email(token)
+    bulk_unsubscribe([email])
+    return email
+
+def queue_campaign(campaign):
+    """Move a draft to queued and enqueue its first send slice (caller commits)"""
+    if campaign.status != 'draft':
+        raise NewsletterError(f"Campaign is {campaign.status}, only drafts can be sent")
+    campaign.status = 'queued'
+    return enqueue(SEND_JOB, {'campaign_id': campaign.id}, idempotency_key=f'newsletter_campaign:{campaign.id}:0')
+
+def cancel_campaign(campaign):
+    """Stop a queued or sending campaign after its current chunk (caller commits)"""
+    if campaign.status not in ('draft', 'queued', 'sending'):
+        raise NewsletterError(f'Campaign is already {campaign.status}')
+    campaign.status = 'cancelled'
+    campaign.finished_at = datetime.utcnow()
+
+class _Deliverer:
+    """Sends one campaign's messages from a thread pool, one mail connection per thread"""
+
+    def __init__(self, config, campaign):
+        self.config = config
+        self.sender = config.get('MAIL_DEFAULT_SENDER', 'AyurSutra <noreply@ayursutra.local>')
+        self.subject = campaign.subject
+        self.body_text = campaign.body_text
+        self.body_html = campaign.body_html
+        self.base_url = config.get('PUBLIC_BASE_URL', '').rstrip('/')
+        self._local = threading.local()
+        self._transports = []
+        self._lock = threading.Lock()
+        # Set by the first transport failure; the rest of the chunk then fails fast instead of reconnecting
+        self._transport_error = None
+
+    def _transport(self):
+        transport = getattr(self._local, 'transport', None)
+        if transport is None:
+            transport = self._local.transport = transport_from_config(self.config)
+            with self._lock:
+                self._transports.append(transport)
+        return transport
+
+    def deliver(self, recipient):
+        if self._transport_error is not None:
+            raise self._transport_error
+        _, email, name, token = recipient
+        unsubscribe_url = f"{self.base_url}/api/newsletter/bulk/unsubscribe/one-click?token={token}"
+        text = f"{self.body_text}\n\n--\nUnsubscribe: {unsubscribe_url}\n"
+        html = self.body_html and f'{self.body_html}<p><a href="{unsubscribe_url}">Unsubscribe</a></p>'
+        try:
+            # RFC 8058: mail clients unsubscribe with a POST to the link, never by following it
+            message = build_message(self.sender, formataddr((name, email)) if name else email, self.subject, text,
+                                    html, headers={'List-Unsubscribe': f'<{unsubscribe_url}>',
+                                                   'List-Unsubscribe-Post': 'List-Unsubscribe=One-Click'})
+            self._transport().send(message)
+            return True
+        except MailTransportError as e:
+            # The whole chunk is retried once the server is back, see send_campaign_slice()
+            self._transport_error = e
+            raise
+        except (MailError, ValueError) as e:
+            # A bad address or header fails this recipient, not the whole chunk
+            logger.warning('Newsletter to %s failed: %s', email, e)
+            return False
+
+    def close(self):
+        for transport in self._transports:
+            transport.close()
+
+def send_campaign_slice(campaign_id, chunk_size=SEND_CHUNK_SIZE, concurrency=None, budget=SLICE_SECONDS):
+    """Deliver a campaign from where it left off until done, cancelled or out of time
+
+    Progress (last_recipient_id and counts) is committed per chunk, so a retried or
+    continued job resumes after the last committed chunk. Refused recipients count as
+    failed; a MailTransportError (server unreachable or failing) propagates before the
+    chunk's progress is committed, so the job backs off and resends that chunk.
+    """
+    now = datetime.utcnow()
+    claimed = db.session.execute(
+        update(NewsletterCampaign)
+        .where(NewsletterCampaign.id == campaign_id, NewsletterCampaign.status.in_(('queued', 'sending')))
+        .values(status='sending', started_at=func.coalesce(NewsletterCampaign.started_at, now))
+    )
+    db.session.commit()
+    if claimed.rowcount != 1:
+        return {'sending': False}
+
+    campaign = db.session.get(NewsletterCampaign, campaign_id)
+    concurrency = concurrency or current_app.config.get('NEWSLETTER_SEND_CONCURRENCY', DEFAULT_SEND_CONCURRENCY)
+    deliverer = _Deliverer(current_app.config, campaign)
+    serializer = _serializer()
+    deadline = time.monotonic() + budget
+    last_id, finished = campaign.last_recipient_id or 0, True
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='newsletter') as pool:
+            for chunk in iter_recipients(last_id, chunk_size):
+                status = db.session.query(NewsletterCampaign.status).filter_by(id=campaign_id).scalar()
+                if status != 'sending':
+                    return {'sending': False, 'status': status}
+
+                recipients = [(sub_id, email, name, serializer.dumps(email)) for sub_id, email, name in chunk]
+                delivered = sum(pool.map(deliverer.deliver, recipients))
+                last_id = chunk[-1][0]
+                db.session.execute(
+                    update(NewsletterCampaign).where(NewsletterCampaign.id == campaign_id).values(
+                        last_recipient_id=last_id,
+                        sent_count=NewsletterCampaign.sent_count + delivered,
+                        failed_count=NewsletterCampaign.failed_count + len(chunk) - delivered
+                    )
+                )
+                db.session.commit()
+                if time.monotonic() > deadline:
+                    finished = False
+                    break
+    finally:
+        deliverer.close()
+
+    if finished:
+        db.session.execute(
+            update(NewsletterCampaign)
+            .where(NewsletterCampaign.id == campaign_id, NewsletterCampaign.status == 'sending')
+            .values(status='sent', finished_at=datetime.utcnow())
+        )
+    else:
+        enqueue(SEND_JOB, {'campaign_id': campaign_id}, idempotency_key=f'newsletter_campaign:{campaign_id}:{last_id}')
+    return {'sending': not finished, 'last_recipient_id': last_id}
+
+@job(SEND_JOB, max_attempts=5, priority=-10)
+def send_campaign(campaign_id):
+    return send_campaign_slice(campaign_id)
@@ -0,0 +1,223 @@
+"""
+Password hashing for AyurSutra
+Pluggable hashers with configurable cost, rehash detection and a bounded worker pool
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import bcrypt
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_SCHEME = 'bcrypt'
+DEFAULT_BCRYPT_ROUNDS = 12
+DEFAULT_PBKDF2_ITERATIONS = 600000
+
+class HashingBusy(Exception):
+    """Raised when the hashing pool is saturated and the caller should retry later"""
+
+class PasswordHasher:
+    """Base class for password hashing schemes"""
+
+    scheme = None
+
+    def hash(self, password):
+        raise NotImplementedError
+
+    def verify(self, password_hash, password):
+        raise NotImplementedError
+
+    def identify(self, password_hash):
+        """Return True if password_hash was produced by this scheme"""
+        raise NotImplementedError
+
+    def needs_update(self, password_hash):
+        """Return True if password_hash uses different parameters than this hasher"""
+        raise NotImplementedError
+
+class BcryptHasher(PasswordHasher):
+    scheme = 'bcrypt'
+
+    def __init__(self, rounds=DEFAULT_BCRYPT_ROUNDS):
+        self.rounds = int(rounds)
+
+    @staticmethod
+    def _encode(password):
+        # bcrypt only uses the first 72 bytes; truncate explicitly so behaviour
+        # doesn't depend on the installed bcrypt version
+        return password.encode('utf-8')[:72]
+
+    def hash(self, password):
+        return bcrypt.hashpw(self._encode(password), bcrypt.gensalt(self.rounds)).decode('ascii')
+
+    def verify(self, password_hash, password):
+        try:
+            return bcrypt.checkpw(self._encode(password), password_hash.encode('ascii'))
+        except ValueError:
+            return False
+
+    def identify(self, password_hash):
+        return password_hash.startswith(('$2a$', '$2b$', '$2y$'))
+
+    def needs_update(self, password_hash):
+        try:
+            return int(password_hash.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+class Pbkdf2Hasher(PasswordHasher):
+    """Werkzeug's pbkdf2/scrypt format, used by accounts created before bcrypt"""
+
+    scheme = 'pbkdf2'
+
+    def __init__(self, iterations=DEFAULT_PBKDF2_ITERATIONS):
+        self.iterations = int(iterations)
+
+    @property
+    def method(self):
+        return f'pbkdf2:sha256:{self.iterations}'
+
+    def hash(self, password):
+        return generate_password_hash(password, method=self.method)
+
+    def verify(self, password_hash, password):
+        return check_password_hash(password_hash, password)
+
+    def identify(self, password_hash):
+        return password_hash.startswith(('pbkdf2:', 'scrypt:'))
+
+    def needs_update(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.method
+
+HASHERS = {
+    'bcrypt': (BcryptHasher, 'rounds'),
+    'pbkdf2': (Pbkdf2Hasher, 'iterations'),
+}
+
+def create_hasher(scheme=DEFAULT_SCHEME, cost=None):
+    """Build a hasher by scheme name with an optional cost (rounds/iterations)"""
+    if scheme not in HASHERS:
+        raise ValueError(f"Unknown password hashing scheme '{scheme}'")
+    hasher_cls, cost_arg = HASHERS[scheme]
+    return hasher_cls(**({cost_arg: cost} if cost else {}))
+
+class _HashingState:
+    """Process-wide hasher configuration and worker pool"""
+
+    def __init__(self):
+        self.hasher = None
+        self.legacy_hashers = []
+        self.executor = None
+        self.slots = None
+        self.timeout = None
+        self.lock = threading.Lock()
+
+    def configure(self, scheme, cost, pool_size, max_pending, timeout):
+        with self.lock:
+            self.hasher = create_hasher(scheme, cost)
+            # Hashes from other schemes can still be verified, then get rehashed
+            self.legacy_hashers = [create_hasher(name) for name in HASHERS if name != scheme]
+
+            if self.executor:
+                self.executor.shutdown(wait=False)
+            self.executor = None
+            self.slots = None
+            if pool_size > 0:
+                self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='password-hash')
+                self.slots = threading.BoundedSemaphore(max_pending or pool_size * 4)
+            self.timeout = timeout
+
+    def ensure_configured(self):
+        if self.hasher is None:
+            configure_hashing()
+
+_state = _HashingState()
+
+def configure_hashing(scheme=None, cost=None, pool_size=None, max_pending=None, timeout=None):
+    """Configure the hashing scheme and pool; unset values come from the environment"""
+    scheme = scheme or os.getenv('PASSWORD_HASHER', DEFAULT_SCHEME)
+    if cost is None and os.getenv('PASSWORD_HASH_COST'):
+        cost = int(os.getenv('PASSWORD_HASH_COST'))
+    if pool_size is None:
+        pool_size = int(os.getenv('HASHING_POOL_SIZE', os.cpu_count() or 1))
+    if max_pending is None and os.getenv('HASHING_MAX_PENDING'):
+        max_pending = int(os.getenv('HASHING_MAX_PENDING'))
+    if timeout is None:
+        timeout = float(os.getenv('HASHING_TIMEOUT', 10))
+
+    _state.configure(scheme, cost, pool_size, max_pending, timeout)
+
+def init_app(app):
+    """Configure hashing from Flask app config"""
+    configure_hashing(
+        scheme=app.config.get('PASSWORD_HASHER'),
+        cost=app.config.get('PASSWORD_HASH_COST'),
+        pool_size=app.config.get('HASHING_POOL_SIZE'),
+        max_pending=app.config.get('HASHING_MAX_PENDING'),
+        timeout=app.config.get('HASHING_TIMEOUT')
+    )
+
+def _run(func, *args):
+    """Run func in the hashing pool, refusing work when too much is already queued
+
+    bcrypt and hashlib release the GIL, so hashes run in parallel while the
+    request thread waits; the semaphore caps how many requests can be waiting.
+    """
+    if _state.executor is None:
+        return func(*args)
+
+    slots = _state.slots
+    if not slots.acquire(blocking=False):
+        raise HashingBusy('Too many concurrent password operations')
+    try:
+        future = _state.executor.submit(func, *args)
+    except Exception:
+        slots.release()
+        raise
+    # The slot is freed when the hash finishes, not when a timed-out caller gives up on it
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=_state.timeout)
+    except FutureTimeout:
+        raise HashingBusy('Password operation timed out')
+
+def hash_password(password):
+    """Hash a password with the configured scheme"""
+    _state.ensure_configured()
+    return _run(_state.hasher.hash, password)
+
+def hash_passwords(passwords):
+    """Hash many passwords at once for offline bulk work (imports), spread over the whole pool
+
+    Not limited by the request slots: callers are scripts, not request threads.
+    """
+    _state.ensure_configured()
+    if _state.executor is None:
+        return [_state.hasher.hash(password) for password in passwords]
+    return list(_state.executor.map(_state.hasher.hash, passwords))
+
+def _find_hasher(password_hash):
+    for hasher in [_state.hasher] + _state.legacy_hashers:
+        if hasher.identify(password_hash):
+            return hasher
+    return None
+
+def verify_password(password_hash, password):
+    """Check a password, returning (is_valid, needs_rehash)"""
+    _state.ensure_configured()
+    if not password_hash:
+        return False, False
+
+    hasher = _find_hasher(password_hash)
+    if hasher is None:
+        return False, False
+
+    is_valid = _run(hasher.verify, password_hash, password)
+    needs_rehash = is_valid and (hasher is not _state.hasher or hasher.needs_update(password_hash))
+    return is_valid, needs_rehash
+
+def get_hasher():
+    """Return the active hasher"""
+    _state.ensure_configured()
+    return _state.hasher
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Payment ingestion for AyurSutra
+Applies gateway status updates idempotently: one row per (payment_gateway, transaction_id),
+written with a single upsert, and retries of an update already applied in this process are
+answered from a small in-memory filter without touching the database
+"""
+
+import argparse
+import hashlib
+import hmac
+import sys
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+
+from flask import current_app
+from sqlalchemy import case, func
+
+from database import db, upsert
+from metrics import register_cache, registry
+from models import Payment, Patient, Session
+from ttl_cache import TTLCache
+
+# Later statuses win; an update never moves a payment back to an earlier one
+STATUS_RANK = {'pending': 0, 'failed': 1, 'completed': 2, 'refunded': 3}
+
+# (gateway, transaction_id) -> rank of the last status applied by this process
+_recent_keys = TTLCache(maxsize=50000, ttl=600)
+register_cache('payment_keys', _recent_keys)
+
+payment_events_total = registry.counter(
+    'ayursutra_payment_events_total', 'Gateway payment updates by outcome', ('gateway', 'outcome'))
+
+class PaymentIngestError(ValueError):
+    """Raised for malformed or unverifiable gateway updates"""
+
+def verify_signature(payload, signature):
+    """Check an HMAC-SHA256 hex signature of the raw body; nothing verifies without PAYMENT_WEBHOOK_SECRET"""
+    secret = current_app.config.get('PAYMENT_WEBHOOK_SECRET')
+    if not secret:
+        return False
+    expected = hmac.new(secret.encode(), payload, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature or '')
+
+def _rank(column):
+    return case(STATUS_RANK, value=column, else_=0)
+
+def _parse_update(gateway, data):
+    """Validated column values for an update; raises PaymentIngestError"""
+    transaction_id = str(data.get('transaction_id') or '').strip()
+    status = data.get('status')
+    if not gateway or not transaction_id:
+        raise PaymentIngestError('payment_gateway and transaction_id are required')
+    if status not in STATUS_RANK:
+        raise PaymentIngestError(f"status must be one of {', '.join(STATUS_RANK)}")
+    try:
+        amount = Decimal(str(data['amount']))
+    except (KeyError, InvalidOperation):
+        raise PaymentIngestError('amount is required')
+
+    paid_at = None
+    if data.get('paid_at'):
+        try:
+            paid_at = datetime.fromisoformat(str(data['paid_at']).replace('Z', '+00:00'))
+        except ValueError:
+            raise PaymentIngestError('paid_at must be an ISO 8601 timestamp')
+        # Stored as naive UTC; timestamps without an offset are taken to be UTC already
+        if paid_at.tzinfo is not None:
+            paid_at = paid_at.astimezone(timezone.utc).replace(tzinfo=None)
+    elif status == 'completed':
+        paid_at = datetime.utcnow()
+
+    return {
+        'payment_gateway': gateway[:50],
+        'transaction_id': transaction_id[:100],
+        'payment_status': status,
+        'amount': amount,
+        'currency': (data.get('currency') or 'USD').upper()[:3],
+        'payment_method': data.get('payment_method'),
+        'session_id': data.get('session_id'),
+        'user_id': data.get('user_id'),
+        'paid_at': paid_at,
+    }
+
+def _resolve_user(row):
+    """user_id is NOT NULL, so an insert needs one even when the row already exists"""
+    if row['user_id']:
+        return row['user_id']
+    if row['session_id']:
+        user_id = db.session.query(Patient.user_id).join(Session, Session.patient_id == Patient.id).filter(
+            Session.id == row['session_id']).scalar()
+        if user_id:
+            return user_id
+    user_id = db.session.query(Payment.user_id).filter_by(
+        payment_gateway=row['payment_gateway'], transaction_id=row['transaction_id']).scalar()
+    if user_id is None:
+        raise PaymentIngestError('user_id or session_id is required for a new payment')
+    return user_id
+
+def _upsert(row):
+    """One INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE on (payment_gateway, transaction_id)"""
+    now = datetime.utcnow()
+    existing = Payment.__table__.c
+
+    def assignments(new):
+        applies = _rank(existing.payment_status) <= _rank(new.payment_status)
+        # payment_status is read by `applies`, so it is assigned last
+        return {
+            'amount': case((applies, new.amount), else_=existing.amount),
+            'currency': case((applies, new.currency), else_=existing.currency),
+            'payment_method': func.coalesce(existing.payment_method, new.payment_method),
+            'session_id': func.coalesce(existing.session_id, new.session_id),
+            'paid_at': func.coalesce(existing.paid_at, new.paid_at),
+            'updated_at': case((applies, new.updated_at), else_=existing.updated_at),
+            'payment_status': case((applies, new.payment_status), else_=existing.payment_status),
+        }
+
+    try:
+        stmt = upsert(Payment, dict(row, created_at=now, updated_at=now),
+                      ['payment_gateway', 'transaction_id'], assignments)
+    except NotImplementedError as e:
+        raise PaymentIngestError(str(e))
+    db.session.execute(stmt)
+
+def ingest_payment_update(gateway, data):
+    """Apply one gateway update and commit; returns (payment_id or None, outcome)
+
+    outcome is 'applied', 'stale' (the payment is already in a later status) or
+    'duplicate' (answered from the recent-keys filter without a query).
+    """
+    row = _parse_update(gateway, data)
+    key = (row['payment_gateway'], row['transaction_id'])
+    rank = STATUS_RANK[row['payment_status']]
+
+    seen = _recent_keys.get(key)
+    if seen is not None and seen >= rank:
+        payment_events_total.inc(gateway=row['payment_gateway'], outcome='duplicate')
+        return None, 'duplicate'
+
+    row['user_id'] = _resolve_user(row)
+    try:
+        _upsert(row)
+        payment_id, status = db.session.query(Payment.id, Payment.payment_status).filter_by(
+            payment_gateway=row['payment_gateway'], transaction_id=row['transaction_id']).one()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    _recent_keys.set(key, STATUS_RANK.get(status, 0))
+    outcome = 'applied' if status == row['payment_status'] else 'stale'
+    payment_events_total.inc(gateway=row['payment_gateway'], outcome=outcome)
+    return payment_id, outcome
+
+def find_duplicates():
+    """(gateway, transaction_id, count) for keys stored more than once; must be empty before the unique index"""
+    return db.session.query(
+        Payment.payment_gateway, Payment.transaction_id, func.count(Payment.id)
+    ).filter(Payment.transaction_id.isnot(None)).group_by(
+        Payment.payment_gateway, Payment.transaction_id
+    ).having(func.count(Payment.id) > 1).all()
+
+def main():
+    """Report duplicate gateway transactions that would block the unique index migration"""
+    argparse.ArgumentParser(description='Check AyurSutra payments for duplicate gateway transactions').parse_args()
+
+    from app import create_app
+    app = create_app('cli')
+
+    with app.app_context():
+        duplicates = find_duplicates()
+        if not duplicates:
+            print("✅ No duplicate (payment_gateway, transaction_id) pairs")
+            return True
+        for gateway, transaction_id, count in duplicates:
+            print(f"⚠️ {gateway} {transaction_id}: {count} rows")
+        print(f"❌ {len(duplicates)} duplicate transactions; merge them before migrating")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,296 @@
+"""
+Practitioner search index for AyurSutra
+Keeps practitioners, rating aggregates and next free slots in memory so picker and
+type-ahead queries filter, sort and page without touching the database
+"""
+
+import bisect
+import copy
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session as OrmSession
+
+import calendars
+from calendars import BUSY_STATUSES, SLOT_MINUTES
+from database import db
+from models import Practitioner, User, UserType, Feedback, Session, WorkingHours, Holiday
+
+# Seconds before the index is rebuilt even without local changes; covers writes made
+# by other processes and keeps next-free-slot times from drifting into the past
+DEFAULT_TTL = 300
+
+HORIZON_DAYS = 14
+
+SORT_KEYS = ('rating', 'fee', 'experience', 'name', 'next_available')
+
+_STOP_WORDS = {'and', 'of', 'the', 'in', 'for'}
+
+def tokenize(text):
+    """Lowercase word tokens, e.g. 'Stress Management & Yoga' -> ['stress', 'management', 'yoga']"""
+    return [word for word in re.findall(r'[a-z0-9]+', (text or '').lower()) if word not in _STOP_WORDS]
+
+def next_free_slot(practitioner_id, busy, now, horizon_days=HORIZON_DAYS):
+    """Naive UTC start of the first free SLOT_MINUTES slot at or after `now` (naive UTC)
+
+    Walks the practitioner's compiled calendar (working hours, holidays, time zone) on the
+    same slot grid as calendars.available_slots. busy maps a local date to a list of
+    (start_minute, end_minute) bookings in local wall-clock minutes.
+    """
+    now_minutes = int((now - calendars._EPOCH).total_seconds()) // 60
+    # Local dates can lag the UTC date by a day, so start from yesterday
+    for offset in range(-1, horizon_days):
+        day = now.date() + timedelta(days=offset)
+        compiled_day = calendars.get_day(practitioner_id, day)
+        if compiled_day is None:
+            return None
+        booked = [(compiled_day.local_to_utc(start), compiled_day.local_to_utc(end)) for start, end in busy.get(day, ())]
+        for start, end in compiled_day.intervals:
+            slot = start
+            while slot + SLOT_MINUTES <= end:
+                if slot >= now_minutes and not any(b_start < slot + SLOT_MINUTES and slot < b_end
+                                                   for b_start, b_end in booked):
+                    return calendars.minutes_to_utc(slot)
+                slot += SLOT_MINUTES
+    return None
+
+def _format_slot(slot):
+    return slot.strftime('%Y-%m-%dT%H:%MZ') if slot else None
+
+def load_busy(now, practitioner_ids=None):
+    """Active bookings in the horizon as {practitioner_id: {local date: [(start, end), ...]}}"""
+    query = db.session.query(
+        Session.practitioner_id, Session.scheduled_date, Session.scheduled_time, Session.duration_minutes
+    ).filter(
+        Session.status.in_(BUSY_STATUSES),
+        Session.scheduled_date >= now.date() - timedelta(days=1),
+        Session.scheduled_date < now.date() + timedelta(days=HORIZON_DAYS)
+    )
+    if practitioner_ids is not None:
+        query = query.filter(Session.practitioner_id.in_(practitioner_ids))
+
+    busy = {}
+    for practitioner_id, day, start_time, duration in query:
+        start = start_time.hour * 60 + start_time.minute
+        busy.setdefault(practitioner_id, {}).setdefault(day, []).append((start, start + (duration or 0)))
+    return busy
+
+class _Snapshot:
+    """Immutable view of active practitioners and the lookup structures built over it"""
+
+    def __init__(self, records, now):
+        self.records = records
+        self.built_at = now
+        self.by_token = {}
+        self.terms = []
+        for practitioner_id, record in records.items():
+            for token in set(tokenize(record['specialization'])):
+                self.by_token.setdefault(token, set()).add(practitioner_id)
+            name = f"{record['user']['first_name']} {record['user']['last_name']}"
+            for term in set(tokenize(name) + tokenize(record['specialization'])):
+                self.terms.append((term, practitioner_id))
+        self.terms.sort()
+
+        self.by_fee = sorted((record['consultation_fee'] or 0, pid) for pid, record in records.items())
+        self.by_experience = sorted((record['experience_years'] or 0, pid) for pid, record in records.items())
+        self.by_rating = sorted(((record['rating'] or 0, record['rating_count']), pid) for pid, record in records.items())
+        self.by_name = sorted(((record['user']['last_name'].lower(), record['user']['first_name'].lower()), pid)
+                              for pid, record in records.items())
+        self._sort_next_available()
+
+    def _sort_next_available(self):
+        self.by_next_available = sorted((record['next_available'] or '9999', pid) for pid, record in self.records.items())
+
+    def with_next_available(self, slots):
+        """Copy of the snapshot with new next_available values for some practitioners"""
+        snapshot = copy.copy(self)
+        snapshot.records = dict(self.records)
+        for practitioner_id, slot in slots.items():
+            if practitioner_id in snapshot.records:
+                snapshot.records[practitioner_id] = dict(snapshot.records[practitioner_id], next_available=slot)
+        snapshot._sort_next_available()
+        return snapshot
+
+    def prefix_matches(self, prefix):
+        """Practitioner ids with a name or specialization word starting with prefix"""
+        matches = set()
+        index = bisect.bisect_left(self.terms, (prefix,))
+        while index < len(self.terms) and self.terms[index][0].startswith(prefix):
+            matches.add(self.terms[index][1])
+            index += 1
+        return matches
+
+    @staticmethod
+    def _range(sorted_pairs, low, high):
+        start = bisect.bisect_left(sorted_pairs, (low,)) if low is not None else 0
+        end = bisect.bisect_right(sorted_pairs, (high, float('inf'))) if high is not None else len(sorted_pairs)
+        return {pid for _, pid in sorted_pairs[start:end]}
+
+    def query(self, specialization=None, q=None, available=None, min_fee=None, max_fee=None,
+              min_experience=None, min_rating=None, sort='rating', descending=None, limit=None, offset=0):
+        """Filter, sort and page practitioners; returns (total, records)"""
+        candidates = set(self.records)
+
+        if specialization:
+            for token in tokenize(specialization):
+                candidates &= self.by_token.get(token, set())
+        if q:
+            for term in tokenize(q):
+                candidates &= self.prefix_matches(term)
+        if available is not None:
+            candidates = {pid for pid in candidates if self.records[pid]['is_available'] == available}
+        if min_fee is not None or max_fee is not None:
+            candidates &= self._range(self.by_fee, min_fee, max_fee)
+        if min_experience is not None:
+            candidates &= self._range(self.by_experience, min_experience, None)
+        if min_rating is not None:
+            candidates = {pid for pid in candidates if (self.records[pid]['rating'] or 0) >= min_rating}
+
+        if sort not in SORT_KEYS:
+            raise ValueError(f"Unknown sort '{sort}', use one of {', '.join(SORT_KEYS)}")
+        ordered = {
+            'rating': self.by_rating, 'fee': self.by_fee, 'experience': self.by_experience,
+            'name': self.by_name, 'next_available': self.by_next_available,
+        }[sort]
+        if descending is None:
+            descending = sort in ('rating', 'experience')
+        if descending:
+            ordered = reversed(ordered)
+
+        matched = [pid for _, pid in ordered if pid in candidates]
+        page = matched[offset:offset + limit] if limit is not None else matched[offset:]
+        return len(matched), [self.records[pid] for pid in page]
+
+def build_snapshot(now=None):
+    """Load practitioners with three queries and precompute everything the API sorts on"""
+    now = now or datetime.utcnow()
+
+    rows = db.session.query(Practitioner, User.first_name, User.last_name).join(
+        User, Practitioner.user_id == User.id
+    ).filter(User.is_active == True).all()
+
+    ratings = dict(
+        (practitioner_id, (float(average), count)) for practitioner_id, average, count in
+        db.session.query(Feedback.practitioner_id, func.avg(Feedback.rating), func.count(Feedback.id))
+        .filter(Feedback.practitioner_id.isnot(None))
+        .group_by(Feedback.practitioner_id)
+    )
+
+    busy = load_busy(now)
+
+    records = {}
+    for practitioner, first_name, last_name in rows:
+        record = practitioner.to_dict()
+        average, count = ratings.get(practitioner.id, (None, 0))
+        slot = next_free_slot(practitioner.id, busy.get(practitioner.id, {}), now) if practitioner.is_available else None
+        record.update({
+            'user': {'first_name': first_name, 'last_name': last_name},
+            'rating': round(average, 2) if average is not None else None,
+            'rating_count': count,
+            'next_available': _format_slot(slot),
+        })
+        records[practitioner.id] = record
+
+    return _Snapshot(records, now)
+
+class PractitionerIndex:
+    """Process-wide snapshot, rebuilt lazily after local commits that touch practitioners or once it expires
+
+    Booking changes only recompute next_available for the practitioners they involve.
+    """
+
+    def __init__(self):
+        self._snapshot = None
+        self._dirty = True
+        self._stale = set()
+        self._built_monotonic = 0.0
+        self._lock = threading.Lock()
+        # Separate from _lock so commits never wait for a rebuild
+        self._stale_lock = threading.Lock()
+        self.rebuilds = 0
+        self.refreshes = 0
+
+    def invalidate(self):
+        self._dirty = True
+
+    def touch(self, practitioner_ids):
+        """Recompute next_available for these practitioners on the next read"""
+        with self._stale_lock:
+            self._stale.update(practitioner_ids)
+
+    def _refresh(self, practitioner_ids):
+        now = datetime.utcnow()
+        busy = load_busy(now, practitioner_ids)
+        records = self._snapshot.records
+        slots = {}
+        for practitioner_id in practitioner_ids:
+            record = records.get(practitioner_id)
+            if record is not None:
+                slot = next_free_slot(practitioner_id, busy.get(practitioner_id, {}), now) \
+                    if record['is_available'] else None
+                slots[practitioner_id] = _format_slot(slot)
+        self._snapshot = self._snapshot.with_next_available(slots)
+        self.refreshes += 1
+
+    def get(self):
+        ttl = current_app.config.get('PRACTITIONER_INDEX_TTL', DEFAULT_TTL)
+        if not self._dirty and not self._stale and self._snapshot is not None \
+                and time.monotonic() - self._built_monotonic < ttl:
+            return self._snapshot
+
+        with self._lock:
+            if self._dirty or self._snapshot is None or time.monotonic() - self._built_monotonic >= ttl:
+                # Clear the flags first so a commit landing mid-build triggers another rebuild
+                self._dirty = False
+                with self._stale_lock:
+                    self._stale.clear()
+                self._snapshot = build_snapshot()
+                self._built_monotonic = time.monotonic()
+                self.rebuilds += 1
+            elif self._stale:
+                with self._stale_lock:
+                    stale, self._stale = self._stale, set()
+                self._refresh(stale)
+            return self._snapshot
+
+    def query(self, **filters):
+        return self.get().query(**filters)
+
+practitioner_index = PractitionerIndex()
+
+# Rebuild after commits that change practitioners, ratings or calendars; bookings only
+# refresh the practitioners they involve
+
+def _touches_index(obj):
+    if isinstance(obj, (Practitioner, Feedback, WorkingHours, Holiday)):
+        return True
+    return isinstance(obj, User) and obj.user_type == UserType.PRACTITIONER
+
+@event.listens_for(OrmSession, 'after_flush')
+def _mark_changes(session, flush_context):
+    touched = session.info.setdefault('_practitioner_index_touched', set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Session):
+            # A reassigned booking frees the old practitioner as well
+            touched.add(obj.practitioner_id)
+            touched.update(inspect(obj).attrs.practitioner_id.history.deleted)
+        elif _touches_index(obj):
+            session.info['_practitioner_index_dirty'] = True
+
+@event.listens_for(OrmSession, 'after_commit')
+def _invalidate_on_commit(session):
+    if session.info.pop('_practitioner_index_dirty', False):
+        practitioner_index.invalidate()
+    touched = session.info.pop('_practitioner_index_touched', None)
+    if touched:
+        practitioner_index.touch(practitioner_id for practitioner_id in touched if practitioner_id is not None)
+
+@event.listens_for(OrmSession, 'after_soft_rollback')
+def _discard_on_rollback(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('_practitioner_index_dirty', None)
+        session.info.pop('_practitioner_index_touched', None)
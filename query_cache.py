@@ -0,0 +1,262 @@
+"""
+Query result cache for AyurSutra
+Every cached result records the version of each table it read. Committed writes bump the
+versions of the tables they touched (ORM flushes and INSERT/UPDATE/DELETE statements run through
+the session), so a stale entry is found by comparing a few integers instead of waiting out a TTL.
+Entries live in a size-bounded LRU; versions are per process, or shared through Redis
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from sqlalchemy import Table, event, inspect
+from sqlalchemy.orm import Session as OrmSession
+from sqlalchemy.sql import visitors
+
+from database import db
+from metrics import register_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAXSIZE = 2048
+
+# Results of QueryCache.execute() with more rows than this are returned but not kept
+MAX_CACHED_ROWS = 10000
+
+_PENDING = '_query_cache_tables'
+
+_SNAPSHOT = '_query_cache_snapshot'
+
+# Pseudo-table bumped with every committed write, whatever it touched
+WRITES = '*'
+
+# Isolation levels where a transaction keeps reading the snapshot taken by its first query
+SNAPSHOT_ISOLATION = ('REPEATABLE READ', 'SERIALIZABLE')
+
+class MemoryVersions:
+    """Table versions for this process only; other workers' writes are not seen"""
+
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, tables):
+        versions = self._versions
+        return tuple(versions.get(table, 0) for table in tables)
+
+    def bump(self, tables):
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+class RedisVersions:
+    """Table versions shared by every worker through Redis (needs the optional `redis` package)"""
+
+    def __init__(self, url, prefix='tablever:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('QUERY_CACHE_VERSIONS points at Redis but the redis package is not installed')
+        self._client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get_many(self, tables):
+        return tuple(int(value or 0) for value in self._client.mget([self.prefix + table for table in tables]))
+
+    def bump(self, tables):
+        pipeline = self._client.pipeline(transaction=False)
+        for table in tables:
+            pipeline.incr(self.prefix + table)
+        pipeline.execute()
+
+def versions_from_config(config):
+    storage = config.get('QUERY_CACHE_VERSIONS') or 'memory'
+    if storage == 'memory':
+        return MemoryVersions()
+    if storage.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisVersions(storage)
+    raise ValueError(f"Unknown QUERY_CACHE_VERSIONS '{storage}'")
+
+def tables_in(stmt):
+    """Names of the tables a SELECT reads, including subqueries and joins"""
+    return {element.name for element in visitors.iterate(stmt) if isinstance(element, Table)}
+
+def _freeze(value):
+    if isinstance(value, (list, set)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+def _pending_tables(session):
+    """Tables the session has written to (or is about to flush) in its open transaction"""
+    pending = set(session.info.get(_PENDING, ()))
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        pending.update(table.name for table in inspect(obj).mapper.tables)
+    return pending
+
+class QueryCache:
+    """LRU of results tagged with the versions of the tables they were read from
+
+    Cached values are shared between requests and threads: return plain data (dicts, lists,
+    tuples) from loaders, not ORM objects, and don't mutate what comes back.
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.enabled = True
+        self.max_age = 0
+        self.versions = MemoryVersions()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        app.config.setdefault('QUERY_CACHE_ENABLED', True)
+        self.enabled = app.config['QUERY_CACHE_ENABLED']
+        self.maxsize = app.config.get('QUERY_CACHE_SIZE', DEFAULT_MAXSIZE)
+        self.versions = versions_from_config(app.config)
+        # Without shared versions, writes in other processes are only picked up after max_age
+        self.max_age = app.config.get('QUERY_CACHE_MAX_AGE', 0)
+        app.extensions['query_cache'] = self
+
+    def get_or_load(self, key, tables, loader, cacheable=None):
+        """Cached result for key if none of `tables` changed since it was stored, else loader()
+
+        cacheable(value) may veto storing a freshly loaded value.
+        """
+        if not self.enabled:
+            return loader()
+        tables = tuple(sorted(tables))
+        # The caller's own uncommitted writes must be visible to it and to nobody else
+        if _pending_tables(db.session).intersection(tables):
+            return loader()
+
+        # Versions are read before loading, so a write committed mid-load leaves the entry stale
+        try:
+            writes, *stamp = self.versions.get_many((WRITES,) + tables)
+            stamp = tuple(stamp)
+        except Exception:
+            # A version store outage skips the cache rather than failing the request
+            logger.exception('Query cache versions unavailable; reading through')
+            return loader()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == tables and entry[1] == stamp and \
+                    (not self.max_age or now - entry[2] < self.max_age):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[3]
+            self.misses += 1
+
+        value = loader()
+        # A transaction reading under snapshot isolation sees the data as of its start: if
+        # anything was committed since, the rows loaded may be older than the stamp
+        began_at = db.session.info.get(_SNAPSHOT, writes)
+        if began_at != writes or (cacheable is not None and not cacheable(value)):
+            return value
+        with self._lock:
+            self._entries[key] = (tables, stamp, now, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def execute(self, stmt, tables=None):
+        """Run a column SELECT through the cache; returns a list of row tuples
+
+        The tables read are found in the statement itself. Statements selecting whole ORM
+        entities are refused, since instances can't be shared between sessions.
+        """
+        for description in stmt.column_descriptions:
+            if isinstance(description.get('expr'), type):
+                raise ValueError('QueryCache.execute() caches column selects, not ORM entities')
+        compiled = stmt.compile(dialect=db.session.get_bind().dialect)
+        key = ('sql', str(compiled), _freeze(compiled.params))
+
+        return self.get_or_load(key, tables or tables_in(stmt),
+                                lambda: [tuple(row) for row in db.session.execute(stmt)],
+                                cacheable=lambda rows: len(rows) <= MAX_CACHED_ROWS)
+
+    def write_count(self):
+        """Committed writes so far (per process, or shared through Redis); None if unavailable"""
+        try:
+            return self.versions.get_many((WRITES,))[0]
+        except Exception:
+            logger.exception('Query cache versions unavailable')
+            return None
+
+    def bump(self, tables):
+        try:
+            self.versions.bump(sorted(tables) + [WRITES])
+        except Exception:
+            logger.exception('Could not bump query cache versions for %s', ', '.join(sorted(tables)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+query_cache = QueryCache()
+register_cache('query_results', query_cache)
+
+def cached_query(*tables):
+    """Cache a function's result until one of `tables` changes; arguments must be hashable"""
+    def decorator(fn):
+        name = f'{fn.__module__}.{fn.__qualname__}'
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (name, args, tuple(sorted(kwargs.items())))
+            return query_cache.get_or_load(key, tables, lambda: fn(*args, **kwargs))
+        wrapper.uncached = fn
+        return wrapper
+    return decorator
+
+# Table versions are bumped only once the transaction that wrote them commits
+
+@event.listens_for(OrmSession, 'after_flush')
+def _mark_flushed(session, flush_context):
+    tables = session.info.setdefault(_PENDING, set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        tables.update(table.name for table in inspect(obj).mapper.tables)
+
+@event.listens_for(OrmSession, 'do_orm_execute')
+def _mark_statement(orm_execute_state):
+    # Bulk update()/delete()/insert() and upserts bypass the flush
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if table is not None and getattr(table, 'name', None):
+            orm_execute_state.session.info.setdefault(_PENDING, set()).add(table.name)
+
+@event.listens_for(OrmSession, 'after_commit')
+def _bump_on_commit(session):
+    tables = session.info.pop(_PENDING, None)
+    if tables:
+        query_cache.bump(tables)
+
+@event.listens_for(OrmSession, 'after_soft_rollback')
+def _discard_on_rollback(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop(_PENDING, None)
+
+@event.listens_for(OrmSession, 'after_begin')
+def _mark_snapshot(session, transaction, connection):
+    # Write count when the transaction's snapshot starts, compared before storing a result
+    if not query_cache.enabled:
+        return
+    level = connection.get_execution_options().get('isolation_level') or connection.default_isolation_level
+    if (level or '').upper() in SNAPSHOT_ISOLATION:
+        session.info[_SNAPSHOT] = query_cache.write_count()
+
+@event.listens_for(OrmSession, 'after_transaction_end')
+def _end_snapshot(session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_SNAPSHOT, None)
@@ -0,0 +1,211 @@
+"""
+Rate limiting for AyurSutra
+Token buckets per (policy, client) checked before each request. Policies are matched by method
+and URL prefix with one dict lookup per path segment; bucket state lives in a sharded in-process
+store by default, or in Redis when several workers must share limits
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from flask import g, jsonify, request
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+rate_limited_total = registry.counter(
+    'ayursutra_rate_limited_total', 'Requests rejected by rate limiting', ('policy',))
+
+class RateLimitPolicy:
+    """`limit` requests per `period` seconds with bursts up to `burst`, counted per client"""
+
+    __slots__ = ('name', 'limit', 'period', 'burst', 'key', 'rate')
+
+    KEYS = ('ip', 'user')
+
+    def __init__(self, name, limit, period, burst=None, key='ip'):
+        if key not in self.KEYS:
+            raise ValueError(f"Rate limit key must be one of {', '.join(self.KEYS)}")
+        self.name = name
+        self.limit = limit
+        self.period = period
+        self.burst = burst or limit
+        self.key = key
+        self.rate = limit / period  # tokens per second
+
+class MemoryStore:
+    """Token buckets in a sharded dict; each shard has its own lock and LRU bound
+
+    Limits are per process: with N workers a client gets up to N times the limit.
+    """
+
+    def __init__(self, shards=64, max_keys_per_shard=10000):
+        self._shards = [(threading.Lock(), OrderedDict()) for _ in range(shards)]
+        self.max_keys_per_shard = max_keys_per_shard
+
+    def take(self, key, rate, burst, now=None):
+        """Spend one token; returns (allowed, tokens_left, seconds_until_next_token)"""
+        now = time.monotonic() if now is None else now
+        lock, buckets = self._shards[hash(key) % len(self._shards)]
+        with lock:
+            bucket = buckets.get(key)
+            if bucket is None:
+                tokens = burst
+            else:
+                tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                buckets.move_to_end(key)
+
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            buckets[key] = (tokens, now)
+            # Evicted buckets start full again, which only ever errs on the lenient side
+            if len(buckets) > self.max_keys_per_shard:
+                buckets.popitem(last=False)
+        return allowed, tokens, 0 if allowed else (1 - tokens) / rate
+
+    def clear(self):
+        for lock, buckets in self._shards:
+            with lock:
+                buckets.clear()
+
+# Refill and take atomically on the Redis server; state is {tokens, timestamp} per key
+_REDIS_TAKE = """
+local rate, burst, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 't', 'ts')
+local tokens = tonumber(state[1]) or burst
+if state[2] then tokens = math.min(burst, tokens + (now - tonumber(state[2])) * rate) end
+local allowed = 0
+if tokens >= 1 then tokens = tokens - 1; allowed = 1 end
+redis.call('HSET', KEYS[1], 't', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+class RedisStore:
+    """Token buckets shared by every worker through Redis (needs the optional `redis` package)"""
+
+    def __init__(self, url, prefix='ratelimit:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('RATE_LIMIT_STORAGE points at Redis but the redis package is not installed')
+        self._client = redis.Redis.from_url(url)
+        self._take = self._client.register_script(_REDIS_TAKE)
+        self.prefix = prefix
+
+    def take(self, key, rate, burst, now=None):
+        allowed, tokens = self._take(keys=[self.prefix + key], args=[rate, burst, now or time.time()])
+        tokens = float(tokens)
+        return bool(allowed), tokens, 0 if allowed else (1 - tokens) / rate
+
+def store_from_config(config):
+    storage = config.get('RATE_LIMIT_STORAGE') or 'memory'
+    if storage == 'memory':
+        return MemoryStore(shards=config.get('RATE_LIMIT_SHARDS', 64))
+    if storage.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisStore(storage)
+    raise ValueError(f"Unknown RATE_LIMIT_STORAGE '{storage}'")
+
+class RateLimiter:
+    """Flask extension applying RateLimitPolicy objects by method and URL prefix"""
+
+    def __init__(self, app=None, rules=(), store=None):
+        self.rules = {}
+        self.store = store
+        if app is not None:
+            self.init_app(app, rules)
+
+    def init_app(self, app, rules=()):
+        app.config.setdefault('RATE_LIMIT_ENABLED', True)
+        app.config.setdefault('RATE_LIMIT_TRUST_PROXY', False)
+        if not app.config['RATE_LIMIT_ENABLED']:
+            return
+
+        for methods, prefix, policy in rules:
+            self.add_rule(methods, prefix, policy)
+        if self.store is None:
+            self.store = store_from_config(app.config)
+        self.trust_proxy = app.config['RATE_LIMIT_TRUST_PROXY']
+
+        app.extensions['rate_limiter'] = self
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def add_rule(self, methods, prefix, policy):
+        """Apply policy to requests with one of `methods` ('*' for any) at or under prefix
+
+        A policy of None exempts the prefix from broader rules.
+        """
+        for method in ([methods] if isinstance(methods, str) else methods):
+            self.rules[(method.upper(), prefix.rstrip('/') or '/')] = policy
+
+    def match(self, method, path):
+        """Most specific policy for a request: O(path depth) dict lookups"""
+        rules = self.rules
+        if not rules:
+            return None
+        candidate = path.rstrip('/') or '/'
+        while True:
+            for key in ((method, candidate), ('*', candidate)):
+                if key in rules:
+                    return rules[key]
+            if candidate == '/':
+                return None
+            candidate = candidate.rsplit('/', 1)[0] or '/'
+
+    def client_ip(self):
+        if self.trust_proxy and request.access_route:
+            # The right-most X-Forwarded-For entry is the one our proxy appended (as ProxyFix x_for=1);
+            # anything left of it was sent by the client and can be forged
+            return request.access_route[-1]
+        return request.remote_addr or 'unknown'
+
+    def client_key(self, policy):
+        if policy.key == 'user':
+            try:
+                verify_jwt_in_request(optional=True)
+                user = get_jwt().get('sub')
+            except Exception:
+                user = None
+            if user:
+                return f'{policy.name}:u:{user}'
+        return f'{policy.name}:ip:{self.client_ip()}'
+
+    def _before_request(self):
+        if request.method == 'OPTIONS':
+            return None
+        policy = self.match(request.method, request.path)
+        if policy is None:
+            return None
+
+        try:
+            allowed, remaining, retry_after = self.store.take(self.client_key(policy), policy.rate, policy.burst)
+        except Exception:
+            # A shared store outage must not take the API down with it
+            logger.exception('Rate limit store failed; allowing request')
+            return None
+
+        g._rate_limit = (policy, remaining)
+        if allowed:
+            return None
+
+        rate_limited_total.inc(policy=policy.name)
+        response = jsonify({'success': False, 'message': 'Too many requests, please slow down and try again shortly'})
+        response.status_code = 429
+        response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+        return response
+
+    def _after_request(self, response):
+        state = g.pop('_rate_limit', None)
+        if state is not None:
+            policy, remaining = state
+            response.headers['X-RateLimit-Limit'] = str(policy.limit)
+            response.headers['X-RateLimit-Remaining'] = str(max(0, int(remaining)))
+        return response
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Payment reconciliation and revenue reporting for AyurSutra
+Folds new and changed payments into daily revenue facts (practitioner, treatment, program,
+currency, status), flags payments that don't match list prices, and serves reports from the facts
+"""
+
+import argparse
+import sys
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from sqlalchemy import and_, event, func, inspect, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session as OrmSession
+
+from database import db
+from models import (
+    Payment, Session, SessionStatus, TreatmentType, TreatmentProgram, Practitioner, User,
+    RevenueFact, PaymentDiscrepancy, ReconciliationRun
+)
+from jobs import job
+from query_cache import cached_query
+
+DEFAULT_CURRENCY = 'USD'
+
+CENT = Decimal('0.01')
+
+# Payments more than this far from the list price are flagged
+TOLERANCE = Decimal('0.01')
+
+# Changed payments are re-read with this much overlap, so rows committed while the previous
+# run was reading are not missed; rebuilding a day is idempotent
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+# Days rebuilt per commit
+COMMIT_EVERY_DAYS = 31
+
+# A run still marked running after this long is assumed to have died
+STALE_RUN_AFTER = timedelta(hours=1)
+
+# Unique lock_key of the run in progress
+RUN_LOCK = 'running'
+
+# Columns facts and discrepancies are derived from, besides the payment's own
+SESSION_COLUMNS = ('status', 'practitioner_id', 'treatment_id', 'program_id')
+TREATMENT_COLUMNS = ('price',)
+PROGRAM_COLUMNS = ('total_price', 'total_sessions')
+
+REPORT_GROUPS = {
+    'day': RevenueFact.fact_date,
+    'practitioner': RevenueFact.practitioner_id,
+    'treatment': RevenueFact.treatment_id,
+    'program': RevenueFact.program_id,
+}
+
+class ReconciliationError(ValueError):
+    """Raised for invalid report parameters or when a run is already in progress"""
+
+def _fact_day(paid_at, created_at):
+    return (paid_at or created_at).date()
+
+def _day_filter(day):
+    """Payments whose fact date is `day`; written as two ranges so paid_at/created_at indexes apply"""
+    start = datetime.combine(day, time.min)
+    end = start + timedelta(days=1)
+    return or_(
+        and_(Payment.paid_at >= start, Payment.paid_at < end),
+        and_(Payment.paid_at.is_(None), Payment.created_at >= start, Payment.created_at < end)
+    )
+
+def expected_amount(treatment_price, program_price, program_sessions):
+    """List price of one session: its program's per-session share, else the treatment price"""
+    if program_price is not None and program_sessions:
+        return (Decimal(program_price) / program_sessions).quantize(CENT)
+    return Decimal(treatment_price) if treatment_price is not None else None
+
+def _check_payment(amount, status, session_status, expected):
+    """Discrepancy reason for a completed payment, or None"""
+    if status != 'completed':
+        return None
+    if session_status == SessionStatus.CANCELLED:
+        return 'paid_for_cancelled_session'
+    if expected is not None and abs(amount - expected) > TOLERANCE:
+        return 'amount_mismatch'
+    return None
+
+def rebuild_day(day):
+    """Recompute one day's facts and discrepancies from its payments; returns the discrepancy count"""
+    rows = db.session.query(
+        Payment.id, Payment.amount, Payment.currency, Payment.payment_status,
+        Session.practitioner_id, Session.treatment_id, Session.program_id, Session.status,
+        TreatmentType.price, TreatmentProgram.total_price, TreatmentProgram.total_sessions
+    ).outerjoin(Session, Session.id == Payment.session_id).outerjoin(
+        TreatmentType, TreatmentType.id == Session.treatment_id
+    ).outerjoin(
+        TreatmentProgram, TreatmentProgram.id == Session.program_id
+    ).filter(_day_filter(day))
+
+    facts, flagged, counted = {}, {}, []
+    for (payment_id, amount, currency, status, practitioner_id, treatment_id, program_id,
+         session_status, treatment_price, program_price, program_sessions) in rows:
+        counted.append(payment_id)
+        amount = Decimal(amount)
+        status = status or 'pending'
+        expected = expected_amount(treatment_price, program_price, program_sessions)
+        key = (practitioner_id, treatment_id, program_id, currency or DEFAULT_CURRENCY, status)
+        fact = facts.get(key)
+        if fact is None:
+            fact = facts[key] = RevenueFact(
+                fact_date=day, practitioner_id=practitioner_id, treatment_id=treatment_id,
+                program_id=program_id, currency=key[3], payment_status=status,
+                payment_count=0, amount_total=Decimal(0), expected_total=Decimal(0), discrepancy_count=0
+            )
+        fact.payment_count += 1
+        fact.amount_total += amount
+        fact.expected_total += expected or Decimal(0)
+
+        reason = _check_payment(amount, status, session_status, expected)
+        if reason:
+            fact.discrepancy_count += 1
+            flagged[payment_id] = (reason, amount, expected)
+
+    RevenueFact.query.filter_by(fact_date=day).delete(synchronize_session=False)
+    db.session.add_all(facts.values())
+
+    # Remember the day each payment was counted on, so the next run also rebuilds it if paid_at
+    # moves; updated_at is kept so this doesn't make the payments look changed
+    if counted:
+        db.session.execute(update(Payment).where(
+            Payment.id.in_(counted), or_(Payment.fact_date.is_(None), Payment.fact_date != day)
+        ).values(fact_date=day, updated_at=Payment.updated_at).execution_options(synchronize_session=False))
+
+    # Keep existing discrepancy rows (and their resolution) while the problem is unchanged
+    existing = PaymentDiscrepancy.query.filter(or_(
+        PaymentDiscrepancy.fact_date == day,
+        PaymentDiscrepancy.payment_id.in_(list(flagged))
+    )).all()
+    for discrepancy in existing:
+        found = flagged.pop(discrepancy.payment_id, None)
+        if found is None:
+            if discrepancy.fact_date == day:
+                db.session.delete(discrepancy)
+            continue
+        reason, amount, expected = found
+        if (discrepancy.reason, discrepancy.amount, discrepancy.expected_amount) != (reason, amount, expected):
+            discrepancy.reason, discrepancy.amount, discrepancy.expected_amount = reason, amount, expected
+            discrepancy.status, discrepancy.resolved_by, discrepancy.resolved_at = 'open', None, None
+        discrepancy.fact_date = day
+    for payment_id, (reason, amount, expected) in flagged.items():
+        db.session.add(PaymentDiscrepancy(
+            payment_id=payment_id, fact_date=day, reason=reason, amount=amount, expected_amount=expected
+        ))
+    return sum(fact.discrepancy_count for fact in facts.values())
+
+def last_watermark():
+    return db.session.query(func.max(ReconciliationRun.watermark)).filter(
+        ReconciliationRun.status == 'succeeded'
+    ).scalar()
+
+def _claim_run(full, now):
+    """Insert a run holding the unique RUN_LOCK key; a run holding it past STALE_RUN_AFTER is failed first"""
+    db.session.execute(update(ReconciliationRun).where(
+        ReconciliationRun.lock_key == RUN_LOCK,
+        ReconciliationRun.started_at <= now - STALE_RUN_AFTER
+    ).values(status='failed', lock_key=None, finished_at=now))
+
+    run = ReconciliationRun(full=full, started_at=now, lock_key=RUN_LOCK)
+    try:
+        with db.session.begin_nested():
+            db.session.add(run)
+    except IntegrityError:
+        db.session.rollback()
+        running = ReconciliationRun.query.filter_by(lock_key=RUN_LOCK).first()
+        raise ReconciliationError(f'Reconciliation run {running.id if running else ""} is already in progress')
+    db.session.commit()
+    return run
+
+def reconcile(full=False, now=None):
+    """Rebuild the facts of every day touched by payments changed since the last successful run
+
+    A payment counts toward its paid_at day (created_at while unpaid). For a changed payment
+    that day, its created_at day and the day it was last counted on are rebuilt. Session,
+    treatment and program changes mark their payments changed (see _touch_payments).
+    Commits in batches of days and returns the ReconciliationRun.
+    """
+    now = now or datetime.utcnow()
+    since = None if full else last_watermark()
+    run = _claim_run(since is None, now)
+
+    try:
+        query = db.session.query(Payment.paid_at, Payment.created_at, Payment.fact_date)
+        if since is not None:
+            query = query.filter(func.coalesce(Payment.updated_at, Payment.created_at) > since - WATERMARK_OVERLAP)
+
+        days, changed = set(), 0
+        for paid_at, created_at, fact_date in query.yield_per(5000):
+            changed += 1
+            days.add(_fact_day(paid_at, created_at))
+            days.add(created_at.date())
+            if fact_date:
+                days.add(fact_date)
+
+        if run.full:
+            # Days that no longer have any payments
+            RevenueFact.query.filter(RevenueFact.fact_date.notin_(days)).delete(synchronize_session=False)
+            PaymentDiscrepancy.query.filter(PaymentDiscrepancy.fact_date.notin_(days)).delete(
+                synchronize_session=False)
+
+        discrepancies = 0
+        for index, day in enumerate(sorted(days), 1):
+            discrepancies += rebuild_day(day)
+            if index % COMMIT_EVERY_DAYS == 0:
+                db.session.commit()
+
+        run.status = 'succeeded'
+        run.lock_key = None
+        run.watermark = now
+        run.payments_changed = changed
+        run.days_rebuilt = len(days)
+        run.discrepancies = discrepancies
+        run.finished_at = datetime.utcnow()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        run.status = 'failed'
+        run.lock_key = None
+        run.finished_at = datetime.utcnow()
+        db.session.commit()
+        raise
+    return run
+
+# Facts also depend on sessions, treatment prices and program prices; when those change, the
+# payments involved get a new updated_at so the next incremental run rebuilds their days
+
+def _changed(obj, columns):
+    state = inspect(obj)
+    return any(state.attrs[column].history.has_changes() for column in columns)
+
+@event.listens_for(OrmSession, 'after_flush')
+def _touch_payments(session, flush_context):
+    session_ids, treatment_ids, program_ids = set(), set(), set()
+    for obj in session.dirty:
+        if isinstance(obj, Session) and _changed(obj, SESSION_COLUMNS):
+            session_ids.add(obj.id)
+        elif isinstance(obj, TreatmentType) and _changed(obj, TREATMENT_COLUMNS):
+            treatment_ids.add(obj.id)
+        elif isinstance(obj, TreatmentProgram) and _changed(obj, PROGRAM_COLUMNS):
+            program_ids.add(obj.id)
+
+    conditions = []
+    if session_ids:
+        conditions.append(Payment.session_id.in_(session_ids))
+    if treatment_ids:
+        conditions.append(Payment.session_id.in_(select(Session.id).where(Session.treatment_id.in_(treatment_ids))))
+    if program_ids:
+        conditions.append(Payment.session_id.in_(select(Session.id).where(Session.program_id.in_(program_ids))))
+    if conditions:
+        session.execute(update(Payment).where(or_(*conditions)).values(updated_at=datetime.utcnow())
+                        .execution_options(synchronize_session=False))
+
+def _labels(group_by, keys):
+    """Display names for report group keys"""
+    keys = [key for key in keys if key is not None]
+    if not keys:
+        return {}
+    if group_by == 'treatment':
+        rows = db.session.query(TreatmentType.id, TreatmentType.name).filter(TreatmentType.id.in_(keys))
+    elif group_by == 'program':
+        rows = db.session.query(TreatmentProgram.id, TreatmentProgram.name).filter(TreatmentProgram.id.in_(keys))
+    elif group_by == 'practitioner':
+        rows = db.session.query(Practitioner.id, User.first_name + ' ' + User.last_name).join(
+            User, User.id == Practitioner.user_id).filter(Practitioner.id.in_(keys))
+    else:
+        return {}
+    return dict(rows.all())
+
+@cached_query('revenue_facts', 'reconciliation_runs', 'treatment_types', 'treatment_programs',
+              'practitioners', 'users')
+def revenue_report(start_date, end_date, group_by='day', payment_status='completed',
+                   currency=None, practitioner_id=None):
+    """Totals from the fact table between two dates (inclusive), grouped and split by currency"""
+    column = REPORT_GROUPS.get(group_by)
+    if column is None:
+        raise ReconciliationError(f"group_by must be one of {', '.join(REPORT_GROUPS)}")
+    if end_date < start_date:
+        raise ReconciliationError('end_date must not be before start_date')
+
+    query = db.session.query(
+        column, RevenueFact.currency,
+        func.sum(RevenueFact.payment_count), func.sum(RevenueFact.amount_total),
+        func.sum(RevenueFact.expected_total), func.sum(RevenueFact.discrepancy_count)
+    ).filter(RevenueFact.fact_date.between(start_date, end_date))
+    if payment_status:
+        query = query.filter(RevenueFact.payment_status == payment_status)
+    if currency:
+        query = query.filter(RevenueFact.currency == currency)
+    if practitioner_id:
+        query = query.filter(RevenueFact.practitioner_id == practitioner_id)
+    rows = query.group_by(column, RevenueFact.currency).order_by(column, RevenueFact.currency).all()
+
+    labels = _labels(group_by, {row[0] for row in rows})
+    groups = []
+    for key, row_currency, count, amount, expected, discrepancies in rows:
+        groups.append({
+            'key': key.isoformat() if isinstance(key, date) else key,
+            'label': labels.get(key),
+            'currency': row_currency,
+            'payment_count': int(count or 0),
+            'amount_total': float(amount or 0),
+            'expected_total': float(expected or 0),
+            'discrepancy_count': int(discrepancies or 0)
+        })
+
+    last_run = ReconciliationRun.query.filter_by(status='succeeded').order_by(
+        ReconciliationRun.finished_at.desc()).first()
+    return {
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'group_by': group_by,
+        'payment_status': payment_status,
+        'groups': groups,
+        'as_of': last_run.watermark.isoformat() if last_run else None
+    }
+
+@job('revenue.reconcile', max_attempts=3, priority=-5)
+def reconcile_job(full=False):
+    try:
+        run = reconcile(full=full)
+    except ReconciliationError as e:
+        return {'skipped': str(e)}
+    return run.to_dict()
+
+def main():
+    """Run reconciliation from the command line (e.g. nightly from cron)"""
+    parser = argparse.ArgumentParser(description='Reconcile AyurSutra payments into revenue facts')
+    parser.add_argument('--full', action='store_true', help='Rebuild every day instead of changed days only')
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app('cli')
+
+    try:
+        with app.app_context():
+            run = reconcile(full=args.full)
+            print(f"✅ Rebuilt {run.days_rebuilt} days from {run.payments_changed} payments")
+            if run.discrepancies:
+                print(f"⚠️ {run.discrepancies} payments don't match list prices")
+        return True
+    except Exception as e:
+        print(f"❌ Reconciliation failed: {e}")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
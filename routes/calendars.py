@@ -0,0 +1,119 @@
+from datetime import datetime
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+import pytz
+from database import db
+from identity import current_identity, role_required
+from models import Practitioner, WorkingHours, Holiday
+import calendars
+
+calendars_bp = Blueprint('calendars', __name__)
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value or '', '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+def _parse_time(value):
+    try:
+        return datetime.strptime(value or '', '%H:%M').time()
+    except ValueError:
+        return None
+
+@calendars_bp.route('/<int:practitioner_id>/slots', methods=['GET'])
+def get_slots(practitioner_id):
+    """Bookable slots for a practitioner on a local date"""
+    day = _parse_date(request.args.get('date'))
+    if day is None:
+        return jsonify({'success': False, 'message': 'date is required (YYYY-MM-DD)'}), 400
+    duration = request.args.get('duration', 60, type=int)
+    if duration <= 0:
+        return jsonify({'success': False, 'message': 'duration must be positive'}), 400
+
+    slots = calendars.available_slots(practitioner_id, day, duration)
+    if slots is None:
+        return jsonify({'success': False, 'message': 'Practitioner not found'}), 404
+
+    month = calendars.get_month(practitioner_id, day.year, day.month)
+    return jsonify({
+        'success': True,
+        'data': {
+            'date': day.isoformat(),
+            'timezone': month.timezone,
+            'slots': slots
+        }
+    })
+
+@calendars_bp.route('/<int:practitioner_id>/month', methods=['GET'])
+@jwt_required()
+def get_compiled_month(practitioner_id):
+    """Compiled working intervals (UTC) for a month"""
+    today = datetime.utcnow().date()
+    year = request.args.get('year', today.year, type=int)
+    month = request.args.get('month', today.month, type=int)
+    if not 1 <= month <= 12:
+        return jsonify({'success': False, 'message': 'month must be 1-12'}), 400
+
+    compiled = calendars.get_month(practitioner_id, year, month)
+    if compiled is None:
+        return jsonify({'success': False, 'message': 'Practitioner not found'}), 404
+
+    return jsonify({'success': True, 'data': compiled.to_dict()})
+
+@calendars_bp.route('/<int:practitioner_id>/working-hours', methods=['PUT'])
+@role_required('admin', 'practitioner')
+def set_working_hours(practitioner_id):
+    """Replace a practitioner's weekly working hours and optionally their time zone"""
+    identity = current_identity()
+    if identity.is_practitioner and identity.practitioner_id != practitioner_id:
+        return jsonify({'success': False, 'message': 'Forbidden'}), 403
+
+    practitioner = db.session.get(Practitioner, practitioner_id)
+    if not practitioner:
+        return jsonify({'success': False, 'message': 'Practitioner not found'}), 404
+
+    data = request.get_json(silent=True) or {}
+    if 'timezone' in data:
+        if data['timezone'] and data['timezone'] not in pytz.all_timezones_set:
+            return jsonify({'success': False, 'message': f"Unknown timezone '{data['timezone']}'"}), 400
+        practitioner.timezone = data['timezone'] or None
+
+    rows = []
+    for entry in data.get('hours', []):
+        start, end = _parse_time(entry.get('start_time')), _parse_time(entry.get('end_time'))
+        weekday = entry.get('weekday')
+        if not isinstance(weekday, int) or not 0 <= weekday <= 6 or not start or not end or end <= start:
+            return jsonify({'success': False, 'message': f'Invalid working hours entry: {entry}'}), 400
+        rows.append(WorkingHours(practitioner_id=practitioner_id, weekday=weekday, start_time=start, end_time=end))
+
+    # ORM deletes, not a bulk delete: the flush hooks clear compiled calendars and the search index
+    for row in WorkingHours.query.filter_by(practitioner_id=practitioner_id):
+        db.session.delete(row)
+    db.session.add_all(rows)
+    db.session.commit()
+
+    return jsonify({
+        'success': True,
+        'message': 'Working hours updated',
+        'data': {'timezone': practitioner.timezone, 'hours': [row.to_dict() for row in rows]}
+    })
+
+@calendars_bp.route('/holidays', methods=['POST'])
+@role_required('admin')
+def add_holiday():
+    """Close the clinic, or one practitioner, for a day"""
+    data = request.get_json(silent=True) or {}
+    day = _parse_date(data.get('date'))
+    if day is None:
+        return jsonify({'success': False, 'message': 'date is required (YYYY-MM-DD)'}), 400
+
+    holiday = Holiday(
+        practitioner_id=data.get('practitioner_id'),
+        holiday_date=day,
+        description=data.get('description')
+    )
+    db.session.add(holiday)
+    db.session.commit()
+
+    return jsonify({'success': True, 'message': 'Holiday added', 'data': {'holiday': holiday.to_dict()}}), 201
@@ -0,0 +1,26 @@
+from flask import Blueprint, Response, request
+from catalog import catalog
+
+catalog_bp = Blueprint('catalog', __name__)
+
+def _cached(payload, etag):
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(payload, mimetype='application/json')
+    response.set_etag(etag)
+    # Browsers revalidate on every page load and get a 304 while the catalog is unchanged
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@catalog_bp.route('', methods=['GET'])
+def get_catalog():
+    """Active treatments and programs, each program with its sessions in order"""
+    snapshot = catalog.get()
+    return _cached(snapshot.payload, snapshot.etag)
+
+@catalog_bp.route('/treatments', methods=['GET'])
+def get_treatments():
+    """Active treatments only, as data.treatments"""
+    snapshot = catalog.get()
+    return _cached(snapshot.treatments_payload, snapshot.treatments_etag)
@@ -0,0 +1,71 @@
+from flask import Blueprint, request, jsonify
+from identity import role_required
+from contact_triage import TriageError, TooManySubmissions, accept_submission, inbox, transition, status_counts
+
+contact_triage_bp = Blueprint('contact_triage', __name__)
+
+@contact_triage_bp.route('/submissions', methods=['POST'])
+def submit():
+    """Public contact form; repeats of an open message are folded into it"""
+    data = request.get_json(silent=True) or {}
+    try:
+        submission, created = accept_submission(data)
+    except TooManySubmissions as e:
+        return jsonify({'success': False, 'message': str(e)}), 429
+    except TriageError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    return jsonify({
+        'success': True,
+        'message': 'Thank you for contacting us. We will get back to you soon.',
+        'data': {'id': submission.id}
+    }), 201 if created else 200
+
+@contact_triage_bp.route('/inbox', methods=['GET'])
+@role_required('admin')
+def get_inbox():
+    """One page of a status queue, urgent first; pass next_cursor back as cursor for the next page"""
+    try:
+        submissions, next_cursor = inbox(
+            status=request.args.get('status', 'new'),
+            cursor=request.args.get('cursor'),
+            limit=request.args.get('limit', 50, type=int),
+            urgent_only=request.args.get('urgent', 'false').lower() in ('1', 'true', 'yes')
+        )
+    except TriageError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    return jsonify({
+        'success': True,
+        'data': {
+            'submissions': [submission.to_dict() for submission in submissions],
+            'next_cursor': next_cursor
+        }
+    })
+
+@contact_triage_bp.route('/counts', methods=['GET'])
+@role_required('admin')
+def get_counts():
+    """Submissions per status, for inbox tabs and badges"""
+    return jsonify({'success': True, 'data': {'counts': status_counts()}})
+
+@contact_triage_bp.route('/transitions', methods=['POST'])
+@role_required('admin')
+def batch_transition():
+    """Move a batch of submissions to read, replied, closed or back to new"""
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids')
+    if not isinstance(ids, list):
+        return jsonify({'success': False, 'message': 'ids must be a list'}), 400
+
+    try:
+        moved = transition(ids, data.get('status'))
+    except (TriageError, TypeError, ValueError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    skipped = sorted(set(map(int, ids)) - set(moved))
+    return jsonify({
+        'success': True,
+        'message': f'{len(moved)} submissions updated',
+        'data': {'updated': moved, 'skipped': skipped}
+    })
@@ -0,0 +1,94 @@
+import os
+from flask import Blueprint, request, jsonify, Response, stream_with_context, send_from_directory
+from database import db
+from identity import role_required
+from jobs import enqueue
+from export_data import (
+    EXPORT_DATASETS, EXPORT_DIR, EXPORT_FORMATS, ExportError, parse_date, stream_export, export_filename
+)
+
+exports_bp = Blueprint('exports', __name__)
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+@exports_bp.route('/', methods=['GET'])
+@role_required('admin')
+def list_datasets():
+    """List the datasets available for export"""
+    return jsonify({
+        'success': True,
+        'data': {'datasets': sorted(EXPORT_DATASETS), 'formats': list(CONTENT_TYPES)}
+    })
+
+@exports_bp.route('/<dataset>', methods=['GET'])
+@role_required('admin')
+def export_dataset(dataset):
+    """Stream a dataset as CSV or NDJSON, optionally gzip-compressed"""
+    export_format = request.args.get('format', 'csv')
+    compress = request.args.get('gzip', 'false').lower() in ('1', 'true', 'yes')
+
+    try:
+        chunks = stream_export(
+            dataset,
+            export_format=export_format,
+            start_date=parse_date(request.args.get('start_date')),
+            end_date=parse_date(request.args.get('end_date')),
+            practitioner_id=request.args.get('practitioner_id', type=int),
+            compress=compress
+        )
+    except ExportError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    filename = export_filename(dataset, export_format, compress)
+    mimetype = 'application/gzip' if compress else CONTENT_TYPES[export_format]
+
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@exports_bp.route('/<dataset>/jobs', methods=['POST'])
+@role_required('admin')
+def queue_export(dataset):
+    """Generate an export in the background; poll /api/jobs/<id> for the file"""
+    data = request.get_json(silent=True) or {}
+    export_format = data.get('format', 'csv')
+
+    try:
+        if dataset not in EXPORT_DATASETS:
+            raise ExportError(f"Unknown dataset '{dataset}'")
+        if export_format not in EXPORT_FORMATS:
+            raise ExportError(f"Unknown format '{export_format}'")
+        parse_date(data.get('start_date'))
+        parse_date(data.get('end_date'))
+    except ExportError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    export_job = enqueue('exports.generate', {
+        'dataset': dataset,
+        'export_format': export_format,
+        'start_date': data.get('start_date'),
+        'end_date': data.get('end_date'),
+        'practitioner_id': data.get('practitioner_id'),
+        'compress': bool(data.get('gzip', True))
+    }, idempotency_key=request.headers.get('Idempotency-Key'))
+    db.session.commit()
+
+    return jsonify({
+        'success': True,
+        'message': 'Export queued',
+        'data': {'job': export_job.to_dict()}
+    }), 202
+
+@exports_bp.route('/files/<path:filename>', methods=['GET'])
+@role_required('admin')
+def download_export(filename):
+    """Download a file written by a background export job"""
+    return send_from_directory(os.path.abspath(EXPORT_DIR), filename, as_attachment=True)
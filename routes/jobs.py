@@ -0,0 +1,39 @@
+from flask import Blueprint, request, jsonify
+from sqlalchemy import func
+from database import db
+from identity import role_required
+from models import Job
+
+jobs_bp = Blueprint('jobs', __name__)
+
+@jobs_bp.route('', methods=['GET'])
+@role_required('admin')
+def list_jobs():
+    """List recent background jobs with queue depth by status"""
+    status = request.args.get('status')
+    limit = min(request.args.get('limit', 50, type=int), 500)
+
+    query = Job.query
+    if status:
+        query = query.filter_by(status=status)
+    jobs = query.order_by(Job.id.desc()).limit(limit).all()
+
+    counts = dict(db.session.query(Job.status, func.count(Job.id)).group_by(Job.status).all())
+
+    return jsonify({
+        'success': True,
+        'data': {
+            'jobs': [job.to_dict() for job in jobs],
+            'counts': counts
+        }
+    })
+
+@jobs_bp.route('/<int:job_id>', methods=['GET'])
+@role_required('admin')
+def get_job(job_id):
+    """Get the status and result of a background job"""
+    job = db.session.get(Job, job_id)
+    if not job:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+
+    return jsonify({'success': True, 'data': {'job': job.to_dict()}})
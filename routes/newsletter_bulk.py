@@ -0,0 +1,132 @@
+from flask import Blueprint, request, jsonify
+from database import db
+from identity import current_identity, role_required
+from models import NewsletterCampaign
+from newsletter import (
+    NewsletterError, bulk_subscribe, bulk_unsubscribe, token_email, unsubscribe_with_token, queue_campaign,
+    cancel_campaign
+)
+
+newsletter_bulk_bp = Blueprint('newsletter_bulk', __name__)
+
+# Addresses accepted per bulk request; larger lists go through bulk_import or several requests
+MAX_BULK = 10000
+
+def _email_list(data):
+    entries = data.get('subscribers') or data.get('emails')
+    if not isinstance(entries, list) or not entries:
+        return None, (jsonify({'success': False, 'message': 'subscribers must be a non-empty list'}), 400)
+    if len(entries) > MAX_BULK:
+        return None, (jsonify({'success': False, 'message': f'At most {MAX_BULK} subscribers per request'}), 400)
+    return entries, None
+
+@newsletter_bulk_bp.route('/subscribe', methods=['POST'])
+@role_required('admin')
+def subscribe_many():
+    """Subscribe or reactivate a list of emails (or {email, name} objects)"""
+    entries, error = _email_list(request.get_json(silent=True) or {})
+    if error:
+        return error
+
+    result = bulk_subscribe(entries)
+    return jsonify({'success': True, 'message': f"{result['processed']} subscribers saved", 'data': result})
+
+@newsletter_bulk_bp.route('/unsubscribe', methods=['POST'])
+@role_required('admin')
+def unsubscribe_many():
+    """Deactivate a list of emails"""
+    entries, error = _email_list(request.get_json(silent=True) or {})
+    if error:
+        return error
+
+    changed = bulk_unsubscribe(entry.get('email') if isinstance(entry, dict) else entry for entry in entries)
+    return jsonify({'success': True, 'message': f'{changed} subscribers unsubscribed', 'data': {'unsubscribed': changed}})
+
+@newsletter_bulk_bp.route('/unsubscribe', methods=['GET'])
+@newsletter_bulk_bp.route('/unsubscribe/one-click', methods=['GET'])
+def unsubscribe_link():
+    """Check an unsubscribe link without acting on it; link scanners and prefetchers only GET"""
+    try:
+        email = token_email(request.args.get('token', ''))
+    except NewsletterError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    return jsonify({'success': True, 'message': f'POST to this link to unsubscribe {email}', 'data': {'email': email}})
+
+@newsletter_bulk_bp.route('/unsubscribe/one-click', methods=['POST'])
+def unsubscribe_one_click():
+    """One-click unsubscribe (RFC 8058 List-Unsubscribe-Post) from the link in campaign emails"""
+    try:
+        email = unsubscribe_with_token(request.args.get('token') or request.form.get('token', ''))
+    except NewsletterError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    return jsonify({'success': True, 'message': f'{email} has been unsubscribed'})
+
+@newsletter_bulk_bp.route('/campaigns', methods=['POST'])
+@role_required('admin')
+def create_campaign():
+    """Create a draft campaign"""
+    data = request.get_json(silent=True) or {}
+    if not data.get('subject') or not data.get('body_text'):
+        return jsonify({'success': False, 'message': 'subject and body_text are required'}), 400
+
+    campaign = NewsletterCampaign(
+        subject=data['subject'][:200],
+        body_text=data['body_text'],
+        body_html=data.get('body_html'),
+        status='draft',
+        created_by=current_identity().user_id
+    )
+    db.session.add(campaign)
+    db.session.commit()
+    return jsonify({'success': True, 'message': 'Campaign created', 'data': {'campaign': campaign.to_dict()}}), 201
+
+@newsletter_bulk_bp.route('/campaigns', methods=['GET'])
+@role_required('admin')
+def list_campaigns():
+    """Recent campaigns with delivery progress"""
+    campaigns = NewsletterCampaign.query.order_by(NewsletterCampaign.id.desc()).limit(50).all()
+    return jsonify({'success': True, 'data': {'campaigns': [campaign.to_dict() for campaign in campaigns]}})
+
+@newsletter_bulk_bp.route('/campaigns/<int:campaign_id>', methods=['GET'])
+@role_required('admin')
+def get_campaign(campaign_id):
+    campaign = db.session.get(NewsletterCampaign, campaign_id)
+    if not campaign:
+        return jsonify({'success': False, 'message': 'Campaign not found'}), 404
+    return jsonify({'success': True, 'data': {'campaign': campaign.to_dict()}})
+
+@newsletter_bulk_bp.route('/campaigns/<int:campaign_id>/send', methods=['POST'])
+@role_required('admin')
+def send_campaign(campaign_id):
+    """Queue a draft for delivery by the background worker"""
+    campaign = db.session.get(NewsletterCampaign, campaign_id)
+    if not campaign:
+        return jsonify({'success': False, 'message': 'Campaign not found'}), 404
+
+    try:
+        send_job = queue_campaign(campaign)
+    except NewsletterError as e:
+        return jsonify({'success': False, 'message': str(e)}), 409
+    db.session.commit()
+    return jsonify({
+        'success': True,
+        'message': 'Campaign queued',
+        'data': {'campaign': campaign.to_dict(), 'job': send_job.to_dict()}
+    }), 202
+
+@newsletter_bulk_bp.route('/campaigns/<int:campaign_id>/cancel', methods=['POST'])
+@role_required('admin')
+def cancel(campaign_id):
+    """Stop a campaign; delivery halts after the chunk in progress"""
+    campaign = db.session.get(NewsletterCampaign, campaign_id)
+    if not campaign:
+        return jsonify({'success': False, 'message': 'Campaign not found'}), 404
+
+    try:
+        cancel_campaign(campaign)
+    except NewsletterError as e:
+        return jsonify({'success': False, 'message': str(e)}), 409
+    db.session.commit()
+    return jsonify({'success': True, 'message': 'Campaign cancelled', 'data': {'campaign': campaign.to_dict()}})
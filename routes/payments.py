@@ -0,0 +1,23 @@
+from flask import Blueprint, current_app, request, jsonify
+from payments import PaymentIngestError, ingest_payment_update, verify_signature
+
+payments_bp = Blueprint('payments', __name__)
+
+@payments_bp.route('/webhooks/<gateway>', methods=['POST'])
+def payment_webhook(gateway):
+    """Apply a gateway payment status update; retries of the same update are harmless"""
+    if not current_app.config.get('PAYMENT_WEBHOOK_SECRET'):
+        # Unsigned updates could mark anything paid, so webhooks stay off until a secret is set
+        return jsonify({'success': False, 'message': 'Payment webhooks are not configured'}), 503
+    if not verify_signature(request.get_data(), request.headers.get('X-Webhook-Signature')):
+        return jsonify({'success': False, 'message': 'Invalid signature'}), 401
+
+    data = request.get_json(silent=True) or {}
+    try:
+        payment_id, outcome = ingest_payment_update(gateway, data)
+    except PaymentIngestError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    # Gateways retry on anything but 2xx, so duplicates and stale updates are acknowledged too
+    return jsonify({'success': True, 'message': f'Payment update {outcome}',
+                    'data': {'payment_id': payment_id, 'outcome': outcome}})
@@ -0,0 +1,45 @@
+from flask import Blueprint, request, jsonify
+from practitioner_index import practitioner_index, SORT_KEYS
+
+practitioner_search_bp = Blueprint('practitioner_search', __name__)
+
+def _bool_arg(name):
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    return value.lower() in ('1', 'true', 'yes')
+
+@practitioner_search_bp.route('', methods=['GET'])
+def search_practitioners():
+    """Filter, sort and page practitioners from the in-memory index"""
+    sort = request.args.get('sort', 'rating')
+    if sort not in SORT_KEYS:
+        return jsonify({'success': False, 'message': f"sort must be one of {', '.join(SORT_KEYS)}"}), 400
+
+    order = request.args.get('order')
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+
+    total, practitioners = practitioner_index.query(
+        specialization=request.args.get('specialization'),
+        q=request.args.get('q'),
+        available=_bool_arg('is_available'),
+        min_fee=request.args.get('min_fee', type=float),
+        max_fee=request.args.get('max_fee', type=float),
+        min_experience=request.args.get('min_experience', type=int),
+        min_rating=request.args.get('min_rating', type=float),
+        sort=sort,
+        descending=None if order is None else order.lower() == 'desc',
+        limit=limit,
+        offset=offset
+    )
+
+    return jsonify({
+        'success': True,
+        'data': {
+            'practitioners': practitioners,
+            'total': total,
+            'limit': limit,
+            'offset': offset
+        }
+    })
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify
+from identity import current_identity, role_required
+from batch_reschedule import (
+    RescheduleError, DEFAULT_SEARCH_DAYS, plan_batch, reschedule_window
+)
+
+reschedules_bp = Blueprint('reschedules', __name__)
+
+def _parse_window(data):
+    """(start, end) local datetimes from either date or start/end (YYYY-MM-DDTHH:MM)"""
+    try:
+        if data.get('date'):
+            start = datetime.strptime(data['date'], '%Y-%m-%d')
+            return start, start + timedelta(days=1)
+        return (datetime.strptime(data.get('start') or '', '%Y-%m-%dT%H:%M'),
+                datetime.strptime(data.get('end') or '', '%Y-%m-%dT%H:%M'))
+    except (TypeError, ValueError):
+        raise RescheduleError('Provide date (YYYY-MM-DD) or start and end (YYYY-MM-DDTHH:MM)')
+
+def _parse_int(value, field):
+    """Whole number from JSON (int or numeric string); bools are rejected"""
+    if isinstance(value, bool):
+        raise RescheduleError(f'{field} must be a whole number')
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RescheduleError(f'{field} must be a whole number')
+
+@reschedules_bp.route('/batch', methods=['POST'])
+@role_required('admin', 'practitioner')
+def batch_reschedule():
+    """Move every session in a practitioner's blocked window; dry_run returns the plan only"""
+    data = request.get_json(silent=True) or {}
+    identity = current_identity()
+
+    try:
+        practitioner_id = data.get('practitioner_id')
+        if practitioner_id not in (None, ''):
+            practitioner_id = _parse_int(practitioner_id, 'practitioner_id')
+        elif identity.is_practitioner:
+            practitioner_id = identity.practitioner_id
+        else:
+            raise RescheduleError('practitioner_id is required')
+        search_days = min(max(_parse_int(data.get('search_days', DEFAULT_SEARCH_DAYS), 'search_days'), 1), 60)
+    except RescheduleError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    if identity.is_practitioner and practitioner_id != identity.practitioner_id:
+        return jsonify({'success': False, 'message': 'Forbidden'}), 403
+
+    try:
+        window_start, window_end = _parse_window(data)
+        if data.get('dry_run'):
+            plan = plan_batch(practitioner_id, window_start, window_end, search_days=search_days)
+        else:
+            plan = reschedule_window(
+                practitioner_id, window_start, window_end,
+                requested_by=identity.user_id,
+                reason=data.get('reason'),
+                cancel_unplaced=bool(data.get('cancel_unplaced')),
+                search_days=search_days
+            )
+    except RescheduleError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    verb = 'can be moved' if data.get('dry_run') else 'moved'
+    return jsonify({
+        'success': True,
+        'message': f"{len(plan.moves)} sessions {verb}, {len(plan.unplaced)} without a free slot",
+        'data': plan.to_dict()
+    })
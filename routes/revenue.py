@@ -0,0 +1,83 @@
+from datetime import datetime
+from flask import Blueprint, request, jsonify
+from database import db
+from identity import current_identity, role_required
+from jobs import enqueue
+from models import PaymentDiscrepancy, ReconciliationRun
+from revenue import ReconciliationError, revenue_report
+
+revenue_bp = Blueprint('revenue', __name__)
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value or '', '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+@revenue_bp.route('/report', methods=['GET'])
+@role_required('admin', 'practitioner')
+def get_report():
+    """Revenue totals from the daily fact table; practitioners only see their own"""
+    identity = current_identity()
+    start_date = _parse_date(request.args.get('start_date'))
+    end_date = _parse_date(request.args.get('end_date'))
+    if not start_date or not end_date:
+        return jsonify({'success': False, 'message': 'start_date and end_date are required (YYYY-MM-DD)'}), 400
+
+    practitioner_id = identity.practitioner_id if identity.is_practitioner \
+        else request.args.get('practitioner_id', type=int)
+    try:
+        report = revenue_report(
+            start_date, end_date,
+            group_by=request.args.get('group_by', 'day'),
+            payment_status=request.args.get('status', 'completed') or None,
+            currency=request.args.get('currency'),
+            practitioner_id=practitioner_id
+        )
+    except ReconciliationError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    return jsonify({'success': True, 'data': report})
+
+@revenue_bp.route('/discrepancies', methods=['GET'])
+@role_required('admin')
+def list_discrepancies():
+    """Payments that don't match the list price of what they paid for"""
+    query = PaymentDiscrepancy.query
+    status = request.args.get('status', 'open')
+    if status != 'all':
+        query = query.filter_by(status=status)
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    discrepancies = query.order_by(PaymentDiscrepancy.fact_date.desc(), PaymentDiscrepancy.id.desc()).limit(limit).all()
+
+    return jsonify({'success': True, 'data': {'discrepancies': [d.to_dict() for d in discrepancies]}})
+
+@revenue_bp.route('/discrepancies/<int:discrepancy_id>/resolve', methods=['POST'])
+@role_required('admin')
+def resolve_discrepancy(discrepancy_id):
+    """Mark a discrepancy as reviewed; it reopens if the payment changes again"""
+    discrepancy = db.session.get(PaymentDiscrepancy, discrepancy_id)
+    if not discrepancy:
+        return jsonify({'success': False, 'message': 'Discrepancy not found'}), 404
+
+    discrepancy.status = 'resolved'
+    discrepancy.resolved_by = current_identity().user_id
+    discrepancy.resolved_at = datetime.utcnow()
+    db.session.commit()
+    return jsonify({'success': True, 'message': 'Discrepancy resolved', 'data': {'discrepancy': discrepancy.to_dict()}})
+
+@revenue_bp.route('/reconcile', methods=['POST'])
+@role_required('admin')
+def queue_reconciliation():
+    """Run reconciliation in the background; poll /api/jobs/<id> or /api/revenue/runs"""
+    data = request.get_json(silent=True) or {}
+    reconcile_job = enqueue('revenue.reconcile', {'full': bool(data.get('full'))})
+    db.session.commit()
+    return jsonify({'success': True, 'message': 'Reconciliation queued', 'data': {'job': reconcile_job.to_dict()}}), 202
+
+@revenue_bp.route('/runs', methods=['GET'])
+@role_required('admin')
+def list_runs():
+    """Recent reconciliation runs"""
+    runs = ReconciliationRun.query.order_by(ReconciliationRun.id.desc()).limit(20).all()
+    return jsonify({'success': True, 'data': {'runs': [run.to_dict() for run in runs]}})
@@ -0,0 +1,81 @@
+from datetime import datetime
+from flask import Blueprint, request, jsonify
+from database import db
+from identity import current_identity, role_required
+from models import Session, SessionSnapshot
+from session_events import EVENT_TYPES, SessionEventError, record_event, get_snapshot, get_events
+
+session_events_bp = Blueprint('session_events', __name__)
+
+def _can_view(identity, session):
+    if identity.is_admin:
+        return True
+    if identity.is_practitioner:
+        return session.practitioner_id == identity.practitioner_id
+    return session.patient_id == identity.patient_id
+
+@session_events_bp.route('/<int:session_id>', methods=['POST'])
+@role_required('practitioner', 'admin')
+def add_event(session_id):
+    """Append a lifecycle event (started, paused, resumed, completed, notes)"""
+    identity = current_identity()
+    session = db.session.get(Session, session_id)
+    if not session or not _can_view(identity, session):
+        return jsonify({'success': False, 'message': 'Session not found'}), 404
+
+    data = request.get_json(silent=True) or {}
+    if data.get('activity_type') not in EVENT_TYPES:
+        return jsonify({'success': False, 'message': f"activity_type must be one of {', '.join(EVENT_TYPES)}"}), 400
+
+    try:
+        snapshot = record_event(session_id, data['activity_type'], identity.user_id, data.get('notes'))
+        db.session.commit()
+    except SessionEventError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    return jsonify({'success': True, 'message': 'Event recorded', 'data': {'snapshot': snapshot.to_dict()}}), 201
+
+@session_events_bp.route('/<int:session_id>', methods=['GET'])
+@role_required('practitioner', 'admin', 'patient')
+def session_timeline(session_id):
+    """Current snapshot and the events still stored for a session"""
+    session = db.session.get(Session, session_id)
+    if not session or not _can_view(current_identity(), session):
+        return jsonify({'success': False, 'message': 'Session not found'}), 404
+
+    snapshot = get_snapshot(session_id) or SessionSnapshot(session_id=session_id, state='not_started',
+                                                           pause_count=0, total_pause_seconds=0, event_count=0)
+    return jsonify({
+        'success': True,
+        'data': {
+            'snapshot': snapshot.to_dict(),
+            'events': [event.to_dict() for event in get_events(session_id)]
+        }
+    })
+
+@session_events_bp.route('/board', methods=['GET'])
+@role_required('practitioner', 'admin')
+def live_board():
+    """Snapshots of a day's sessions for live dashboards, read without replaying events"""
+    identity = current_identity()
+    try:
+        day = datetime.strptime(request.args.get('date') or datetime.utcnow().strftime('%Y-%m-%d'), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'success': False, 'message': 'date must be YYYY-MM-DD'}), 400
+
+    practitioner_id = identity.practitioner_id if identity.is_practitioner \
+        else request.args.get('practitioner_id', type=int)
+
+    query = db.session.query(Session.id, SessionSnapshot).outerjoin(
+        SessionSnapshot, SessionSnapshot.session_id == Session.id
+    ).filter(Session.scheduled_date == day)
+    if practitioner_id:
+        query = query.filter(Session.practitioner_id == practitioner_id)
+
+    now = datetime.utcnow()
+    board = []
+    for session_id, snapshot in query.order_by(Session.scheduled_time).limit(500):
+        board.append(snapshot.to_dict(now) if snapshot else {'session_id': session_id, 'state': 'not_started'})
+
+    return jsonify({'success': True, 'data': {'date': day.isoformat(), 'sessions': board}})
@@ -0,0 +1,54 @@
+from flask import Blueprint, Response, request, jsonify
+from identity import role_required
+from database import db
+from models import SiteSetting
+from site_settings import SETTING_TYPES, SettingError, store, set_setting
+
+site_settings_bp = Blueprint('site_settings', __name__)
+
+@site_settings_bp.route('/public', methods=['GET'])
+def get_public_settings():
+    """Public settings as one cached payload; clients revalidate with If-None-Match"""
+    snapshot = store.snapshot()
+    if request.if_none_match.contains(snapshot.etag):
+        response = Response(status=304)
+    else:
+        response = Response(snapshot.public_payload, mimetype='application/json')
+    response.set_etag(snapshot.etag)
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    return response
+
+@site_settings_bp.route('', methods=['GET'])
+@role_required('admin')
+def get_settings():
+    """Every setting with its decoded value"""
+    snapshot = store.snapshot()
+    settings = SiteSetting.query.order_by(SiteSetting.key).all()
+    return jsonify({
+        'success': True,
+        'data': {
+            'settings': [dict(setting.to_dict(), typed_value=snapshot.values.get(setting.key))
+                         for setting in settings]
+        }
+    })
+
+@site_settings_bp.route('/<key>', methods=['PUT'])
+@role_required('admin')
+def put_setting(key):
+    """Create or update a setting; value is given as its typed JSON value"""
+    data = request.get_json(silent=True) or {}
+    if 'value' not in data:
+        return jsonify({'success': False, 'message': 'value is required'}), 400
+    setting_type = data.get('setting_type')
+    if setting_type is not None and setting_type not in SETTING_TYPES:
+        return jsonify({'success': False, 'message': f"setting_type must be one of {', '.join(SETTING_TYPES)}"}), 400
+
+    try:
+        setting = set_setting(key[:100], data['value'], setting_type=setting_type,
+                              description=data.get('description'), is_public=data.get('is_public'))
+        db.session.commit()
+    except SettingError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    return jsonify({'success': True, 'message': 'Setting saved', 'data': {'setting': setting.to_dict()}})
@@ -0,0 +1,156 @@
+from datetime import datetime, timedelta, timezone
+from flask import Blueprint, request, jsonify
+from database import db
+from identity import current_identity, role_required
+from models import Patient, User
+from symptoms import (
+    MAX_OVERVIEW_PATIENTS, SymptomError, record_observation, get_series, get_trends, trend_patient_page,
+    worsening_cohort, practitioner_patient_ids
+)
+
+symptoms_bp = Blueprint('symptoms', __name__)
+
+def _parse_datetime(value):
+    """Naive UTC datetime from an ISO 8601 string; values without an offset are taken as UTC"""
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        raise SymptomError(f"'{value}' is not an ISO 8601 date/time")
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+def _can_access(identity, patient_id):
+    if identity.is_admin:
+        return True
+    if identity.is_patient:
+        return identity.patient_id == patient_id
+    patients = practitioner_patient_ids(identity.practitioner_id).subquery()
+    return db.session.query(patients).filter(patients.c.patient_id == patient_id).first() is not None
+
+def _scope(identity):
+    """Patients the caller may see across the overview and cohort views (None = all)"""
+    if identity.is_practitioner:
+        return practitioner_patient_ids(identity.practitioner_id)
+    patient_id = request.args.get('patient_id', type=int)
+    return [patient_id] if patient_id else None
+
+def _patient_names(patient_ids):
+    rows = db.session.query(Patient.id, User.first_name, User.last_name).join(User, User.id == Patient.user_id) \
+        .filter(Patient.id.in_(patient_ids)).all()
+    return {patient_id: f'{first} {last}' for patient_id, first, last in rows}
+
+@symptoms_bp.route('/patients/<int:patient_id>/observations', methods=['POST'])
+@role_required('practitioner', 'admin', 'patient')
+def add_observation(patient_id):
+    """Record a severity reading; the patient's symptom and trend are updated with it"""
+    identity = current_identity()
+    if not _can_access(identity, patient_id):
+        return jsonify({'success': False, 'message': 'Patient not found'}), 404
+
+    data = request.get_json(silent=True) or {}
+    try:
+        observation, trend = record_observation(
+            patient_id, data.get('symptom_name'), data.get('severity'),
+            observed_at=_parse_datetime(data.get('observed_at')),
+            recorded_by=identity.user_id, notes=data.get('notes')
+        )
+        db.session.commit()
+    except SymptomError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    return jsonify({
+        'success': True,
+        'message': 'Symptom recorded',
+        'data': {'observation': observation.to_dict(), 'trend': trend.to_dict()}
+    }), 201
+
+@symptoms_bp.route('/patients/<int:patient_id>/trends', methods=['GET'])
+@role_required('practitioner', 'admin', 'patient')
+def patient_trends(patient_id):
+    """Current, range and slope for each of a patient's symptoms"""
+    if not _can_access(current_identity(), patient_id):
+        return jsonify({'success': False, 'message': 'Patient not found'}), 404
+    return jsonify({'success': True, 'data': {'trends': [trend.to_dict() for trend in get_trends([patient_id])]}})
+
+@symptoms_bp.route('/patients/<int:patient_id>/series', methods=['GET'])
+@role_required('practitioner', 'admin', 'patient')
+def symptom_series(patient_id):
+    """Readings of one symptom over time, for charts"""
+    if not _can_access(current_identity(), patient_id):
+        return jsonify({'success': False, 'message': 'Patient not found'}), 404
+
+    try:
+        observations = get_series(
+            patient_id, request.args.get('symptom'),
+            start=_parse_datetime(request.args.get('start')),
+            end=_parse_datetime(request.args.get('end')),
+            limit=request.args.get('limit', 1000, type=int)
+        )
+    except SymptomError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    return jsonify({'success': True, 'data': {'observations': [o.to_dict() for o in observations]}})
+
+@symptoms_bp.route('/overview', methods=['GET'])
+@role_required('practitioner', 'admin')
+def overview():
+    """Symptom trends across the caller's patient list, grouped by patient, one page of patients at a time
+
+    Pass next_cursor back as cursor for the next page.
+    """
+    days = request.args.get('days', 30, type=int)
+    limit = max(1, min(request.args.get('limit', MAX_OVERVIEW_PATIENTS, type=int), MAX_OVERVIEW_PATIENTS))
+    filters = {
+        'symptom_name': request.args.get('symptom'),
+        'active_since': datetime.utcnow() - timedelta(days=days) if days > 0 else None
+    }
+    try:
+        page = trend_patient_page(_scope(current_identity()), after_id=request.args.get('cursor', 0, type=int),
+                                  limit=limit + 1, **filters)
+        trends = get_trends(page[:limit], **filters) if page else []
+    except SymptomError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    names = _patient_names({trend.patient_id for trend in trends})
+    patients = {}
+    for trend in trends:
+        entry = patients.setdefault(trend.patient_id, {
+            'patient_id': trend.patient_id, 'patient_name': names.get(trend.patient_id), 'symptoms': []
+        })
+        entry['symptoms'].append(trend.to_dict())
+
+    return jsonify({'success': True, 'data': {
+        'patients': list(patients.values()),
+        'next_cursor': page[limit - 1] if len(page) > limit else None
+    }})
+
+@symptoms_bp.route('/cohorts/worsening', methods=['GET'])
+@role_required('practitioner', 'admin')
+def worsening():
+    """Patients whose symptom worsened by at least min_increase over the last `days` days"""
+    try:
+        rows = worsening_cohort(
+            request.args.get('symptom'),
+            request.args.get('days', 14, type=int),
+            min_increase=request.args.get('min_increase', 1, type=int),
+            patient_ids=_scope(current_identity()),
+            limit=max(1, min(request.args.get('limit', 200, type=int), 1000))
+        )
+    except SymptomError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    names = _patient_names({trend.patient_id for trend, _ in rows})
+    return jsonify({
+        'success': True,
+        'data': {
+            'patients': [
+                dict(trend.to_dict(), patient_name=names.get(trend.patient_id),
+                     baseline_severity=baseline, change=trend.current_severity - baseline)
+                for trend, baseline in rows
+            ]
+        }
+    })
@@ -0,0 +1,101 @@
+from datetime import datetime
+from flask import Blueprint, request, jsonify
+from database import db
+from identity import current_identity, role_required
+from models import WaitlistEntry, SlotOffer
+from waitlist import WaitlistError, claim_offer, decline_offer
+
+waitlist_bp = Blueprint('waitlist', __name__)
+
+def _parse(value, fmt):
+    try:
+        return datetime.strptime(value, fmt) if value else None
+    except ValueError:
+        return None
+
+@waitlist_bp.route('', methods=['POST'])
+@role_required('patient')
+def join_waitlist():
+    """Ask to be offered a slot freed by a cancellation"""
+    data = request.get_json(silent=True) or {}
+    earliest = _parse(data.get('earliest_date'), '%Y-%m-%d')
+    latest = _parse(data.get('latest_date'), '%Y-%m-%d')
+    preferred_start = _parse(data.get('preferred_start'), '%H:%M')
+    preferred_end = _parse(data.get('preferred_end'), '%H:%M')
+
+    if not data.get('treatment_id') or not earliest or not latest or latest < earliest:
+        return jsonify({'success': False, 'message': 'treatment_id, earliest_date and latest_date are required'}), 400
+
+    entry = WaitlistEntry(
+        patient_id=current_identity().patient_id,
+        practitioner_id=data.get('practitioner_id'),
+        treatment_id=data['treatment_id'],
+        earliest_date=earliest.date(),
+        latest_date=latest.date(),
+        preferred_start=preferred_start.time() if preferred_start else None,
+        preferred_end=preferred_end.time() if preferred_end else None,
+        notes=data.get('notes')
+    )
+    db.session.add(entry)
+    db.session.commit()
+
+    return jsonify({'success': True, 'message': 'Added to waitlist', 'data': {'entry': entry.to_dict()}}), 201
+
+@waitlist_bp.route('', methods=['GET'])
+@role_required('patient', 'admin')
+def list_waitlist():
+    """A patient's waitlist entries and pending offers; admins see every waiting entry"""
+    identity = current_identity()
+    entries = WaitlistEntry.query
+    if identity.is_patient:
+        entries = entries.filter_by(patient_id=identity.patient_id)
+    else:
+        entries = entries.filter(WaitlistEntry.status.in_(('waiting', 'offered')))
+    entries = entries.order_by(WaitlistEntry.created_at).limit(500).all()
+
+    offers = SlotOffer.query.filter(
+        SlotOffer.waitlist_entry_id.in_([entry.id for entry in entries]),
+        SlotOffer.status == 'pending'
+    ).all() if entries else []
+
+    return jsonify({
+        'success': True,
+        'data': {
+            'entries': [entry.to_dict() for entry in entries],
+            'offers': [offer.to_dict() for offer in offers]
+        }
+    })
+
+@waitlist_bp.route('/<int:entry_id>', methods=['DELETE'])
+@role_required('patient')
+def leave_waitlist(entry_id):
+    """Remove a waitlist entry"""
+    entry = db.session.get(WaitlistEntry, entry_id)
+    if not entry or entry.patient_id != current_identity().patient_id:
+        return jsonify({'success': False, 'message': 'Waitlist entry not found'}), 404
+
+    entry.status = 'cancelled'
+    db.session.commit()
+    return jsonify({'success': True, 'message': 'Removed from waitlist'})
+
+@waitlist_bp.route('/offers/<int:offer_id>/accept', methods=['POST'])
+@role_required('patient')
+def accept_offer(offer_id):
+    """Book a held slot"""
+    try:
+        session = claim_offer(offer_id, current_identity().patient_id)
+    except WaitlistError as e:
+        return jsonify({'success': False, 'message': str(e)}), 409
+
+    return jsonify({'success': True, 'message': 'Session booked', 'data': {'session': session.to_dict()}}), 201
+
+@waitlist_bp.route('/offers/<int:offer_id>/decline', methods=['POST'])
+@role_required('patient')
+def reject_offer(offer_id):
+    """Pass on a held slot so it goes to the next patient"""
+    try:
+        decline_offer(offer_id, current_identity().patient_id)
+    except WaitlistError as e:
+        return jsonify({'success': False, 'message': str(e)}), 409
+
+    return jsonify({'success': True, 'message': 'Offer declined'})
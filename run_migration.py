@@ -7,9 +7,12 @@ import os
 import sys
 from flask import Flask
 from flask_migrate import upgrade, init, migrate, stamp
-from app import app, db
+from app import create_app, db
 from models import *
 
+# Migrations only need config and the database, not the API routes
+app = create_app('cli')
+
 def main():
     """Run migrations"""
     print("🔄 Running AyurSutra Database Migrations...")
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Background job worker for AyurSutra
+Runs queued jobs (exports, reminders, rollups, ...) outside the web processes; start it next to gunicorn
+"""
+
+import argparse
+import logging
+import multiprocessing
+import signal
+import sys
+
+def run_process(concurrency, poll_interval, names, once):
+    """Entry point of one worker process"""
+    from app import create_app
+    from jobs import Worker, load_handlers
+
+    app = create_app('cli')
+    load_handlers()
+    worker = Worker(app, concurrency=concurrency, poll_interval=poll_interval, names=names)
+
+    def shutdown(signum, frame):
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    worker.run(once=once)
+
+def main():
+    """Start worker processes"""
+    parser = argparse.ArgumentParser(description='Run AyurSutra background job workers')
+    parser.add_argument('--processes', type=int, default=1, help='Worker processes (default 1)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Jobs run at once per process (default 4)')
+    parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between polls when idle')
+    parser.add_argument('--name', dest='names', action='append', help='Only run jobs with this name (repeatable)')
+    parser.add_argument('--once', action='store_true', help='Run due jobs, then exit')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(processName)s %(levelname)s %(message)s')
+    worker_args = (args.concurrency, args.poll_interval, args.names, args.once)
+
+    if args.processes == 1:
+        print(f"🔄 Worker started with {args.concurrency} threads")
+        run_process(*worker_args)
+        return True
+
+    processes = [
+        multiprocessing.Process(target=run_process, args=worker_args, name=f'worker-{i}')
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    print(f"🔄 Started {args.processes} worker processes with {args.concurrency} threads each")
+
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+
+    for process in processes:
+        process.join()
+
+    failed = [process.name for process in processes if process.exitcode not in (0, -signal.SIGTERM)]
+    if failed:
+        print(f"❌ Worker processes exited with errors: {', '.join(failed)}")
+        return False
+    print("✅ Workers stopped")
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -143,7 +143,7 @@ async function loadPractitioners() {
 // Load treatments data
 async function loadTreatments() {
     try {
-        const response = await api.get('/programs/treatments');
+        const response = await api.get('/catalog/treatments');
         if (response && response.success) {
             treatments = response.data.treatments || [];
             populateTreatmentSelect();
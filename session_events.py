@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Session lifecycle events for AyurSutra
+Appends start/pause/resume/complete/notes events in batches, keeps a per-session snapshot
+up to date as they are written, and compacts old events into the snapshot
+"""
+
+import argparse
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert
+
+from database import db, upsert
+from models import Session, SessionActivity, SessionSnapshot
+from jobs import job
+
+EVENT_TYPES = ('started', 'paused', 'resumed', 'completed', 'notes')
+
+# Lifecycle events of completed sessions older than this are folded into the snapshot and deleted
+DEFAULT_COMPACT_AFTER_DAYS = 90
+
+# Notes carry content staff read back, so compaction keeps them
+KEPT_EVENT_TYPES = ('notes',)
+
+class SessionEventError(ValueError):
+    """Raised for unknown event types or sessions"""
+
+def apply_event(snapshot, activity_type, timestamp):
+    """Fold one event into a snapshot; transitions that don't fit the current state only count"""
+    snapshot.event_count = (snapshot.event_count or 0) + 1
+    snapshot.total_pause_seconds = snapshot.total_pause_seconds or 0
+    snapshot.pause_count = snapshot.pause_count or 0
+    if snapshot.last_event_at is None or timestamp > snapshot.last_event_at:
+        snapshot.last_event_at = timestamp
+
+    state = snapshot.state or 'not_started'
+    if activity_type == 'started' and state == 'not_started':
+        snapshot.state = 'in_progress'
+        snapshot.started_at = timestamp
+    elif activity_type == 'paused' and state == 'in_progress':
+        snapshot.state = 'paused'
+        snapshot.paused_at = timestamp
+        snapshot.pause_count += 1
+    elif activity_type == 'resumed' and state == 'paused':
+        snapshot.total_pause_seconds += int((timestamp - snapshot.paused_at).total_seconds())
+        snapshot.paused_at = None
+        snapshot.state = 'in_progress'
+    elif activity_type == 'completed' and state in ('in_progress', 'paused'):
+        if state == 'paused':
+            snapshot.total_pause_seconds += int((timestamp - snapshot.paused_at).total_seconds())
+            snapshot.paused_at = None
+        snapshot.state = 'completed'
+        snapshot.completed_at = timestamp
+        snapshot.actual_duration_seconds = int((timestamp - snapshot.started_at).total_seconds()) \
+            - snapshot.total_pause_seconds
+    return snapshot
+
+def lock_snapshots(session_ids):
+    """Snapshots of these sessions, created if missing and locked until the transaction ends
+
+    The upsert creates missing rows without racing another writer to the primary key, and
+    concurrent writers for the same session queue on the row lock instead of overwriting
+    each other's counts. Rows are locked in session id order so writers can't deadlock.
+    """
+    session_ids = sorted(session_ids)
+    existing = SessionSnapshot.__table__.c
+    db.session.execute(upsert(SessionSnapshot, [{'session_id': session_id} for session_id in session_ids],
+                              ['session_id'], lambda new: {'session_id': existing.session_id}))
+    return {snapshot.session_id: snapshot for snapshot in SessionSnapshot.query.filter(
+        SessionSnapshot.session_id.in_(session_ids)
+    ).order_by(SessionSnapshot.session_id).with_for_update().populate_existing()}
+
+class SessionEventWriter:
+    """Collects events and writes them with one INSERT plus one snapshot read per flush
+
+    Use one writer per request or job; events are added to the caller's transaction.
+    """
+
+    def __init__(self):
+        self._pending = []
+
+    def add(self, session_id, activity_type, created_by, notes=None, timestamp=None):
+        if activity_type not in EVENT_TYPES:
+            raise SessionEventError(f"Unknown event type '{activity_type}'")
+        self._pending.append({
+            'session_id': session_id,
+            'activity_type': activity_type,
+            'notes': notes,
+            'timestamp': timestamp or datetime.utcnow(),
+            'created_by': created_by,
+        })
+
+    def __len__(self):
+        return len(self._pending)
+
+    def flush(self):
+        """Append pending events and update their sessions' snapshots; returns the snapshots"""
+        if not self._pending:
+            return {}
+        events = sorted(self._pending, key=lambda event: (event['session_id'], event['timestamp']))
+        self._pending = []
+
+        session_ids = {event['session_id'] for event in events}
+        known = {row.id for row in db.session.query(Session.id).filter(Session.id.in_(session_ids))}
+        missing = session_ids - known
+        if missing:
+            raise SessionEventError(f"Unknown session(s): {', '.join(map(str, sorted(missing)))}")
+
+        db.session.execute(insert(SessionActivity), events)
+
+        snapshots = lock_snapshots(session_ids)
+        for event in events:
+            apply_event(snapshots[event['session_id']], event['activity_type'], event['timestamp'])
+        return snapshots
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            self._pending = []
+
+def record_event(session_id, activity_type, created_by, notes=None, timestamp=None):
+    """Append a single event and return the updated snapshot (caller commits)"""
+    writer = SessionEventWriter()
+    writer.add(session_id, activity_type, created_by, notes, timestamp)
+    return writer.flush()[session_id]
+
+def get_snapshot(session_id):
+    return db.session.get(SessionSnapshot, session_id)
+
+def get_events(session_id):
+    """Events still stored for a session, oldest first (uses the session/timestamp index)"""
+    return SessionActivity.query.filter_by(session_id=session_id).order_by(
+        SessionActivity.timestamp, SessionActivity.id
+    ).all()
+
+def rebuild_snapshots(session_ids=None, batch_size=1000):
+    """Recompute snapshots from stored events, e.g. for activity written before snapshots existed
+
+    Works through sessions in keyset-paginated batches, committing each. Sessions that were
+    already compacted keep their snapshot untouched.
+    """
+    not_compacted = ~db.session.query(SessionSnapshot.session_id).filter(
+        SessionSnapshot.session_id == SessionActivity.session_id,
+        SessionSnapshot.compacted_events > 0
+    ).exists()
+    rebuilt, last_id = 0, 0
+    while True:
+        query = db.session.query(SessionActivity.session_id).filter(
+            SessionActivity.session_id > last_id, not_compacted
+        )
+        if session_ids is not None:
+            query = query.filter(SessionActivity.session_id.in_(session_ids))
+        batch = [row.session_id for row in query.distinct().order_by(SessionActivity.session_id).limit(batch_size)]
+        if not batch:
+            return rebuilt
+        last_id = batch[-1]
+
+        events = db.session.query(
+            SessionActivity.session_id, SessionActivity.activity_type, SessionActivity.timestamp
+        ).filter(SessionActivity.session_id.in_(batch)).order_by(
+            SessionActivity.session_id, SessionActivity.timestamp, SessionActivity.id
+        ).all()
+
+        snapshots = lock_snapshots(batch)
+        for snapshot in snapshots.values():
+            for column in ('started_at', 'paused_at', 'completed_at', 'actual_duration_seconds', 'last_event_at'):
+                setattr(snapshot, column, None)
+            snapshot.state, snapshot.pause_count, snapshot.total_pause_seconds, snapshot.event_count = 'not_started', 0, 0, 0
+        for session_id, activity_type, timestamp in events:
+            apply_event(snapshots[session_id], activity_type, timestamp)
+        db.session.commit()
+        rebuilt += len(batch)
+
+def compact_events(older_than_days=DEFAULT_COMPACT_AFTER_DAYS, batch_size=500, now=None):
+    """Delete lifecycle events of sessions completed before the cutoff; the snapshot keeps their effect
+
+    Works in batches of sessions, committing each, so it can run against a live database.
+    Returns the number of events deleted.
+    """
+    cutoff = (now or datetime.utcnow()) - timedelta(days=older_than_days)
+    deleted = 0
+    while True:
+        # Completed sessions that still have lifecycle events to fold in
+        session_ids = [row.session_id for row in db.session.query(SessionSnapshot.session_id).filter(
+            SessionSnapshot.state == 'completed',
+            SessionSnapshot.completed_at < cutoff,
+            db.session.query(SessionActivity.id).filter(
+                SessionActivity.session_id == SessionSnapshot.session_id,
+                SessionActivity.activity_type.notin_(KEPT_EVENT_TYPES)
+            ).exists()
+        ).limit(batch_size)]
+        if not session_ids:
+            return deleted
+
+        counts = dict(db.session.query(SessionActivity.session_id, db.func.count(SessionActivity.id)).filter(
+            SessionActivity.session_id.in_(session_ids),
+            SessionActivity.activity_type.notin_(KEPT_EVENT_TYPES)
+        ).group_by(SessionActivity.session_id).all())
+
+        SessionActivity.query.filter(
+            SessionActivity.session_id.in_(session_ids),
+            SessionActivity.activity_type.notin_(KEPT_EVENT_TYPES)
+        ).delete(synchronize_session=False)
+        for snapshot in SessionSnapshot.query.filter(SessionSnapshot.session_id.in_(session_ids)):
+            snapshot.compacted_events += counts.get(snapshot.session_id, 0)
+            snapshot.compacted_at = datetime.utcnow()
+        db.session.commit()
+        deleted += sum(counts.values())
+
+@job('session_events.compact', max_attempts=3, priority=-5)
+def compact_job(older_than_days=DEFAULT_COMPACT_AFTER_DAYS):
+    return {'deleted': compact_events(older_than_days)}
+
+def main():
+    """Rebuild or compact session snapshots from the command line"""
+    parser = argparse.ArgumentParser(description='Maintain AyurSutra session lifecycle snapshots')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    subcommands.add_parser('rebuild', help='Recompute snapshots from stored events')
+    compact = subcommands.add_parser('compact', help='Fold old events of completed sessions into snapshots')
+    compact.add_argument('--older-than-days', type=int, default=DEFAULT_COMPACT_AFTER_DAYS)
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app('cli')
+
+    try:
+        with app.app_context():
+            if args.command == 'rebuild':
+                rebuilt = rebuild_snapshots()
+                print(f"✅ Rebuilt {rebuilt} session snapshots")
+            else:
+                deleted = compact_events(args.older_than_days)
+                print(f"✅ Compacted {deleted} events older than {args.older_than_days} days")
+        return True
+    except Exception as e:
+        print(f"❌ {e}")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -43,7 +43,8 @@ def create_database():
 def create_tables():
     """Create all tables using Flask-Migrate"""
     try:
-        from app import app, db
+        from app import create_app, db
+        app = create_app('cli')
         
         with app.app_context():
             # Create all tables
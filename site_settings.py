@@ -0,0 +1,177 @@
+"""
+Site settings for AyurSutra
+Loads every SiteSetting once into an immutable, typed snapshot; public settings are served as
+one pre-serialized payload. Commits in this process swap the snapshot immediately, other
+processes notice through a cheap version stamp checked at most every few seconds
+"""
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from types import MappingProxyType
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session as OrmSession
+
+from database import db
+from models import SiteSetting
+
+logger = logging.getLogger(__name__)
+
+SETTING_TYPES = ('text', 'number', 'boolean', 'json')
+
+DEFAULT_CHECK_INTERVAL = 5
+
+_TRUE = ('true', '1', 'yes', 'on')
+_FALSE = ('false', '0', 'no', 'off', '')
+
+class SettingError(ValueError):
+    """Raised when a value doesn't fit its setting type"""
+
+def decode_value(value, setting_type):
+    """Typed value for a stored string; raises SettingError"""
+    if value is None:
+        return None
+    try:
+        if setting_type == 'number':
+            number = float(value)
+            return int(number) if number.is_integer() and '.' not in str(value) else number
+        if setting_type == 'boolean':
+            lowered = str(value).strip().lower()
+            if lowered not in _TRUE + _FALSE:
+                raise ValueError(value)
+            return lowered in _TRUE
+        if setting_type == 'json':
+            return json.loads(value)
+    except ValueError:
+        raise SettingError(f"'{value}' is not a valid {setting_type}")
+    return value
+
+def encode_value(value, setting_type):
+    """String to store for a typed value; raises SettingError"""
+    if setting_type not in SETTING_TYPES:
+        raise SettingError(f"setting_type must be one of {', '.join(SETTING_TYPES)}")
+    if value is None:
+        return None
+    if setting_type == 'json':
+        return json.dumps(value, separators=(',', ':'))
+    if setting_type == 'boolean' and isinstance(value, bool):
+        return 'true' if value else 'false'
+    encoded = str(value)
+    decode_value(encoded, setting_type)
+    return encoded
+
+class SettingsSnapshot:
+    """Every setting decoded once; shared read-only between threads"""
+
+    __slots__ = ('values', 'public', 'public_payload', 'etag', 'version', 'loaded_at')
+
+    def __init__(self, rows, version):
+        values, public = {}, {}
+        for key, value, setting_type, is_public in rows:
+            try:
+                decoded = decode_value(value, setting_type)
+            except SettingError as e:
+                logger.warning('Site setting %s: %s; serving the raw string', key, e)
+                decoded = value
+            values[key] = decoded
+            if is_public:
+                public[key] = decoded
+        self.values = MappingProxyType(values)
+        self.public = MappingProxyType(public)
+        self.public_payload = json.dumps(
+            {'success': True, 'data': {'settings': public}}, sort_keys=True, separators=(',', ':')
+        ).encode('utf-8')
+        self.etag = hashlib.sha256(self.public_payload).hexdigest()[:32]
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+def _version():
+    """(row count, latest updated_at): changes on insert, update and delete"""
+    count, latest = db.session.query(func.count(SiteSetting.id), func.max(SiteSetting.updated_at)).one()
+    return count, latest.isoformat() if latest else None
+
+class SettingsStore:
+    def __init__(self):
+        self._snapshot = None
+        self._stale = True
+        self._lock = threading.Lock()
+
+    def _check_interval(self):
+        if has_app_context():
+            return current_app.config.get('SETTINGS_CHECK_INTERVAL', DEFAULT_CHECK_INTERVAL)
+        return DEFAULT_CHECK_INTERVAL
+
+    def snapshot(self):
+        """Current snapshot; at most one version query per check interval"""
+        snapshot = self._snapshot
+        if snapshot is not None and not self._stale and time.monotonic() - snapshot.loaded_at < self._check_interval():
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and not self._stale and \
+                    time.monotonic() - snapshot.loaded_at < self._check_interval():
+                return snapshot  # another thread refreshed it
+
+            version = _version()
+            if snapshot is not None and not self._stale and snapshot.version == version:
+                snapshot.loaded_at = time.monotonic()
+                return snapshot
+
+            self._stale = False
+            rows = db.session.query(SiteSetting.key, SiteSetting.value, SiteSetting.setting_type,
+                                    SiteSetting.is_public).all()
+            self._snapshot = SettingsSnapshot(rows, version)
+            return self._snapshot
+
+    def invalidate(self):
+        self._stale = True
+
+store = SettingsStore()
+
+def get_setting(key, default=None):
+    return store.snapshot().values.get(key, default)
+
+def all_settings():
+    return store.snapshot().values
+
+def public_settings():
+    return store.snapshot().public
+
+def set_setting(key, value, setting_type=None, description=None, is_public=None):
+    """Create or update a setting from a typed value (caller commits)"""
+    setting = SiteSetting.query.filter_by(key=key).first()
+    if setting is None:
+        setting = SiteSetting(key=key, setting_type=setting_type or 'text', is_public=bool(is_public))
+        db.session.add(setting)
+    elif setting_type:
+        setting.setting_type = setting_type
+    setting.value = encode_value(value, setting.setting_type)
+    if description is not None:
+        setting.description = description
+    if is_public is not None:
+        setting.is_public = bool(is_public)
+    return setting
+
+# Commits that touch settings swap this process's snapshot on the next read
+
+@event.listens_for(OrmSession, 'after_flush')
+def _mark_changes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, SiteSetting):
+            session.info['_settings_dirty'] = True
+            return
+
+@event.listens_for(OrmSession, 'after_commit')
+def _invalidate_on_commit(session):
+    if session.info.pop('_settings_dirty', False):
+        store.invalidate()
+
+@event.listens_for(OrmSession, 'after_soft_rollback')
+def _discard_on_rollback(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('_settings_dirty', None)
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Symptom history for AyurSutra
+Every severity reading is appended to symptom_observations; a per-patient, per-symptom trend row
+(current, first, min/max and least-squares sums for the slope) is folded in with one upsert per
+reading, so practitioner overviews and worsening cohorts read the trends instead of the history
+"""
+
+import argparse
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, func, union
+
+from database import db, upsert
+from models import PatientSymptom, PatientProgram, Session, SymptomObservation, SymptomTrend
+
+# Origin of the trend regression's day axis
+TREND_EPOCH = datetime(2020, 1, 1)
+
+MAX_SERIES_POINTS = 1000
+
+# Patients per page of the overview
+MAX_OVERVIEW_PATIENTS = 200
+
+class SymptomError(ValueError):
+    """Raised for invalid symptom readings or cohort parameters"""
+
+def normalize_name(name):
+    name = ' '.join(str(name or '').split()).lower()
+    if not name or len(name) > 200:
+        raise SymptomError('symptom_name is required (up to 200 characters)')
+    return name
+
+def _days(moment):
+    return (moment - TREND_EPOCH).total_seconds() / 86400
+
+def _fold(patient_id, name, severity, observed_at):
+    """Fold one reading into its trend row; commutative, so late readings land correctly"""
+    t = _days(observed_at)
+    row = {
+        'patient_id': patient_id, 'symptom_name': name, 'observation_count': 1,
+        'current_severity': severity, 'first_severity': severity,
+        'min_severity': severity, 'max_severity': severity,
+        'sum_t': t, 'sum_tt': t * t, 'sum_y': severity, 'sum_ty': t * severity,
+        'first_observed_at': observed_at, 'last_observed_at': observed_at, 'updated_at': datetime.utcnow(),
+    }
+    existing = SymptomTrend.__table__.c
+
+    def assignments(new):
+        # current/first_severity read the observed_at bounds, so those are assigned last
+        return {
+            'observation_count': existing.observation_count + 1,
+            'current_severity': case((new.last_observed_at >= existing.last_observed_at, new.current_severity),
+                                     else_=existing.current_severity),
+            'first_severity': case((new.first_observed_at < existing.first_observed_at, new.first_severity),
+                                   else_=existing.first_severity),
+            'min_severity': case((new.min_severity < existing.min_severity, new.min_severity),
+                                 else_=existing.min_severity),
+            'max_severity': case((new.max_severity > existing.max_severity, new.max_severity),
+                                 else_=existing.max_severity),
+            'sum_t': existing.sum_t + new.sum_t,
+            'sum_tt': existing.sum_tt + new.sum_tt,
+            'sum_y': existing.sum_y + new.sum_y,
+            'sum_ty': existing.sum_ty + new.sum_ty,
+            'updated_at': new.updated_at,
+            'first_observed_at': case((new.first_observed_at < existing.first_observed_at, new.first_observed_at),
+                                      else_=existing.first_observed_at),
+            'last_observed_at': case((new.last_observed_at > existing.last_observed_at, new.last_observed_at),
+                                     else_=existing.last_observed_at),
+        }
+
+    db.session.execute(upsert(SymptomTrend, [row], ['patient_id', 'symptom_name'], assignments))
+
+def record_observation(patient_id, symptom_name, severity, observed_at=None, recorded_by=None, notes=None):
+    """Append a severity reading, fold it into the trend and keep PatientSymptom current (caller commits)
+
+    Returns (observation, trend).
+    """
+    name = normalize_name(symptom_name)
+    try:
+        severity = int(severity)
+    except (TypeError, ValueError):
+        severity = 0
+    if not 1 <= severity <= 10:
+        raise SymptomError('severity must be an integer from 1 to 10')
+    now = datetime.utcnow()
+    observed_at = observed_at or now
+    if observed_at > now + timedelta(minutes=5):
+        raise SymptomError('observed_at cannot be in the future')
+
+    symptom = PatientSymptom.query.filter(
+        PatientSymptom.patient_id == patient_id, func.lower(PatientSymptom.symptom_name) == name
+    ).order_by(PatientSymptom.is_active.desc(), PatientSymptom.id.desc()).first()
+    if symptom is None:
+        symptom = PatientSymptom(patient_id=patient_id, symptom_name=' '.join(str(symptom_name).split()),
+                                 severity=severity, first_noticed=observed_at)
+        db.session.add(symptom)
+        db.session.flush()
+
+    observation = SymptomObservation(patient_id=patient_id, symptom_id=symptom.id, symptom_name=name,
+                                     severity=severity, observed_at=observed_at, recorded_by=recorded_by, notes=notes)
+    db.session.add(observation)
+    db.session.flush()
+    _fold(patient_id, name, severity, observed_at)
+
+    # The upsert bypassed the ORM, so reload rather than trust the identity map
+    trend = SymptomTrend.query.filter_by(patient_id=patient_id, symptom_name=name).populate_existing().one()
+    symptom.severity = trend.current_severity
+    symptom.is_active = True
+    if observed_at < symptom.first_noticed:
+        symptom.first_noticed = observed_at
+    return observation, trend
+
+def get_series(patient_id, symptom_name, start=None, end=None, limit=MAX_SERIES_POINTS):
+    """Readings for one symptom in time order; a range scan on the series index"""
+    query = SymptomObservation.query.filter_by(patient_id=patient_id, symptom_name=normalize_name(symptom_name))
+    if start:
+        query = query.filter(SymptomObservation.observed_at >= start)
+    if end:
+        query = query.filter(SymptomObservation.observed_at < end)
+    return query.order_by(SymptomObservation.observed_at).limit(max(1, min(limit, MAX_SERIES_POINTS))).all()
+
+def practitioner_patient_ids(practitioner_id):
+    """Select of the patients a practitioner has sessions or programs with"""
+    return union(
+        db.select(Session.patient_id).where(Session.practitioner_id == practitioner_id),
+        db.select(PatientProgram.patient_id).where(PatientProgram.practitioner_id == practitioner_id)
+    )
+
+def _trend_filters(patient_ids=None, symptom_name=None, active_since=None):
+    filters = []
+    if patient_ids is not None:
+        filters.append(SymptomTrend.patient_id.in_(patient_ids))
+    if symptom_name:
+        filters.append(SymptomTrend.symptom_name == normalize_name(symptom_name))
+    if active_since:
+        filters.append(SymptomTrend.last_observed_at >= active_since)
+    return filters
+
+def get_trends(patient_ids=None, symptom_name=None, active_since=None):
+    """Trend rows for a set of patients (a list or a select), newest readings first"""
+    return SymptomTrend.query.filter(*_trend_filters(patient_ids, symptom_name, active_since)).order_by(
+        SymptomTrend.patient_id, SymptomTrend.last_observed_at.desc()).all()
+
+def trend_patient_page(patient_ids=None, symptom_name=None, active_since=None, after_id=0,
+                       limit=MAX_OVERVIEW_PATIENTS):
+    """Up to `limit` patient ids with matching trends, in id order after after_id (keyset pagination)"""
+    rows = db.session.query(SymptomTrend.patient_id).filter(
+        SymptomTrend.patient_id > after_id, *_trend_filters(patient_ids, symptom_name, active_since)
+    ).distinct().order_by(SymptomTrend.patient_id).limit(limit)
+    return [row[0] for row in rows]
+
+def worsening_cohort(symptom_name, days, min_increase=1, patient_ids=None, now=None, limit=200):
+    """Patients whose symptom got at least min_increase worse over the last `days` days
+
+    The baseline is the last reading at or before the window start (one index seek per
+    candidate), or the first reading if the series starts inside the window. Candidates come
+    from the trend rows, so only series read within the window are considered.
+    Returns a list of (trend, baseline_severity).
+    """
+    name = normalize_name(symptom_name)
+    if not 1 <= days <= 3650:
+        raise SymptomError('days must be between 1 and 3650')
+    if min_increase < 1:
+        raise SymptomError('min_increase must be at least 1')
+
+    since = (now or datetime.utcnow()) - timedelta(days=days)
+    before_window = db.select(SymptomObservation.severity).where(
+        SymptomObservation.patient_id == SymptomTrend.patient_id,
+        SymptomObservation.symptom_name == SymptomTrend.symptom_name,
+        SymptomObservation.observed_at <= since
+    ).order_by(SymptomObservation.observed_at.desc()).limit(1).correlate(SymptomTrend).scalar_subquery()
+    baseline = func.coalesce(before_window, SymptomTrend.first_severity)
+
+    query = db.session.query(SymptomTrend, baseline.label('baseline')).filter(
+        SymptomTrend.symptom_name == name,
+        SymptomTrend.last_observed_at >= since,
+        SymptomTrend.observation_count >= 2,
+        SymptomTrend.current_severity - baseline >= min_increase
+    )
+    if patient_ids is not None:
+        query = query.filter(SymptomTrend.patient_id.in_(patient_ids))
+    return query.order_by((SymptomTrend.current_severity - baseline).desc(), SymptomTrend.patient_id).limit(limit).all()
+
+def backfill_observations():
+    """Seed one reading per PatientSymptom that has no history yet (its current severity)"""
+    missing = PatientSymptom.query.filter(
+        ~db.select(SymptomObservation.id).where(SymptomObservation.symptom_id == PatientSymptom.id).exists()
+    ).all()
+    for symptom in missing:
+        db.session.add(SymptomObservation(
+            patient_id=symptom.patient_id, symptom_id=symptom.id, symptom_name=normalize_name(symptom.symptom_name),
+            severity=symptom.severity, observed_at=symptom.last_updated or symptom.first_noticed
+        ))
+    db.session.commit()
+    return len(missing)
+
+def rebuild_trends(patient_id=None):
+    """Recompute trend rows from the full history, e.g. after a backfill or manual correction"""
+    filters = [] if patient_id is None else [SymptomObservation.patient_id == patient_id]
+    trends = SymptomTrend.query
+    if patient_id is not None:
+        trends = trends.filter_by(patient_id=patient_id)
+    # 'fetch' also drops trend rows already loaded in this session, so the rebuilt ones don't collide
+    trends.delete(synchronize_session='fetch')
+
+    rebuilt, current = 0, None
+    readings = db.session.query(
+        SymptomObservation.patient_id, SymptomObservation.symptom_name,
+        SymptomObservation.severity, SymptomObservation.observed_at
+    ).filter(*filters)
+    for patient, name, severity, observed_at in readings.order_by(
+            SymptomObservation.patient_id, SymptomObservation.symptom_name, SymptomObservation.observed_at
+    ).yield_per(5000):
+        t = _days(observed_at)
+        if current is None or (current.patient_id, current.symptom_name) != (patient, name):
+            current = SymptomTrend(patient_id=patient, symptom_name=name, observation_count=0,
+                                   first_severity=severity, min_severity=severity, max_severity=severity,
+                                   sum_t=0, sum_tt=0, sum_y=0, sum_ty=0, first_observed_at=observed_at)
+            db.session.add(current)
+            rebuilt += 1
+        current.observation_count += 1
+        current.current_severity = severity
+        current.last_observed_at = observed_at
+        current.min_severity = min(current.min_severity, severity)
+        current.max_severity = max(current.max_severity, severity)
+        current.sum_t += t
+        current.sum_tt += t * t
+        current.sum_y += severity
+        current.sum_ty += t * severity
+    db.session.commit()
+    return rebuilt
+
+def main():
+    """Backfill history from current symptoms and rebuild trend rows"""
+    parser = argparse.ArgumentParser(description='Maintain AyurSutra symptom trends')
+    parser.add_argument('command', choices=('backfill', 'rebuild'))
+    parser.add_argument('--patient', type=int, help='Rebuild one patient only')
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app('cli')
+
+    try:
+        with app.app_context():
+            if args.command == 'backfill':
+                print(f"✅ Seeded history for {backfill_observations()} symptoms")
+            print(f"✅ Rebuilt {rebuild_trends(args.patient)} symptom trends")
+        return True
+    except Exception as e:
+        print(f"❌ Symptom trend maintenance failed: {e}")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Synthetic clinic data generator for AyurSutra
+Builds reproducible datasets at 1x/10x/100x/1000x scale for load tests and benchmarks
+"""
+
+import argparse
+import random
+import sys
+from datetime import date, datetime, time, timedelta
+
+from database import db
+from models import (
+    User, Patient, Practitioner, TreatmentType, TreatmentProgram, ProgramTreatment, Session,
+    WellnessLog, Notification, PageView, UserType, Gender, DoshaType, SessionStatus,
+    NotificationType, NotificationPriority, EnergyLevel, SleepQuality, Mood, StressLevel
+)
+from password_hashing import hash_password
+
+# Size of a 1x clinic; every count is multiplied by --scale
+BASE_PRACTITIONERS = 5
+BASE_PATIENTS = 100
+HISTORY_DAYS = 365
+
+# Every synthetic account uses this password so benchmarks can log in
+SYNTHETIC_PASSWORD = 'synthetic123'
+
+INSERT_CHUNK = 2000
+
+PAST_STATUS_WEIGHTS = [
+    (SessionStatus.COMPLETED, 82),
+    (SessionStatus.CANCELLED, 12),
+    (SessionStatus.NO_SHOW, 6),
+]
+
+FUTURE_STATUS_WEIGHTS = [
+    (SessionStatus.SCHEDULED, 7),
+    (SessionStatus.CONFIRMED, 3),
+]
+
+SPECIALIZATIONS = [
+    'Stress Management', 'Digestive Health', 'Panchakarma', 'Yoga Therapy',
+    'Herbal Medicine', 'Sleep Disorders', 'Pain Management', 'Skin Care'
+]
+
+TREATMENTS = [
+    ('Abhyanga (Oil Massage)', 60, 150),
+    ('Shirodhara', 45, 200),
+    ('Panchakarma', 120, 500),
+    ('Yoga Therapy', 90, 100),
+    ('Herbal Consultation', 30, 40),
+    ('Nasya', 30, 80),
+]
+
+PAGES = ['/', '/index.html', '/schedule.html', '/patient-dashboard.html', '/progress.html',
+         '/feedback.html', '/notifications.html', '/practitioner-dashboard.html']
+
+SLOT_TIMES = [time(hour, minute) for hour in range(8, 18) for minute in (0, 30)]
+
+def synthetic_email(prefix, index, seed):
+    """Deterministic address so benchmarks can log in as generated users"""
+    return f'{prefix}{index}.s{seed}@synthetic.ayursutra.test'
+
+def _weighted(rng, weighted_items):
+    items, weights = zip(*weighted_items)
+    return rng.choices(items, weights=weights)[0]
+
+def _zipf_index(rng, size, skew=1.2):
+    """Pick an index in [0, size) with a long-tailed popularity distribution"""
+    return min(int(rng.paretovariate(skew)) - 1, size - 1)
+
+def _insert(table, rows):
+    for start in range(0, len(rows), INSERT_CHUNK):
+        db.session.execute(table.insert(), rows[start:start + INSERT_CHUNK])
+
+class ClinicGenerator:
+    """Generates one synthetic clinic with a fixed random seed"""
+
+    def __init__(self, scale=1, seed=42, history_days=HISTORY_DAYS, today=None):
+        self.scale = scale
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.history_days = history_days
+        self.today = today or date.today()
+        self.password_hash = hash_password(SYNTHETIC_PASSWORD)
+        self.counts = {}
+
+    def generate(self):
+        treatment_ids = self._treatments()
+        program_ids = self._programs(treatment_ids)
+        practitioner_ids, practitioner_user_ids = self._users(
+            'practitioner', BASE_PRACTITIONERS * self.scale, UserType.PRACTITIONER, self._practitioner_profile)
+        patient_ids, patient_user_ids = self._users(
+            'patient', BASE_PATIENTS * self.scale, UserType.PATIENT, self._patient_profile)
+
+        self._sessions(patient_ids, practitioner_ids, treatment_ids, program_ids)
+        self._wellness_logs(patient_ids)
+        self._notifications(patient_user_ids)
+        self._page_views(patient_user_ids + practitioner_user_ids)
+        db.session.commit()
+        return self.counts
+
+    def _treatments(self):
+        rows = [{'name': name, 'description': f'{name} (synthetic)', 'duration_minutes': minutes, 'price': price}
+                for name, minutes, price in TREATMENTS]
+        _insert(TreatmentType.__table__, rows)
+        db.session.flush()
+        ids = db.session.execute(
+            db.select(TreatmentType.id, TreatmentType.duration_minutes)
+            .where(TreatmentType.name.in_([row['name'] for row in rows]))
+        ).all()
+        self.counts['treatment_types'] = len(ids)
+        return [tuple(row) for row in ids]
+
+    def _programs(self, treatment_ids):
+        programs = [('Stress Relief Program', 8, 4), ('Digestive Health Program', 6, 3), ('Detox Program', 10, 5)]
+        _insert(TreatmentProgram.__table__, [
+            {'name': name, 'description': 'Synthetic program', 'total_sessions': sessions,
+             'duration_weeks': weeks, 'total_price': sessions * 150}
+            for name, sessions, weeks in programs
+        ])
+        program_ids = db.session.execute(
+            db.select(TreatmentProgram.id).where(TreatmentProgram.name.in_([p[0] for p in programs]))
+        ).scalars().all()
+
+        steps = []
+        for program_id, (_, sessions, _) in zip(program_ids, programs):
+            for order in range(1, sessions + 1):
+                steps.append({'program_id': program_id, 'treatment_id': self.rng.choice(treatment_ids)[0],
+                              'session_order': order})
+        _insert(ProgramTreatment.__table__, steps)
+        self.counts['treatment_programs'] = len(program_ids)
+        return program_ids
+
+    def _users(self, prefix, count, user_type, build_profile):
+        emails = [synthetic_email(prefix, i, self.seed) for i in range(count)]
+        _insert(User.__table__, [
+            {'email': email, 'password_hash': self.password_hash, 'first_name': prefix.title(),
+             'last_name': str(i), 'user_type': user_type, 'gender': self.rng.choice(list(Gender)),
+             'date_of_birth': self.today - timedelta(days=self.rng.randint(18 * 365, 80 * 365)),
+             'is_active': True}
+            for i, email in enumerate(emails)
+        ])
+
+        user_ids = []
+        for start in range(0, len(emails), INSERT_CHUNK):
+            chunk = emails[start:start + INSERT_CHUNK]
+            user_ids.extend(db.session.execute(
+                db.select(User.id).where(User.email.in_(chunk)).order_by(User.id)).scalars())
+
+        profile_model = Practitioner if user_type == UserType.PRACTITIONER else Patient
+        _insert(profile_model.__table__, [dict(build_profile(), user_id=user_id) for user_id in user_ids])
+
+        profile_ids = []
+        for start in range(0, len(user_ids), INSERT_CHUNK):
+            chunk = user_ids[start:start + INSERT_CHUNK]
+            profile_ids.extend(db.session.execute(
+                db.select(profile_model.id).where(profile_model.user_id.in_(chunk))).scalars())
+
+        self.counts[profile_model.__tablename__] = len(profile_ids)
+        return profile_ids, user_ids
+
+    def _practitioner_profile(self):
+        return {
+            'specialization': ', '.join(self.rng.sample(SPECIALIZATIONS, self.rng.randint(1, 3))),
+            'experience_years': self.rng.randint(1, 30),
+            'consultation_fee': self.rng.choice([80, 100, 120, 150, 200, 250]),
+            'is_available': self.rng.random() < 0.9,
+        }
+
+    def _patient_profile(self):
+        return {'dosha_type': self.rng.choice(list(DoshaType))}
+
+    def _sessions(self, patient_ids, practitioner_ids, treatment_ids, program_ids):
+        rows = []
+        total = 0
+        for patient_id in patient_ids:
+            # Most patients book a handful of sessions, a few are regulars
+            practitioner_id = practitioner_ids[_zipf_index(self.rng, len(practitioner_ids))]
+            program_id = self.rng.choice(program_ids) if self.rng.random() < 0.3 else None
+            for _ in range(min(int(self.rng.expovariate(1 / 8)) + 1, 60)):
+                treatment_id, duration = self.rng.choice(treatment_ids)
+                offset = self.rng.randint(-self.history_days, 30)
+                status = _weighted(self.rng, FUTURE_STATUS_WEIGHTS if offset > 0 else PAST_STATUS_WEIGHTS)
+                rows.append({
+                    'patient_id': patient_id, 'practitioner_id': practitioner_id,
+                    'treatment_id': treatment_id, 'program_id': program_id,
+                    'scheduled_date': self.today + timedelta(days=offset),
+                    'scheduled_time': self.rng.choice(SLOT_TIMES),
+                    'duration_minutes': duration, 'status': status,
+                    'rating': self.rng.randint(3, 5) if status == SessionStatus.COMPLETED and self.rng.random() < 0.4 else None,
+                })
+            if len(rows) >= INSERT_CHUNK:
+                _insert(Session.__table__, rows)
+                total += len(rows)
+                rows = []
+        _insert(Session.__table__, rows)
+        self.counts['sessions'] = total + len(rows)
+
+    def _wellness_logs(self, patient_ids):
+        rows = []
+        total = 0
+        for patient_id in patient_ids:
+            # Roughly a third of patients keep a wellness diary, most only sporadically
+            if self.rng.random() > 0.35:
+                continue
+            days = self.rng.sample(range(self.history_days), self.rng.randint(5, min(120, self.history_days)))
+            for day in days:
+                rows.append({
+                    'patient_id': patient_id, 'log_date': self.today - timedelta(days=day),
+                    'energy_level': self.rng.choice(list(EnergyLevel)),
+                    'sleep_quality': self.rng.choice(list(SleepQuality)),
+                    'mood': self.rng.choice(list(Mood)),
+                    'stress_level': self.rng.choice(list(StressLevel)),
+                })
+            if len(rows) >= INSERT_CHUNK:
+                _insert(WellnessLog.__table__, rows)
+                total += len(rows)
+                rows = []
+        _insert(WellnessLog.__table__, rows)
+        self.counts['wellness_logs'] = total + len(rows)
+
+    def _notifications(self, user_ids):
+        rows = []
+        now = datetime.utcnow()
+        for user_id in user_ids:
+            for _ in range(self.rng.randint(0, 12)):
+                rows.append({
+                    'user_id': user_id, 'title': 'Session Reminder', 'message': 'Your session is coming up',
+                    'type': _weighted(self.rng, [(NotificationType.REMINDER, 6), (NotificationType.INFO, 2),
+                                                 (NotificationType.PRECAUTION, 1), (NotificationType.FEEDBACK, 1)]),
+                    'priority': NotificationPriority.MEDIUM,
+                    'is_read': self.rng.random() < 0.7,
+                    'created_at': now - timedelta(minutes=self.rng.randint(0, self.history_days * 1440)),
+                })
+        _insert(Notification.__table__, rows)
+        self.counts['notifications'] = len(rows)
+
+    def _page_views(self, user_ids):
+        rows = []
+        total = 0
+        now = datetime.utcnow()
+        for _ in range(BASE_PATIENTS * self.scale * 20):
+            rows.append({
+                'page_url': PAGES[_zipf_index(self.rng, len(PAGES))],
+                'user_agent': 'Mozilla/5.0 (synthetic)',
+                'ip_address': f'10.{self.rng.randint(0, 255)}.{self.rng.randint(0, 255)}.{self.rng.randint(1, 254)}',
+                'user_id': self.rng.choice(user_ids) if self.rng.random() < 0.4 else None,
+                'viewed_at': now - timedelta(minutes=self.rng.randint(0, self.history_days * 1440)),
+            })
+            if len(rows) >= INSERT_CHUNK:
+                _insert(PageView.__table__, rows)
+                total += len(rows)
+                rows = []
+        _insert(PageView.__table__, rows)
+        self.counts['page_views'] = total + len(rows)
+
+def main():
+    """Generate a synthetic clinic from the command line"""
+    parser = argparse.ArgumentParser(description='Generate a synthetic AyurSutra clinic dataset')
+    parser.add_argument('--scale', type=int, default=10, help='Multiplier over a 1x clinic (e.g. 10, 100, 1000)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--history-days', type=int, default=HISTORY_DAYS)
+    args = parser.parse_args()
+
+    # Target database (MySQL or SQLite) comes from .env, as for the app itself
+    from app import create_app
+    app = create_app('cli')
+
+    try:
+        with app.app_context():
+            db.create_all()
+            print(f"🔄 Generating {args.scale}x synthetic clinic (seed {args.seed})...")
+            started = datetime.utcnow()
+            counts = ClinicGenerator(args.scale, args.seed, args.history_days).generate()
+            elapsed = (datetime.utcnow() - started).total_seconds()
+
+        for table, count in counts.items():
+            print(f"   {table:<20} {count:>10,}")
+        print(f"✅ Done in {elapsed:.1f}s. All synthetic users log in with '{SYNTHETIC_PASSWORD}'")
+        return True
+
+    except Exception as e:
+        print(f"❌ Generation failed: {e}")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
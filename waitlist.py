@@ -0,0 +1,284 @@
+"""
+Waitlist and cancellation backfill for AyurSutra
+When a booking is cancelled or marked no-show, the freed slot is offered to the first eligible
+waitlisted patient with a short hold; expired or declined holds move on to the next patient
+"""
+
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session as OrmSession
+
+from database import db
+from models import (
+    Session, SessionStatus, Practitioner, Patient, WaitlistEntry, SlotOffer, Job,
+    Notification, NotificationType, NotificationPriority
+)
+from jobs import job, enqueue
+import calendars
+
+BACKFILL_JOB = 'waitlist.backfill'
+
+# Backfill jobs jump ahead of exports and other bulk work
+BACKFILL_PRIORITY = 10
+
+DEFAULT_HOLD_MINUTES = 15
+
+# Slots starting sooner than this are not worth offering
+MIN_LEAD_MINUTES = 60
+
+# Waiting entries examined per freed slot
+MAX_CANDIDATES = 50
+
+FREEING_STATUSES = (SessionStatus.CANCELLED, SessionStatus.NO_SHOW)
+
+class WaitlistError(ValueError):
+    """Raised when an offer cannot be claimed or declined"""
+
+def hold_minutes():
+    if has_app_context():
+        return current_app.config.get('WAITLIST_HOLD_MINUTES', DEFAULT_HOLD_MINUTES)
+    return DEFAULT_HOLD_MINUTES
+
+def slot_key(practitioner_id, day, clock):
+    return f"{practitioner_id}:{day.isoformat()}:{clock.strftime('%H:%M')}"
+
+def suppress_backfill(session_ids):
+    """Don't offer these sessions' slots when they are cancelled in the current transaction
+
+    For cancellations where the practitioner is unavailable (sick days, closures).
+    """
+    db.session.info.setdefault('_waitlist_suppressed', set()).update(session_ids)
+
+def _slot_taken(practitioner_id, day, clock, duration, patient_id=None):
+    """Whether the practitioner (or the patient, if given) has an active booking overlapping the slot"""
+    compiled_day = calendars.get_day(practitioner_id, day)
+    start = compiled_day.local_to_utc(clock.hour * 60 + clock.minute)
+    end = start + duration
+
+    filters = [Session.practitioner_id == practitioner_id]
+    if patient_id is not None:
+        filters.append(Session.patient_id == patient_id)
+    rows = db.session.query(Session.scheduled_time, Session.duration_minutes).filter(
+        or_(*filters),
+        Session.scheduled_date == day,
+        Session.status.in_(calendars.BUSY_STATUSES)
+    )
+    for other_time, other_duration in rows:
+        other_start = compiled_day.local_to_utc(other_time.hour * 60 + other_time.minute)
+        if other_start < end and start < other_start + other_duration:
+            return True
+    return False
+
+def _fits_preference(entry, freed):
+    if entry.preferred_start and freed.scheduled_time < entry.preferred_start:
+        return False
+    if entry.preferred_end:
+        start = freed.scheduled_time.hour * 60 + freed.scheduled_time.minute
+        end = entry.preferred_end.hour * 60 + entry.preferred_end.minute
+        if start + freed.duration_minutes > end:
+            return False
+    return True
+
+def _notify(patient_id, title, message):
+    user_id = db.session.query(Patient.user_id).filter_by(id=patient_id).scalar()
+    db.session.add(Notification(
+        user_id=user_id, title=title, message=message,
+        type=NotificationType.ALERT, priority=NotificationPriority.HIGH
+    ))
+
+def offer_freed_slot(session_id, now=None):
+    """Offer a cancelled session's slot to the first eligible waitlisted patient
+
+    Candidates come from one indexed query (status, treatment, practitioner, date range)
+    in FIFO order. The unique slot_key on SlotOffer and a conditional update of the entry
+    make concurrent backfills for the same slot or patient safe. Returns a result dict.
+    """
+    now = now or datetime.utcnow()
+    freed = db.session.get(Session, session_id)
+    if freed is None or freed.status not in FREEING_STATUSES:
+        return {'offered': False, 'reason': 'session is not cancelled'}
+
+    start = calendars.session_start_utc(freed)
+    if start is None or start < now + timedelta(minutes=MIN_LEAD_MINUTES):
+        return {'offered': False, 'reason': 'slot starts too soon'}
+
+    key = slot_key(freed.practitioner_id, freed.scheduled_date, freed.scheduled_time)
+    if SlotOffer.query.filter_by(slot_key=key).first():
+        return {'offered': False, 'reason': 'slot already on hold'}
+    if _slot_taken(freed.practitioner_id, freed.scheduled_date, freed.scheduled_time, freed.duration_minutes):
+        return {'offered': False, 'reason': 'slot already rebooked'}
+
+    already_offered = {
+        entry_id for (entry_id,) in db.session.query(SlotOffer.waitlist_entry_id).filter_by(
+            practitioner_id=freed.practitioner_id,
+            scheduled_date=freed.scheduled_date,
+            scheduled_time=freed.scheduled_time
+        )
+    }
+
+    candidates = WaitlistEntry.query.filter(
+        WaitlistEntry.status == 'waiting',
+        WaitlistEntry.treatment_id == freed.treatment_id,
+        or_(WaitlistEntry.practitioner_id == freed.practitioner_id, WaitlistEntry.practitioner_id.is_(None)),
+        WaitlistEntry.earliest_date <= freed.scheduled_date,
+        WaitlistEntry.latest_date >= freed.scheduled_date
+    ).order_by(WaitlistEntry.created_at, WaitlistEntry.id).limit(MAX_CANDIDATES)
+
+    for entry in candidates:
+        if entry.id in already_offered or entry.patient_id == freed.patient_id or not _fits_preference(entry, freed):
+            continue
+        if _slot_taken(freed.practitioner_id, freed.scheduled_date, freed.scheduled_time,
+                       freed.duration_minutes, patient_id=entry.patient_id):
+            continue
+
+        claimed = db.session.execute(
+            update(WaitlistEntry)
+            .where(WaitlistEntry.id == entry.id, WaitlistEntry.status == 'waiting')
+            .values(status='offered', updated_at=now)
+        )
+        if claimed.rowcount != 1:
+            continue  # offered another slot concurrently
+
+        offer = SlotOffer(
+            waitlist_entry_id=entry.id,
+            source_session_id=freed.id,
+            practitioner_id=freed.practitioner_id,
+            treatment_id=freed.treatment_id,
+            scheduled_date=freed.scheduled_date,
+            scheduled_time=freed.scheduled_time,
+            duration_minutes=freed.duration_minutes,
+            slot_key=key,
+            status='pending',
+            expires_at=now + timedelta(minutes=hold_minutes())
+        )
+        try:
+            with db.session.begin_nested():
+                db.session.add(offer)
+        except IntegrityError:
+            # Another worker put a hold on this slot first
+            db.session.execute(update(WaitlistEntry).where(WaitlistEntry.id == entry.id).values(status='waiting'))
+            return {'offered': False, 'reason': 'slot already on hold'}
+
+        _notify(entry.patient_id, 'A slot has opened up',
+                f"A {freed.duration_minutes}-minute slot on {freed.scheduled_date.strftime('%d %b %Y')} at "
+                f"{freed.scheduled_time.strftime('%H:%M')} is being held for you for {hold_minutes()} minutes. "
+                f"Accept it from your waitlist to book.")
+        enqueue('waitlist.expire_offer', {'offer_id': offer.id},
+                idempotency_key=f'expire_offer:{offer.id}', delay=hold_minutes() * 60)
+        return {'offered': True, 'offer_id': offer.id, 'waitlist_entry_id': entry.id}
+
+    return {'offered': False, 'reason': 'no eligible waitlisted patients'}
+
+def _release(offer, status):
+    """End a pending hold and put the entry back on the waitlist"""
+    offer.status = status
+    offer.slot_key = None
+    entry = db.session.get(WaitlistEntry, offer.waitlist_entry_id)
+    if entry.status == 'offered':
+        entry.status = 'waiting'
+
+def claim_offer(offer_id, patient_id, now=None):
+    """Book the held slot for the patient; returns the new Session
+
+    Commits on success. Raises WaitlistError if the offer isn't the patient's, has
+    expired, was already used or the slot was taken in the meantime.
+    """
+    now = now or datetime.utcnow()
+    offer = db.session.get(SlotOffer, offer_id)
+    entry = db.session.get(WaitlistEntry, offer.waitlist_entry_id) if offer else None
+    if entry is None or entry.patient_id != patient_id:
+        raise WaitlistError('Offer not found')
+
+    # Serialize with other bookings for this practitioner (no-op on SQLite)
+    db.session.query(Practitioner).filter_by(id=offer.practitioner_id).with_for_update().first()
+    try:
+        accepted = db.session.execute(
+            update(SlotOffer)
+            .where(SlotOffer.id == offer_id, SlotOffer.status == 'pending', SlotOffer.expires_at > now)
+            .values(status='accepted', slot_key=None)
+        )
+        if accepted.rowcount != 1:
+            raise WaitlistError('This offer has expired or was already used')
+        if _slot_taken(offer.practitioner_id, offer.scheduled_date, offer.scheduled_time, offer.duration_minutes):
+            raise WaitlistError('This slot is no longer available')
+
+        booked = Session(
+            patient_id=patient_id,
+            practitioner_id=offer.practitioner_id,
+            treatment_id=offer.treatment_id,
+            scheduled_date=offer.scheduled_date,
+            scheduled_time=offer.scheduled_time,
+            duration_minutes=offer.duration_minutes,
+            status=SessionStatus.SCHEDULED,
+            notes='Booked from waitlist'
+        )
+        db.session.add(booked)
+        db.session.flush()
+        offer.booked_session_id = booked.id
+        entry.status = 'booked'
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return booked
+
+def decline_offer(offer_id, patient_id):
+    """Give up a hold; the slot goes to the next patient straight away. Commits."""
+    offer = db.session.get(SlotOffer, offer_id)
+    entry = db.session.get(WaitlistEntry, offer.waitlist_entry_id) if offer else None
+    if entry is None or entry.patient_id != patient_id:
+        raise WaitlistError('Offer not found')
+    if offer.status != 'pending':
+        raise WaitlistError('This offer is no longer pending')
+
+    _release(offer, 'declined')
+    enqueue(BACKFILL_JOB, {'session_id': offer.source_session_id})
+    db.session.commit()
+
+@job(BACKFILL_JOB, max_attempts=3, priority=BACKFILL_PRIORITY)
+def backfill(session_id):
+    return offer_freed_slot(session_id)
+
+@job('waitlist.expire_offer', max_attempts=5, priority=BACKFILL_PRIORITY)
+def expire_offer(offer_id):
+    """Release an unanswered hold and offer the slot to the next patient"""
+    offer = db.session.get(SlotOffer, offer_id)
+    if offer is None or offer.status != 'pending':
+        return {'expired': False}
+    if offer.expires_at > datetime.utcnow():
+        raise RuntimeError('Offer has not expired yet')  # retried with backoff
+
+    _release(offer, 'expired')
+    db.session.flush()
+    return {'expired': True, 'next': offer_freed_slot(offer.source_session_id)}
+
+# Queue a backfill in the same transaction as the cancellation, so it runs within seconds
+# of the commit and never for a cancellation that rolled back
+
+@event.listens_for(OrmSession, 'before_flush')
+def _queue_backfills(session, flush_context, instances):
+    suppressed = session.info.get('_waitlist_suppressed', ())
+    for obj in list(session.dirty):
+        if not isinstance(obj, Session) or obj.id in suppressed or obj.status not in FREEING_STATUSES:
+            continue
+        history = inspect(obj).attrs.status.history
+        if history.has_changes() and not any(old in FREEING_STATUSES for old in history.deleted):
+            session.add(Job(
+                name=BACKFILL_JOB,
+                payload={'session_id': obj.id},
+                priority=BACKFILL_PRIORITY,
+                max_attempts=3,
+                run_at=datetime.utcnow()
+            ))
+
+@event.listens_for(OrmSession, 'after_commit')
+def _clear_suppressed(session):
+    session.info.pop('_waitlist_suppressed', None)
+
+@event.listens_for(OrmSession, 'after_soft_rollback')
+def _clear_suppressed_on_rollback(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('_waitlist_suppressed', None)